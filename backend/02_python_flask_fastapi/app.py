@@ -6,9 +6,24 @@ A comprehensive example of Python Flask FastAPI implementation.
 
 from flask import Flask, jsonify, request
 import json
+import os
+import sys
 from datetime import datetime
 
+# Shared helpers live in backend/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.compression import CompressionMiddleware
+from common.conditional import VersionedPayload, conditional
+from common.ingest import ingest_request, wants_streaming_ingest
+from common.json_provider import install_json_provider
+from common.static_responses import PerSecondJSON, StaticJSON, now_iso
+
 app = Flask(__name__)
+install_json_provider(app)
+# Compress responses above COMPRESSION_MIN_SIZE bytes for clients that accept it
+COMPRESSION_MIN_SIZE = 512
+app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=COMPRESSION_MIN_SIZE)
 
 # Sample data
 sample_data = {
@@ -22,43 +37,58 @@ sample_data = {
     ]
 }
 
+# sample_data never changes after startup, so its validators are computed once
+sample_payload = VersionedPayload(sample_data)
+
+# Immutable bodies are serialized once at startup and served as raw bytes;
+# the health body only embeds the time, so it is rebuilt once per second
+home_response = StaticJSON(app, {
+    "service": "Python Flask FastAPI",
+    "status": "running",
+    "endpoints": [
+        "/api/demo",
+        "/api/health",
+        "/api/data"
+    ]
+})
+demo_response = StaticJSON(app, sample_data)
+health_response = PerSecondJSON(app, lambda: {
+    "status": "healthy",
+    "service": "Python Flask FastAPI",
+    "timestamp": now_iso()
+})
+
 @app.route('/')
 def home():
-    return jsonify({
-        "service": "Python Flask FastAPI",
-        "status": "running",
-        "endpoints": [
-            "/api/demo",
-            "/api/health",
-            "/api/data"
-        ]
-    })
+    return home_response()
 
 @app.route('/api/demo')
+@conditional(sample_payload)
 def demo():
-    return jsonify(sample_data)
+    return demo_response()
 
 @app.route('/api/health')
 def health():
-    return jsonify({
-        "status": "healthy",
-        "service": "Python Flask FastAPI",
-        "timestamp": datetime.now().isoformat()
-    })
+    return health_response()
 
 @app.route('/api/data', methods=['GET', 'POST'])
+@conditional(sample_payload)
 def data():
     if request.method == 'POST':
+        # NDJSON (or a JSON array with ?stream=true) is parsed incrementally
+        # in batches and answered with a summary instead of an echo
+        if wants_streaming_ingest():
+            return jsonify(ingest_request())
         data = request.get_json()
         return jsonify({
             "message": "Data received successfully",
             "received_data": data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         })
     else:
         return jsonify({
             "data": sample_data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         })
 
 if __name__ == '__main__':
@@ -4,11 +4,57 @@ Database Integration Demo Server
 A comprehensive example of Database Integration implementation.
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+import atexit
+import itertools
 import json
+import os
+import sys
 from datetime import datetime
 
+# Shared helpers live in backend/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.compression import CompressionMiddleware
+from common.conditional import VersionedPayload, conditional
+from common.ingest import CSV_TYPES, NDJSON_TYPES, ingest_request, wants_streaming_ingest
+from common.json_provider import install_json_provider
+from common.static_responses import PerSecondJSON, StaticJSON, now_iso
+
+from database import Database, PoolExhausted, WriteBehindBuffer, decode_cursor, encode_cursor
+
 app = Flask(__name__)
+install_json_provider(app)
+# Compress responses above COMPRESSION_MIN_SIZE bytes for clients that accept it
+COMPRESSION_MIN_SIZE = 512
+app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=COMPRESSION_MIN_SIZE)
+
+# SQLite database (WAL mode) behind a pool of connections. Inserts from
+# concurrent requests are group-committed: each transaction takes what queued
+# up during the previous one, at most WRITE_BATCH_SIZE records
+DATABASE_PATH = os.environ.get(
+    "DATABASE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "demo.db"),
+)
+DATABASE_POOL_SIZE = 8
+# A request waiting longer than this for a pooled connection gets a 503
+DATABASE_POOL_TIMEOUT = 5.0
+WRITE_BATCH_SIZE = 256
+
+db = Database(DATABASE_PATH, pool_size=DATABASE_POOL_SIZE, pool_timeout=DATABASE_POOL_TIMEOUT)
+write_buffer = WriteBehindBuffer(db, batch_size=WRITE_BATCH_SIZE)
+atexit.register(write_buffer.close)
+
+# POST /api/data/import loads CSV or NDJSON with executemany in chunks of
+# IMPORT_CHUNK_SIZE rows, committing every IMPORT_COMMIT_ROWS rows
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_COMMIT_ROWS = 100000
+
+# GET /api/data pages through records by id; ?limit=all exports everything,
+# on a connection of its own rather than a pooled one
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 10000
 
 # Sample data
 sample_data = {
@@ -22,44 +68,170 @@ sample_data = {
     ]
 }
 
+# sample_data never changes after startup, so its validators are computed once
+sample_payload = VersionedPayload(sample_data)
+
+# Immutable bodies are serialized once at startup and served as raw bytes;
+# the health body only embeds the time, so it is rebuilt once per second
+home_response = StaticJSON(app, {
+    "service": "Database Integration",
+    "status": "running",
+    "endpoints": [
+        "/api/demo",
+        "/api/health",
+        "/api/data",
+        "/api/data/summary",
+        "/api/data/import",
+        "/api/db/stats"
+    ]
+})
+demo_response = StaticJSON(app, sample_data)
+health_response = PerSecondJSON(app, lambda: {
+    "status": "healthy",
+    "service": "Database Integration",
+    "timestamp": now_iso()
+})
+
 @app.route('/')
 def home():
-    return jsonify({
-        "service": "Database Integration",
-        "status": "running",
-        "endpoints": [
-            "/api/demo",
-            "/api/health",
-            "/api/data"
-        ]
-    })
+    return home_response()
 
 @app.route('/api/demo')
+@conditional(sample_payload)
 def demo():
-    return jsonify(sample_data)
+    return demo_response()
 
 @app.route('/api/health')
 def health():
-    return jsonify({
-        "status": "healthy",
-        "service": "Database Integration",
-        "timestamp": datetime.now().isoformat()
-    })
+    return health_response()
+
+def page_params():
+    """Parse ``limit`` and the opaque ``next`` token of a GET /api/data."""
+    limit = request.args.get("limit", str(DEFAULT_PAGE_LIMIT))
+    if limit == "all":
+        limit = None
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise BadRequest("limit must be an integer or 'all'")
+        if not 1 <= limit <= MAX_PAGE_LIMIT:
+            raise BadRequest(f"limit must be between 1 and {MAX_PAGE_LIMIT}")
+    token = request.args.get("next")
+    try:
+        after_id = decode_cursor(token) if token else 0
+    except ValueError:
+        raise BadRequest("Invalid next token")
+    return limit, after_id
+
+
+def stream_page(limit, after_id):
+    """Chunked JSON page written row by row from the database cursor.
+
+    One extra row is read to learn whether a next page exists, so the token
+    is only known at the end and goes after the data array. The first
+    (empty) chunk comes once the database connection is taken.
+    """
+    rows = db.iter_records(after_id, -1 if limit is None else limit + 1, dedicated=limit is None)
+    count = 0
+    last_id = next_id = None
+    chunk = []
+    try:
+        first = next(rows, None)
+        yield ""
+        yield f'{{"timestamp":"{now_iso()}","limit":{"null" if limit is None else limit},"data":['
+        for row_id, payload, created_at in itertools.chain(() if first is None else (first,), rows):
+            if count == limit:
+                next_id = last_id
+                break
+            # The stored payload is already JSON text and is spliced in as is
+            chunk.append(f'{"," if count else ""}{{"id":{row_id},"payload":{payload},'
+                         f'"created_at":"{created_at}"}}')
+            count += 1
+            last_id = row_id
+            if len(chunk) >= 256:
+                yield "".join(chunk)
+                chunk = []
+    finally:
+        # Hands the connection back to the pool, also when the client goes away
+        rows.close()
+    next_token = f'"{encode_cursor(next_id)}"' if next_id is not None else "null"
+    yield "".join(chunk) + f'],"count":{count},"next":{next_token}}}'
+
 
 @app.route('/api/data', methods=['GET', 'POST'])
 def data():
     if request.method == 'POST':
+        # NDJSON (or a JSON array with ?stream=true) is parsed incrementally
+        # in batches and answered with a summary instead of an echo
+        if wants_streaming_ingest():
+            return jsonify(ingest_request(handler=db.insert_records))
         data = request.get_json()
+        # ?durable=false answers as soon as the record is queued
+        durable = request.args.get("durable", "true").lower() not in ("0", "false", "no")
+        record_id = write_buffer.insert(data, durable=durable)
         return jsonify({
-            "message": "Data received successfully",
+            "message": "Data received successfully" if durable else "Data accepted",
+            "id": record_id,
+            "durable": durable,
             "received_data": data,
-            "timestamp": datetime.now().isoformat()
-        })
+            "timestamp": now_iso()
+        }), 201 if durable else 202
     else:
-        return jsonify({
-            "data": sample_data,
-            "timestamp": datetime.now().isoformat()
-        })
+        limit, after_id = page_params()
+        page = stream_page(limit, after_id)
+        # Up to the first chunk here, so a full pool is a 503 rather than a
+        # response cut off after its status line
+        next(page)
+        return Response(page, mimetype="application/json")
+
+@app.errorhandler(PoolExhausted)
+def pool_exhausted(exc):
+    response = jsonify({"error": str(exc), "status": 503})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(exc.retry_after)
+    return response
+
+def flag(name):
+    return request.args.get(name, "").lower() in ("1", "true", "yes")
+
+@app.route('/api/data/import', methods=['POST'])
+def data_import():
+    """Bulk load a CSV or NDJSON upload; progress is logged per commit."""
+    if request.mimetype not in CSV_TYPES and request.mimetype not in NDJSON_TYPES:
+        raise UnsupportedMediaType("Upload text/csv or application/x-ndjson")
+    chunk_size = request.args.get("chunk_size", IMPORT_CHUNK_SIZE, type=int)
+    commit_every = request.args.get("commit_every", IMPORT_COMMIT_ROWS, type=int)
+    if chunk_size < 1 or commit_every < 1:
+        raise BadRequest("chunk_size and commit_every must be positive")
+
+    def log_progress(progress):
+        app.logger.info("import: %(rows)d rows, %(rows_per_second)d rows/s", progress)
+
+    with db.bulk_import(commit_every=commit_every, drop_indexes=flag("drop_indexes"),
+                        progress=log_progress) as loader:
+        summary = ingest_request(handler=loader, batch_size=chunk_size)
+    return jsonify({
+        **summary,
+        "message": "Data imported successfully",
+        "import": loader.progress(),
+        "timestamp": now_iso()
+    }), 201
+
+@app.route('/api/data/summary')
+def data_summary():
+    # Served from the query cache until the next committed write
+    hours = request.args.get("hours", 24, type=int)
+    return jsonify({**db.summary(hours), "timestamp": now_iso()})
+
+@app.route('/api/db/stats')
+def db_stats():
+    return jsonify({
+        "records": db.count_records(),
+        "write_behind": write_buffer.stats(),
+        "query_cache": db.query_cache.stats(),
+        "last_import": db.last_import.progress() if db.last_import else None
+    })
 
 if __name__ == '__main__':
     print(f"Starting Database Integration demo server...")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Bulk Import Benchmark
+Loads the same generated CSV rows into a fresh database several ways and
+reports rows per second:
+
+- one ``Database.insert_record()`` transaction per row (what one
+  ``POST /api/data`` per record costs, minus HTTP), on a sample of the rows
+- ``POST /api/data/import`` with a range of ``chunk_size`` values
+- ``POST /api/data/import?drop_indexes=true``
+
+Usage: python bench_import.py [rows] [per_record_sample]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.benchtools import build_environ, call
+from common.loader import load_module
+from database import Database
+
+CHUNK_SIZES = (500, 5000, 50000)
+
+
+def csv_body(rows):
+    lines = ["sensor,value,unit,site"]
+    lines.extend(f"sensor-{i % 97},{i * 0.25},celsius,north" for i in range(rows))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    sample = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    body = csv_body(rows)
+    directory = tempfile.mkdtemp(prefix="bench_import_")
+    print(f"{rows} rows, {len(body) / 2**20:.1f} MiB of CSV")
+    print(f"{'mode':<34}{'rows/s':>12}")
+
+    db = Database(os.path.join(directory, "per_record.db"))
+    start = time.perf_counter()
+    for i in range(sample):
+        db.insert_record({"sensor": f"sensor-{i % 97}", "value": str(i * 0.25),
+                          "unit": "celsius", "site": "north"})
+    print(f"{'per-record transactions':<34}{sample / (time.perf_counter() - start):>12.0f}")
+    db.close()
+
+    os.environ["DATABASE_PATH"] = os.path.join(directory, "app.db")
+    module = load_module("03_database_integration")
+    runs = [(f"import chunk_size={size}", f"chunk_size={size}") for size in CHUNK_SIZES]
+    runs.append(("import drop_indexes", "drop_indexes=true"))
+    for index, (name, query) in enumerate(runs):
+        # Every run loads into an empty database of its own
+        module.db = Database(os.path.join(directory, f"import_{index}.db"))
+        environ = build_environ(f"/api/data/import?{query}", method="POST",
+                                data=body, content_type="text/csv")
+        start = time.perf_counter()
+        status, _, _ = call(module.app, environ)
+        elapsed = time.perf_counter() - start
+        assert status.startswith("201"), status
+        print(f"{name:<34}{rows / elapsed:>12.0f}")
+        module.db.close()
+
+    module.write_buffer.close()
+    module.db.close()
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Pagination Benchmark
+Seeds a database with the given number of records and compares:
+
+- page fetch time at increasing depths with LIMIT/OFFSET against the keyset
+  query behind GET /api/data (``WHERE id > ? ORDER BY id LIMIT ?``)
+- peak Python memory while exporting every row through
+  ``GET /api/data?limit=all`` against building the same response with
+  ``fetchall()`` and ``json.dumps``
+
+Usage: python bench_pagination.py [rows] [page_size]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.benchtools import build_environ
+from common.loader import load_app
+from database import SELECT_RECORDS_AFTER, Database
+
+SELECT_RECORDS_OFFSET = "SELECT id, payload, created_at FROM records ORDER BY id LIMIT ? OFFSET ?"
+PAYLOAD = {"sensor": "temperature", "value": 21.5, "tags": ["lab", "north"]}
+DEPTHS = (0.0, 0.1, 0.5, 0.99)
+REPEAT = 20
+
+
+def seed(db, rows):
+    batch = 10000
+    for start in range(0, rows, batch):
+        db.insert_records([PAYLOAD] * min(batch, rows - start))
+
+
+def page_ms(db, sql, params):
+    with db.connection() as conn:
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            conn.execute(sql, params).fetchall()
+        return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def export_streamed(app):
+    """Consume GET /api/data?limit=all chunk by chunk, as a socket would."""
+    result = app.wsgi_app(build_environ("/api/data?limit=all"), lambda status, headers: None)
+    size = 0
+    try:
+        for chunk in result:
+            size += len(chunk)
+    finally:
+        result.close()
+    return size
+
+
+def export_buffered(db):
+    with db.connection() as conn:
+        rows = conn.execute("SELECT id, payload, created_at FROM records ORDER BY id").fetchall()
+    body = json.dumps({"data": [{"id": row_id, "payload": json.loads(payload), "created_at": created_at}
+                                for row_id, payload, created_at in rows]})
+    return len(body)
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    directory = tempfile.mkdtemp(prefix="bench_pagination_")
+    path = os.path.join(directory, "bench.db")
+    os.environ["DATABASE_PATH"] = path
+    app = load_app("03_database_integration")
+    db = Database(path)
+    seed(db, rows)
+    print(f"{rows} rows, {page_size} per page")
+
+    print(f"{'depth':>8}{'offset ms':>12}{'keyset ms':>12}")
+    for depth in DEPTHS:
+        skip = int(rows * depth)
+        offset = page_ms(db, SELECT_RECORDS_OFFSET, (page_size, skip))
+        # ids start at 1, so the row after ``skip`` rows has id skip + 1
+        keyset = page_ms(db, SELECT_RECORDS_AFTER, (skip, page_size))
+        print(f"{depth:>8.0%}{offset:>12.3f}{keyset:>12.3f}")
+
+    print(f"{'export':<10}{'MiB':>10}{'seconds':>10}{'peak MiB':>10}")
+    for name, fn, arg in (("streamed", export_streamed, app), ("buffered", export_buffered, db)):
+        size, elapsed, peak = measure(fn, arg)
+        print(f"{name:<10}{size / 2**20:>10.1f}{elapsed:>10.2f}{peak / 2**20:>10.1f}")
+
+    db.close()
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Query Cache Benchmark
+Replays a dashboard workload against a seeded database: repeated
+``Database.summary()`` reads with one committed insert every ``reads_per_write``
+reads. Compares the read-through query cache against running every query,
+and reports the hit rate and the number of invalidations.
+
+Usage: python bench_query_cache.py [rows] [reads] [reads_per_write]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from database import Database
+
+PAYLOAD = {"sensor": "temperature", "value": 21.5, "tags": ["lab", "north"]}
+
+
+def run(path, cache_size, reads, reads_per_write):
+    db = Database(path, query_cache_size=cache_size)
+    start = time.perf_counter()
+    for i in range(1, reads + 1):
+        db.summary()
+        if i % reads_per_write == 0:
+            db.insert_record(PAYLOAD)
+    elapsed = time.perf_counter() - start
+    stats = db.query_cache.stats()
+    db.close()
+    return reads / elapsed, stats
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    reads = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    reads_per_write = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    directory = tempfile.mkdtemp(prefix="bench_query_cache_")
+    path = os.path.join(directory, "bench.db")
+    db = Database(path)
+    for start in range(0, rows, 10000):
+        db.insert_records([PAYLOAD] * min(10000, rows - start))
+    db.close()
+
+    print(f"{rows} rows, {reads} dashboard reads, one write per {reads_per_write} reads")
+    print(f"{'mode':<10}{'reads/s':>10}{'hit rate':>10}{'invalidations':>15}")
+    # A zero-entry cache evicts every result at once, so every read hits SQLite
+    for name, cache_size in (("uncached", 0), ("cached", 1024)):
+        rate, stats = run(path, cache_size, reads, reads_per_write)
+        print(f"{name:<10}{rate:>10.0f}{stats['hit_rate']:>10.2f}{stats['invalidations']:>15}")
+
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
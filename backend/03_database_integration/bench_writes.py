@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Insert Throughput Benchmark
+Measures committed inserts per second with 1, 8 and 64 concurrent writer
+threads, comparing one commit per request against the write-behind buffer
+(every writer still waits for its own record to be committed). The database
+runs with synchronous=FULL, so every commit is fsynced as a durable write
+would be; pass NORMAL as the second argument to compare.
+
+Usage: python bench_writes.py [seconds_per_run] [FULL|NORMAL]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from database import Database, WriteBehindBuffer
+
+WRITER_COUNTS = (1, 8, 64)
+PAYLOAD = {"sensor": "temperature", "value": 21.5, "tags": ["lab", "north"]}
+
+
+def run(mode, writers, seconds, synchronous):
+    directory = tempfile.mkdtemp(prefix="bench_writes_", dir=os.path.dirname(os.path.abspath(__file__)))
+    db = Database(os.path.join(directory, "bench.db"), pool_size=min(writers, 8),
+                  synchronous=synchronous)
+    buffer = WriteBehindBuffer(db) if mode == "write-behind" else None
+    counts = [0] * writers
+    stop = threading.Event()
+    latencies = []
+    lock = threading.Lock()
+
+    def writer(slot):
+        local = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            if buffer is None:
+                db.insert_record(PAYLOAD)
+            else:
+                buffer.insert(PAYLOAD, durable=True)
+            local.append(time.perf_counter() - start)
+            counts[slot] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if buffer is not None:
+        buffer.close()
+    stored = db.count_records()
+    db.close()
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+    assert stored == sum(counts), (stored, sum(counts))
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0.0
+    return sum(counts) / seconds, p99 * 1000
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    synchronous = sys.argv[2].upper() if len(sys.argv) > 2 else "FULL"
+    print(f"synchronous={synchronous}")
+    print(f"{'mode':<20}{'writers':>8}{'inserts/s':>12}{'p99 ms':>10}")
+    for mode in ("commit-per-request", "write-behind"):
+        for writers in WRITER_COUNTS:
+            rate, p99 = run(mode, writers, seconds, synchronous)
+            print(f"{mode:<20}{writers:>8}{rate:>12.0f}{p99:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,466 @@
+"""
+SQLite Persistence
+A small storage layer for the Database Integration demo:
+
+- SQLite in WAL mode, so readers never block the single writer
+- a bounded connection pool shared by the request threads; waiting longer
+  than ``pool_timeout`` for a connection raises ``PoolExhausted``
+- sqlite3's per-connection prepared-statement cache (``cached_statements``),
+  hit because every query below is a fixed SQL string
+- a read-through query result cache (``query_cache.py``) invalidated by
+  per-table version counters that every committed write bumps, kept in a
+  ``<database>-versions`` file so that other processes see the bumps too
+- fork safety: SQLite connections must not be used across ``fork()``, so a
+  forked process (a pre-forking server's worker) starts with an empty pool
+  and its own write-behind writer thread
+- bulk imports through ``executemany`` in large transactions, optionally
+  with the secondary indexes dropped during the load and rebuilt after it
+- a write-behind buffer that groups inserts from concurrent requests into
+  shared transactions (group commit), at most ``batch_size`` records each
+"""
+
+import base64
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+
+from query_cache import QueryCache, SharedTableVersions, TableVersions
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_created_at ON records (created_at);
+"""
+
+INSERT_RECORD = "INSERT INTO records (payload, created_at) VALUES (?, ?)"
+COUNT_RECORDS = "SELECT COUNT(*) FROM records"
+# Keyset pagination: seek on the primary key instead of skipping OFFSET rows,
+# so page N costs the same as page 1
+SELECT_RECORDS_AFTER = ("SELECT id, payload, created_at FROM records "
+                        "WHERE id > ? ORDER BY id LIMIT ?")
+FETCH_SIZE = 500
+SECONDARY_INDEXES = ("SELECT name, sql FROM sqlite_master "
+                     "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL")
+SUMMARY_RECORDS = "SELECT COUNT(*), MIN(created_at), MAX(created_at) FROM records"
+RECORDS_PER_HOUR = """
+    SELECT substr(created_at, 1, 13) AS hour, COUNT(*)
+    FROM records
+    GROUP BY hour
+    ORDER BY hour DESC
+    LIMIT ?
+"""
+
+
+def encode_cursor(last_id):
+    """Opaque pagination token for the page after ``last_id``."""
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(token):
+    """Inverse of ``encode_cursor``; raises ValueError for foreign tokens."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("malformed cursor")
+    kind, _, value = raw.partition(":")
+    if kind != "id" or not value.isdigit():
+        raise ValueError("malformed cursor")
+    return int(value)
+
+
+class PoolExhausted(Exception):
+    """No pooled connection became free within the pool timeout."""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Database busy, no connection available")
+        self.retry_after = retry_after
+
+
+class Database:
+    """SQLite database with a bounded pool of WAL-mode connections."""
+
+    def __init__(self, path, pool_size=8, statement_cache_size=256, timeout=30.0,
+                 synchronous="NORMAL", query_cache_size=1024, pool_timeout=5.0):
+        self.path = path
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.synchronous = synchronous
+        self.statement_cache_size = statement_cache_size
+        self.timeout = timeout
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # Connections inherited through fork(): never used, and never closed
+        # either, since closing one can checkpoint or remove the parent's WAL
+        self._inherited = []
+        os.register_at_fork(after_in_child=self._after_fork_in_child)
+        self.versions = (TableVersions() if path == ":memory:"
+                         else SharedTableVersions(f"{path}-versions"))
+        self.last_import = None
+        self.query_cache = QueryCache(self.versions, max_entries=query_cache_size)
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            self.tables = tuple(name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' "
+                "AND name NOT LIKE 'sqlite_%'"))
+
+    def _after_fork_in_child(self):
+        self._inherited.extend(self._pool.queue)
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            cached_statements=self.statement_cache_size,
+            # Connections move between request threads through the pool
+            check_same_thread=False,
+            # Transactions are opened explicitly with BEGIN
+            isolation_level=None,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only risks the last transactions on power loss;
+        # FULL fsyncs the log on every commit
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for the duration of the block."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.pool_size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    conn = self._connect()
+                except BaseException:
+                    # Give the slot back, or the pool would shrink for good
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._pool.get(timeout=self.pool_timeout)
+                except queue.Empty:
+                    raise PoolExhausted() from None
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self, writes=None):
+        """Run the block in one IMMEDIATE transaction and commit once.
+
+        After the commit the versions of the ``writes`` tables (every table
+        when not given) are bumped, invalidating cached reads of them.
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                # Also when COMMIT itself fails: the connection must not go
+                # back to the pool inside a transaction
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+        self.versions.bump(*(self.tables if writes is None else writes))
+
+    def query(self, sql, params=(), tables=None, cache=True):
+        """Run a read-only query and return all rows, through the query cache."""
+        def load():
+            with self.connection() as conn:
+                return conn.execute(sql, params).fetchall()
+
+        if not cache:
+            return load()
+        return self.query_cache.get_or_load(sql, params, load, tables)
+
+    # Records ----------------------------------------------------------------
+
+    @staticmethod
+    def encode(payload):
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+    def insert_record(self, payload):
+        """Insert one record in its own transaction; returns its id."""
+        with self.transaction(writes=("records",)) as conn:
+            cursor = conn.execute(INSERT_RECORD, (self.encode(payload), datetime.now().isoformat()))
+            return cursor.lastrowid
+
+    def insert_records(self, payloads):
+        """Insert many records in a single transaction; returns the count."""
+        created_at = datetime.now().isoformat()
+        rows = [(self.encode(payload), created_at) for payload in payloads]
+        with self.transaction(writes=("records",)) as conn:
+            conn.executemany(INSERT_RECORD, rows)
+        return len(rows)
+
+    def iter_records(self, after_id=0, limit=-1, fetch_size=FETCH_SIZE, dedicated=False):
+        """Yield ``(id, payload_json, created_at)`` rows with ``id > after_id``.
+
+        Rows come straight off the cursor ``fetch_size`` at a time, so memory
+        stays flat however many rows are read; ``limit=-1`` reads to the end.
+        ``payload_json`` is the stored JSON text, ready to embed as is.
+
+        ``dedicated`` reads on a connection of its own instead of a pooled
+        one. Use it for reads paced by a client (a full export), which would
+        otherwise hold a pool slot for as long as the download takes.
+        """
+        if dedicated:
+            conn = self._connect()
+            try:
+                yield from self._fetch_records(conn, after_id, limit, fetch_size)
+            finally:
+                conn.close()
+        else:
+            with self.connection() as conn:
+                yield from self._fetch_records(conn, after_id, limit, fetch_size)
+
+    @staticmethod
+    def _fetch_records(conn, after_id, limit, fetch_size):
+        cursor = conn.execute(SELECT_RECORDS_AFTER, (after_id, limit))
+        try:
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    def count_records(self):
+        return self.query(COUNT_RECORDS)[0][0]
+
+    @contextmanager
+    def bulk_import(self, commit_every=100000, drop_indexes=False, progress=None):
+        """Yield a ``BulkImport`` that loads batches of records into ``records``.
+
+        Rows are committed every ``commit_every`` rows, so a failed import
+        keeps what was committed before the failure. With ``drop_indexes``
+        the secondary indexes of the table are dropped first and rebuilt
+        once at the end, which is cheaper than maintaining them row by row.
+        """
+        with self.connection() as conn:
+            dropped = []
+            if drop_indexes:
+                dropped = conn.execute(SECONDARY_INDEXES, ("records",)).fetchall()
+                for name, _ in dropped:
+                    conn.execute(f'DROP INDEX "{name}"')
+            loader = BulkImport(self, conn, commit_every, progress)
+            loader.indexes_dropped = [name for name, _ in dropped]
+            self.last_import = loader
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield loader
+                    conn.execute("COMMIT")
+                except BaseException:
+                    # No transaction is open when the BEGIN after an
+                    # intermediate commit failed; ROLLBACK would then raise
+                    # and hide the real error
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    loader.state = "failed"
+                    raise
+                loader.commits += 1
+                loader.committed = loader.rows
+            finally:
+                self.versions.bump("records")
+                if dropped:
+                    loader.state = "rebuilding indexes"
+                    started = time.perf_counter()
+                    for _, sql in dropped:
+                        conn.execute(sql)
+                    loader.index_seconds = time.perf_counter() - started
+                if loader.state != "failed":
+                    loader.state = "done"
+                loader.finished = time.perf_counter()
+
+    def summary(self, hours=24):
+        """Dashboard totals: record count, time range and per-hour counts."""
+        count, first, last = self.query(SUMMARY_RECORDS)[0]
+        return {
+            "records": count,
+            "first_created_at": first,
+            "last_created_at": last,
+            "per_hour": [{"hour": hour, "records": records}
+                         for hour, records in self.query(RECORDS_PER_HOUR, (hours,))],
+        }
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class BulkImport:
+    """Batch handler for ``Database.bulk_import()``; tracks load progress."""
+
+    def __init__(self, db, conn, commit_every, progress=None):
+        self.db = db
+        self.conn = conn
+        self.commit_every = commit_every
+        self.progress_callback = progress
+        self.created_at = datetime.now().isoformat()
+        self.rows = 0
+        self.committed = 0
+        self.commits = 0
+        self.indexes_dropped = []
+        self.index_seconds = 0.0
+        self.state = "loading"
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def __call__(self, batch):
+        encode, created_at = self.db.encode, self.created_at
+        self.conn.executemany(INSERT_RECORD, [(encode(payload), created_at) for payload in batch])
+        self.rows += len(batch)
+        if self.rows - self.committed >= self.commit_every:
+            self.conn.execute("COMMIT")
+            self.db.versions.bump("records")
+            self.commits += 1
+            self.committed = self.rows
+            if self.progress_callback is not None:
+                self.progress_callback(self.progress())
+            self.conn.execute("BEGIN IMMEDIATE")
+
+    def progress(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return {
+            "state": self.state,
+            "rows": self.rows,
+            "committed_rows": self.committed,
+            "commits": self.commits,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed) if elapsed > 0 else 0,
+            "indexes_dropped": self.indexes_dropped,
+            "index_rebuild_seconds": round(self.index_seconds, 3),
+        }
+
+
+class WriteBehindBuffer:
+    """Group inserts from concurrent requests into shared transactions.
+
+    ``submit()`` queues a record and returns a Future that resolves to the
+    new row id once the transaction holding it has committed. A background
+    writer gathers everything queued while its previous commit was running
+    and commits it as one transaction of at most ``batch_size`` records: no
+    timer, so a lone write commits straight away and batches grow with load.
+    With ``linger`` > 0 it also waits up to that many seconds for stragglers
+    once the queue runs dry, which helps fire-and-forget (non-durable)
+    writers at the cost of latency for durable ones.
+    """
+
+    def __init__(self, db, batch_size=256, linger=0.0):
+        self.db = db
+        self.batch_size = batch_size
+        self.linger = linger
+        self._queue = queue.Queue()
+        self._closed = False
+        self.batches = 0
+        self.records = 0
+        self._writer = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._writer.start()
+        os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def _after_fork_in_child(self):
+        # The writer thread stayed in the parent, along with whatever it had
+        # queued; this process commits its own records
+        if not self._closed:
+            self._queue = queue.Queue()
+            self._writer = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._writer.start()
+
+    def submit(self, payload):
+        if self._closed:
+            raise RuntimeError("write-behind buffer is closed")
+        future = Future()
+        self._queue.put((self.db.encode(payload), future))
+        return future
+
+    def insert(self, payload, durable=True, timeout=None):
+        """Queue a record; with ``durable`` wait for its commit and return the id."""
+        future = self.submit(payload)
+        return future.result(timeout) if durable else None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.linger
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    # Group commit: whatever queued up while the previous
+                    # commit ran is the batch. Only a linger waits for more,
+                    # and never past its deadline
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        created_at = datetime.now().isoformat()
+        try:
+            ids = []
+            with self.db.transaction(writes=("records",)) as conn:
+                for encoded, _ in batch:
+                    ids.append(conn.execute(INSERT_RECORD, (encoded, created_at)).lastrowid)
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        self.batches += 1
+        self.records += len(batch)
+        for row_id, (_, future) in zip(ids, batch):
+            future.set_result(row_id)
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize(),
+            "batches": self.batches,
+            "records": self.records,
+            "average_batch": round(self.records / self.batches, 1) if self.batches else 0.0,
+        }
+
+    def close(self):
+        """Commit everything still queued and stop the writer."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._writer.join()
@@ -0,0 +1,185 @@
+"""
+Query Result Cache
+A read-through cache for SQL query results, keyed by the normalized query
+text and its parameters.
+
+Every table carries a version counter that the database bumps after each
+committed write. A cached result remembers the versions of the tables it
+read, taken *before* the query ran; it is served only while all of them are
+unchanged. A write that commits while the query is running therefore makes
+the fresh entry invalid straight away, so results are never served stale.
+``TableVersions`` keeps the versions in process memory;
+``SharedTableVersions`` keeps them in a small file that every process using
+the database maps, so a write in one process invalidates the results cached
+in all of them.
+"""
+
+import fcntl
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+# Quoted literals are kept verbatim; whitespace and keyword case elsewhere
+# do not change what a query means
+_TOKENS = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|\s+|[^\s'"]+""")
+_TABLES = re.compile(r"\b(?:from|join)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """Canonical form of ``sql`` used in cache keys."""
+    parts = []
+    for token in _TOKENS.findall(sql.strip().rstrip(";")):
+        if token[0] in "'\"":
+            parts.append(token)
+        elif not token.isspace():
+            parts.append(token.lower())
+    return " ".join(parts)
+
+
+def tables_read(sql):
+    """Table names a SELECT reads from, by its FROM and JOIN clauses."""
+    return tuple(sorted({name.lower() for name in _TABLES.findall(sql)}))
+
+
+class TableVersions:
+    """Per-table write counters."""
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.bumps = 0
+
+    def snapshot(self, tables):
+        versions = self._versions
+        return tuple(versions.get(table, 0) for table in tables)
+
+    def bump(self, *tables):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+            self.bumps += 1
+
+    def current(self):
+        return dict(self._versions)
+
+
+# Counters in a shared version file; table names hash onto them, and two
+# tables sharing one only cost each other some extra invalidations
+VERSION_SLOTS = 256
+_COUNTER = struct.Struct("<Q")
+
+
+class SharedTableVersions(TableVersions):
+    """``TableVersions`` kept in a memory-mapped file shared between processes.
+
+    Reads are plain loads from the mapping. Bumps take a POSIX record lock
+    on the file, which (unlike flock) is held per process and so also
+    excludes processes forked from this one.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = VERSION_SLOTS * _COUNTER.size
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._mm = mmap.mmap(self._fd, size)
+        self._slots = {}
+        os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def _after_fork_in_child(self):
+        self._lock = threading.Lock()
+
+    def _offset(self, table):
+        offset = self._slots.get(table)
+        if offset is None:
+            offset = self._slots[table] = (zlib.crc32(table.encode()) % VERSION_SLOTS) * _COUNTER.size
+        return offset
+
+    def snapshot(self, tables):
+        mm, offset = self._mm, self._offset
+        return tuple(_COUNTER.unpack_from(mm, offset(table))[0] for table in tables)
+
+    def bump(self, *tables):
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                for table in tables:
+                    offset = self._offset(table)
+                    _COUNTER.pack_into(self._mm, offset, _COUNTER.unpack_from(self._mm, offset)[0] + 1)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            self.bumps += 1
+
+    def current(self):
+        return {table: _COUNTER.unpack_from(self._mm, offset)[0]
+                for table, offset in sorted(self._slots.items())}
+
+
+class QueryCache:
+    """LRU of query results, invalidated by table versions."""
+
+    def __init__(self, versions, max_entries=1024):
+        self.versions = versions
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get_or_load(self, sql, params, load, tables=None):
+        """Return the cached result for ``sql``/``params`` or ``load()`` it.
+
+        ``tables`` defaults to the tables named in FROM/JOIN clauses; pass it
+        explicitly for queries that read tables some other way (views, CTEs).
+        """
+        normalized = normalize_sql(sql)
+        key = (normalized, tuple(params))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_tables, entry_versions, result = entry
+                if self.versions.snapshot(entry_tables) == entry_versions:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._entries[key]
+                self.invalidations += 1
+            self.misses += 1
+
+        tables = tuple(tables) if tables is not None else tables_read(normalized)
+        # Taken before the query runs: a write that lands meanwhile leaves
+        # this entry outdated rather than mislabelled as current
+        versions = self.versions.snapshot(tables)
+        result = load()
+        with self._lock:
+            self._entries[key] = (tables, versions, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "table_versions": self.versions.current(),
+            "version_bumps": self.versions.bumps,
+        }
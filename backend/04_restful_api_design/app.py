@@ -6,9 +6,26 @@ A comprehensive example of RESTful API Design implementation.
 
 from flask import Flask, jsonify, request
 import json
+import os
+import sys
 from datetime import datetime
 
+# Shared helpers live in backend/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.compression import CompressionMiddleware
+from common.conditional import VersionedPayload, conditional
+from common.ingest import ingest_request, wants_streaming_ingest
+from common.json_provider import install_json_provider
+from common.static_responses import PerSecondJSON, StaticJSON, now_iso
+
+from resources import ItemStore, QueryError, ValidationError, parse_fields, project
+
 app = Flask(__name__)
+install_json_provider(app)
+# Compress responses above COMPRESSION_MIN_SIZE bytes for clients that accept it
+COMPRESSION_MIN_SIZE = 512
+app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=COMPRESSION_MIN_SIZE)
 
 # Sample data
 sample_data = {
@@ -22,45 +39,176 @@ sample_data = {
     ]
 }
 
+# In-memory item collection behind /api/items
+ITEM_SEED_COUNT = 1000
+# Upper bound on ids per batch GET and operations per batch write
+BATCH_MAX_ITEMS = 100
+
+items = ItemStore()
+items.seed(ITEM_SEED_COUNT)
+
+# sample_data never changes after startup, so its validators are computed once
+sample_payload = VersionedPayload(sample_data)
+
+# Immutable bodies are serialized once at startup and served as raw bytes;
+# the health body only embeds the time, so it is rebuilt once per second
+home_response = StaticJSON(app, {
+    "service": "RESTful API Design",
+    "status": "running",
+    "endpoints": [
+        "/api/demo",
+        "/api/health",
+        "/api/data",
+        "/api/items",
+        "/api/items/<id>",
+        "/api/items/batch"
+    ]
+})
+demo_response = StaticJSON(app, sample_data)
+health_response = PerSecondJSON(app, lambda: {
+    "status": "healthy",
+    "service": "RESTful API Design",
+    "timestamp": now_iso()
+})
+
 @app.route('/')
 def home():
-    return jsonify({
-        "service": "RESTful API Design",
-        "status": "running",
-        "endpoints": [
-            "/api/demo",
-            "/api/health",
-            "/api/data"
-        ]
-    })
+    return home_response()
 
 @app.route('/api/demo')
+@conditional(sample_payload)
 def demo():
-    return jsonify(sample_data)
+    return demo_response()
 
 @app.route('/api/health')
 def health():
-    return jsonify({
-        "status": "healthy",
-        "service": "RESTful API Design",
-        "timestamp": datetime.now().isoformat()
-    })
+    return health_response()
 
 @app.route('/api/data', methods=['GET', 'POST'])
+@conditional(sample_payload)
 def data():
     if request.method == 'POST':
+        # NDJSON (or a JSON array with ?stream=true) is parsed incrementally
+        # in batches and answered with a summary instead of an echo
+        if wants_streaming_ingest():
+            return jsonify(ingest_request())
         data = request.get_json()
         return jsonify({
             "message": "Data received successfully",
             "received_data": data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         })
     else:
         return jsonify({
             "data": sample_data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
+        })
+
+def error(status, message):
+    return jsonify({"error": message, "status": status}), status
+
+def requested_fields():
+    """Sparse fieldset from ``?fields=``; None means every field."""
+    return parse_fields(request.args.get("fields", ""))
+
+@app.errorhandler(ValidationError)
+def validation_error(exc):
+    return error(422 if request.method != "GET" else 400, str(exc))
+
+@app.errorhandler(QueryError)
+def query_error(exc):
+    return error(400, str(exc))
+
+@app.route('/api/items', methods=['GET', 'POST'])
+def item_collection():
+    # Checked first, so a bad ?fields= does not leave a created item behind
+    fields = requested_fields()
+    if request.method == 'POST':
+        item = items.create(request.get_json())
+        response = jsonify(project(item, fields))
+        response.status_code = 201
+        response.headers["Location"] = f"/api/items/{item['id']}"
+        return response
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", 50, type=int), 1), BATCH_MAX_ITEMS)
+    page, total = items.page(offset, limit)
+    return jsonify({
+        "items": [project(item, fields) for item in page],
+        "offset": offset,
+        "limit": limit,
+        "total": total
+    })
+
+@app.route('/api/items/<int:item_id>', methods=['GET', 'PUT', 'PATCH'])
+def item_resource(item_id):
+    fields = requested_fields()
+    if request.method == 'GET':
+        item = items.get(item_id)
+    else:
+        item = items.update(item_id, request.get_json(), partial=request.method == 'PATCH')
+    if item is None:
+        return error(404, f"Item {item_id} not found")
+    return jsonify(project(item, fields))
+
+@app.route('/api/items/batch', methods=['GET', 'POST'])
+def item_batch():
+    """Many items in one round-trip.
+
+    GET ``?ids=1,2,3`` returns the items found plus the ids that were not.
+    POST ``{"operations": [...]}`` applies creates (``{"method": "POST",
+    "body": {...}}``) and updates (``{"method": "PATCH" | "PUT", "id": 3,
+    "body": {...}}``) one by one and reports a status code per operation;
+    one failing operation does not undo the others.
+    """
+    fields = requested_fields()
+    if request.method == 'GET':
+        try:
+            ids = [int(part) for part in request.args.get("ids", "").split(",") if part.strip()]
+        except ValueError:
+            return error(400, "ids must be a comma-separated list of integers")
+        if not ids or len(ids) > BATCH_MAX_ITEMS:
+            return error(400, f"Pass between 1 and {BATCH_MAX_ITEMS} ids")
+        found, missing = items.get_many(ids)
+        return jsonify({
+            "items": [project(item, fields) for item in found],
+            "missing": missing
         })
 
+    body = request.get_json()
+    operations = body.get("operations") if isinstance(body, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return error(400, "Body must be {\"operations\": [...]}")
+    if len(operations) > BATCH_MAX_ITEMS:
+        return error(400, f"At most {BATCH_MAX_ITEMS} operations per batch")
+    results = [apply_operation(operation, fields) for operation in operations]
+    failed = sum(1 for result in results if result["status"] >= 400)
+    return jsonify({
+        "results": results,
+        "succeeded": len(results) - failed,
+        "failed": failed
+    })
+
+def apply_operation(operation, fields):
+    """Run one batch operation and describe its outcome like a single call would."""
+    if not isinstance(operation, dict):
+        return {"status": 400, "error": "Operation must be an object"}
+    method = str(operation.get("method", "")).upper()
+    try:
+        if method == "POST":
+            item = items.create(operation.get("body"))
+            return {"status": 201, "id": item["id"], "item": project(item, fields)}
+        if method in ("PUT", "PATCH"):
+            item_id = operation.get("id")
+            if not isinstance(item_id, int):
+                return {"status": 400, "error": "Updates need an integer id"}
+            item = items.update(item_id, operation.get("body"), partial=method == "PATCH")
+            if item is None:
+                return {"status": 404, "id": item_id, "error": f"Item {item_id} not found"}
+            return {"status": 200, "id": item_id, "item": project(item, fields)}
+    except ValidationError as exc:
+        return {"status": 422, "id": operation.get("id"), "error": str(exc)}
+    return {"status": 400, "error": "method must be POST, PUT or PATCH"}
+
 if __name__ == '__main__':
     print(f"Starting RESTful API Design demo server...")
     print("Visit: http://localhost:5000")
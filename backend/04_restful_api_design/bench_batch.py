@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Batch API Benchmark
+Compares N single calls with one batch call for reads (GET /api/items/<id>
+vs GET /api/items/batch?ids=...) and writes (PATCH /api/items/<id> vs
+POST /api/items/batch), with and without a ``?fields=`` projection.
+
+Requests run in-process, so the server time excludes the network. The
+client time adds one round-trip per request at the given RTT, which is
+what dominates for latency-bound (mobile) clients.
+
+Usage: python bench_batch.py [items_per_call] [rtt_ms] [repeat]
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.benchtools import build_environ, call
+from common.loader import load_app
+
+FIELDS = "name,price"
+
+
+def run(app, environs, repeat):
+    """Mean server milliseconds for the whole set of requests, and body bytes."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        size = 0
+        for environ in environs:
+            status, _, body = call(app, environ)
+            assert status[0] == "2", status
+            size += len(body)
+    return (time.perf_counter() - start) / repeat * 1000, size
+
+
+def scenarios(count):
+    ids = list(range(1, count + 1))
+    patch = {"stock": 42}
+    id_list = ",".join(map(str, ids))
+    for fields, label in (("", "full"), (FIELDS, "fields")):
+        query = f"?fields={fields}" if fields else ""
+        yield f"read {label}", [
+            [build_environ(f"/api/items/{i}{query}") for i in ids],
+            [build_environ(f"/api/items/batch?ids={id_list}&fields={fields}")],
+        ]
+        operations = [{"method": "PATCH", "id": i, "body": patch} for i in ids]
+        yield f"write {label}", [
+            [build_environ(f"/api/items/{i}{query}", method="PATCH", data=json.dumps(patch),
+                           content_type="application/json") for i in ids],
+            [build_environ(f"/api/items/batch{query}", method="POST",
+                           data=json.dumps({"operations": operations}),
+                           content_type="application/json")],
+        ]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rtt = float(sys.argv[2]) if len(sys.argv) > 2 else 50.0
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    app = load_app("04_restful_api_design")
+
+    print(f"{count} items per call, {rtt:g} ms RTT, mean of {repeat} runs")
+    print(f"{'scenario':<14}{'mode':<8}{'requests':>10}{'server ms':>11}{'bytes':>9}{'client ms':>11}")
+    for name, (singles, batch) in scenarios(count):
+        for mode, environs in (("single", singles), ("batch", batch)):
+            server_ms, size = run(app, environs, repeat)
+            client_ms = server_ms + len(environs) * rtt
+            print(f"{name:<14}{mode:<8}{len(environs):>10}{server_ms:>11.2f}{size:>9}"
+                  f"{client_ms:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
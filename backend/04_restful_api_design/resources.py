@@ -0,0 +1,150 @@
+"""
+Item Resources
+An in-memory collection of items for the RESTful API Design demo, plus the
+helpers behind sparse fieldsets (``?fields=``) and per-item batch results.
+"""
+
+import threading
+from datetime import datetime
+
+ITEM_FIELDS = ("id", "name", "description", "price", "currency", "stock", "tags",
+               "created_at", "updated_at", "version")
+# Fields a client may set; the rest are maintained by the store
+WRITABLE_FIELDS = {
+    "name": str,
+    "description": str,
+    "price": (int, float),
+    "currency": str,
+    "stock": int,
+    "tags": list,
+}
+REQUIRED_FIELDS = ("name", "price")
+DEFAULTS = {"description": "", "currency": "USD", "stock": 0, "tags": []}
+
+
+class ValidationError(ValueError):
+    """The request body does not describe a valid item."""
+
+
+class QueryError(ValueError):
+    """A query parameter is not valid."""
+
+
+def parse_fields(value):
+    """Turn ``?fields=name,price`` into a tuple of keys, or None for all.
+
+    Raises QueryError for keys items do not have. ``id`` is always
+    included so projected objects can still be told apart.
+    """
+    if not value:
+        return None
+    fields = []
+    for name in value.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in ITEM_FIELDS:
+            raise QueryError(f"Unknown field {name!r}")
+        if name not in fields:
+            fields.append(name)
+    if "id" not in fields:
+        fields.insert(0, "id")
+    return tuple(fields)
+
+
+def project(item, fields):
+    """Copy only ``fields`` of ``item``; the item itself when ``fields`` is None."""
+    if fields is None:
+        return item
+    return {name: item[name] for name in fields if name in item}
+
+
+def validate(body, partial=False):
+    """Check a create (or, with ``partial``, update) body; returns the clean dict."""
+    if not isinstance(body, dict):
+        raise ValidationError("Item body must be a JSON object")
+    unknown = sorted(set(body) - set(WRITABLE_FIELDS))
+    if unknown:
+        raise ValidationError(f"Fields cannot be written: {', '.join(unknown)}")
+    if not partial:
+        missing = [name for name in REQUIRED_FIELDS if name not in body]
+        if missing:
+            raise ValidationError(f"Missing required fields: {', '.join(missing)}")
+    for name, value in body.items():
+        expected = WRITABLE_FIELDS[name]
+        # bool is an int subclass but never a sensible price or stock
+        if not isinstance(value, expected) or isinstance(value, bool):
+            raise ValidationError(f"Field {name!r} has the wrong type")
+    if "tags" in body and not all(isinstance(tag, str) for tag in body["tags"]):
+        raise ValidationError("Field 'tags' must be a list of strings")
+    return dict(body)
+
+
+class ItemStore:
+    """Thread-safe in-memory items keyed by integer id."""
+
+    def __init__(self):
+        self._items = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def seed(self, count):
+        for i in range(count):
+            self.create({
+                "name": f"Item {i + 1}",
+                "description": f"Sample catalogue entry number {i + 1} for the demo",
+                "price": round(4.99 + (i % 50) * 1.5, 2),
+                "currency": "USD",
+                "stock": (i * 7) % 120,
+                "tags": ["demo", f"group-{i % 10}"],
+            })
+
+    def get(self, item_id):
+        return self._items.get(item_id)
+
+    def get_many(self, ids):
+        """Return (found items in request order, ids that do not exist)."""
+        items, missing = [], []
+        for item_id in ids:
+            item = self._items.get(item_id)
+            if item is None:
+                missing.append(item_id)
+            else:
+                items.append(item)
+        return items, missing
+
+    def page(self, offset=0, limit=50):
+        with self._lock:
+            ids = sorted(self._items)[offset:offset + limit]
+        return [self._items[item_id] for item_id in ids], len(self._items)
+
+    def create(self, body):
+        fields = validate(body)
+        now = datetime.now().isoformat()
+        with self._lock:
+            item = {"id": self._next_id, **DEFAULTS, **fields,
+                    "created_at": now, "updated_at": now, "version": 1}
+            self._items[item["id"]] = item
+            self._next_id += 1
+        return item
+
+    def update(self, item_id, body, partial=True):
+        """Apply ``body`` to an item; returns the new item or None if missing.
+
+        ``partial`` (PATCH) merges the body into the item, otherwise (PUT) it
+        replaces every writable field. Items are replaced rather than mutated,
+        so readers holding the old dict never observe a half-applied update.
+        """
+        fields = validate(body, partial=partial)
+        with self._lock:
+            current = self._items.get(item_id)
+            if current is None:
+                return None
+            base = current if partial else {**current, **DEFAULTS}
+            item = {**base, **fields, "updated_at": datetime.now().isoformat(),
+                    "version": current["version"] + 1}
+            self._items[item_id] = item
+        return item
+
+    def __len__(self):
+        return len(self._items)
@@ -4,11 +4,48 @@ Authentication Security Demo Server
 A comprehensive example of Authentication Security implementation.
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 import json
+import os
+import sys
+import threading
 from datetime import datetime
 
+# Shared helpers live in backend/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.compression import CompressionMiddleware
+from common.conditional import VersionedPayload, conditional
+from common.ingest import ingest_request, wants_streaming_ingest
+from common.json_provider import install_json_provider
+from common.ratelimit import RateLimitMiddleware, TokenBucketLimiter
+from common.static_responses import PerSecondJSON, StaticJSON, now_iso
+
+from auth import (KeyRing, Overloaded, PasswordHasher, TokenVerifier, issue_token,
+                  require_auth)
+
 app = Flask(__name__)
+install_json_provider(app)
+# Compress responses above COMPRESSION_MIN_SIZE bytes for clients that accept it
+COMPRESSION_MIN_SIZE = 512
+app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=COMPRESSION_MIN_SIZE)
+
+# Per-client-IP token buckets, checked before anything else runs. Logins get
+# a much tighter budget; RATE_LIMIT_PER_SECOND=0 turns the general limit off
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", 20))
+RATE_LIMIT_BURST = 40
+LOGIN_LIMIT_PER_MINUTE = 10
+RATE_LIMIT_CLIENTS = 100_000
+
+rate_limit = RateLimitMiddleware(
+    app.wsgi_app,
+    default=TokenBucketLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST,
+                               capacity=RATE_LIMIT_CLIENTS) if RATE_LIMIT_PER_SECOND else None,
+    routes={"/api/auth/login": TokenBucketLimiter(LOGIN_LIMIT_PER_MINUTE / 60, LOGIN_LIMIT_PER_MINUTE,
+                                                  capacity=RATE_LIMIT_CLIENTS)},
+    exempt=("/api/health",),
+)
+app.wsgi_app = rate_limit
 
 # Sample data
 sample_data = {
@@ -22,45 +59,152 @@ sample_data = {
     ]
 }
 
+# Passwords are hashed with scrypt on PASSWORD_HASH_WORKERS threads; once
+# PASSWORD_HASH_BACKLOG checks are queued, further logins get 503 + Retry-After
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_BACKLOG = 16
+TOKEN_TTL = 3600
+
+hasher = PasswordHasher(workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_BACKLOG)
+# AUTH_SIGNING_KEYS="old:secret,new:secret" (newest last) survives restarts
+keyring = KeyRing.from_env()
+verifier = TokenVerifier(keyring)
+
+users = {"demo": hasher.hash("demo-password")}
+# Unknown usernames are checked against this, so they take as long as known ones
+unknown_user_hash = hasher.hash(os.urandom(16).hex())
+users_lock = threading.Lock()
+
+# sample_data never changes after startup, so its validators are computed once
+sample_payload = VersionedPayload(sample_data)
+
+# Immutable bodies are serialized once at startup and served as raw bytes;
+# the health body only embeds the time, so it is rebuilt once per second
+home_response = StaticJSON(app, {
+    "service": "Authentication Security",
+    "status": "running",
+    "endpoints": [
+        "/api/demo",
+        "/api/health",
+        "/api/data",
+        "/api/auth/register",
+        "/api/auth/login",
+        "/api/auth/me",
+        "/api/secure/data",
+        "/api/auth/stats"
+    ]
+})
+demo_response = StaticJSON(app, sample_data)
+health_response = PerSecondJSON(app, lambda: {
+    "status": "healthy",
+    "service": "Authentication Security",
+    "timestamp": now_iso()
+})
+
 @app.route('/')
 def home():
-    return jsonify({
-        "service": "Authentication Security",
-        "status": "running",
-        "endpoints": [
-            "/api/demo",
-            "/api/health",
-            "/api/data"
-        ]
-    })
+    return home_response()
 
 @app.route('/api/demo')
+@conditional(sample_payload)
 def demo():
-    return jsonify(sample_data)
+    return demo_response()
 
 @app.route('/api/health')
 def health():
-    return jsonify({
-        "status": "healthy",
-        "service": "Authentication Security",
-        "timestamp": datetime.now().isoformat()
-    })
+    return health_response()
 
 @app.route('/api/data', methods=['GET', 'POST'])
+@conditional(sample_payload)
 def data():
     if request.method == 'POST':
+        # NDJSON (or a JSON array with ?stream=true) is parsed incrementally
+        # in batches and answered with a summary instead of an echo
+        if wants_streaming_ingest():
+            return jsonify(ingest_request())
         data = request.get_json()
         return jsonify({
             "message": "Data received successfully",
             "received_data": data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         })
     else:
         return jsonify({
             "data": sample_data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         })
 
+def error(status, message):
+    return jsonify({"error": message, "status": status}), status
+
+@app.errorhandler(Overloaded)
+def overloaded(exc):
+    response = jsonify({"error": str(exc), "status": 503})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(exc.retry_after)
+    return response
+
+def credentials():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return None, None
+    username, password = body.get("username"), body.get("password")
+    if not isinstance(username, str) or not isinstance(password, str) or not username or not password:
+        return None, None
+    return username, password
+
+@app.route('/api/auth/register', methods=['POST'])
+def register():
+    username, password = credentials()
+    if username is None:
+        return error(400, "username and password are required")
+    if len(password) < 8:
+        return error(422, "password must be at least 8 characters")
+    encoded = hasher.hash(password)
+    with users_lock:
+        if username in users:
+            return error(409, f"User {username!r} already exists")
+        users[username] = encoded
+    return jsonify({"message": "User registered", "username": username}), 201
+
+@app.route('/api/auth/login', methods=['POST'])
+def login():
+    username, password = credentials()
+    if username is None:
+        return error(400, "username and password are required")
+    encoded = users.get(username)
+    valid = hasher.verify(password, encoded or unknown_user_hash)
+    if encoded is None or not valid:
+        return error(401, "Invalid username or password")
+    return jsonify({
+        "access_token": issue_token(keyring, username, ttl=TOKEN_TTL),
+        "token_type": "Bearer",
+        "expires_in": TOKEN_TTL
+    })
+
+@app.route('/api/auth/me')
+@require_auth(verifier)
+def me():
+    return jsonify({"user": g.claims["sub"], "expires": g.claims["exp"], "key_id": g.claims["kid"]})
+
+@app.route('/api/secure/data')
+@require_auth(verifier)
+@conditional(sample_payload)
+def secure_data():
+    return demo_response()
+
+@app.route('/api/auth/stats')
+def auth_stats():
+    return jsonify({
+        "password_hashing": hasher.stats(),
+        "tokens": verifier.stats(),
+        "rate_limit": {
+            "rejected": rate_limit.rejected,
+            "default": rate_limit.default.stats() if rate_limit.default else None,
+            "login": rate_limit.routes[0][1].stats()
+        }
+    })
+
 if __name__ == '__main__':
     print(f"Starting Authentication Security demo server...")
     print("Visit: http://localhost:5000")
@@ -0,0 +1,271 @@
+"""
+Authentication
+Password hashing and bearer tokens for the Authentication Security demo.
+
+- ``PasswordHasher`` runs scrypt in a small worker pool with a bounded
+  backlog; a burst of logins queues there (or is turned away) instead of
+  tying up every request thread. hashlib releases the GIL while hashing.
+  A forked process starts its own pool.
+- ``KeyRing`` holds the HMAC signing keys, loaded once; ``rotate()`` signs
+  new tokens with a new key while older keys keep verifying until retired.
+- ``TokenVerifier`` checks ``<payload>.<signature>`` tokens and remembers
+  verified ones by SHA-256 digest until the expiry inside the token, so a
+  repeat request costs one hash and a dict lookup.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import wraps
+
+from flask import g, jsonify, request
+
+
+class Overloaded(Exception):
+    """The password hashing backlog is full; the client should retry later."""
+
+    def __init__(self, retry_after):
+        super().__init__("Too many concurrent password checks")
+        self.retry_after = retry_after
+
+
+class InvalidToken(Exception):
+    """A bearer token is malformed, forged, signed by an unknown key or expired."""
+
+
+def b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+# Passwords -----------------------------------------------------------------
+
+class PasswordHasher:
+    """scrypt hashing on ``workers`` threads with at most ``max_pending`` jobs."""
+
+    def __init__(self, workers=2, max_pending=32, n=2 ** 14, r=8, p=1, timeout=5.0):
+        self.n, self.r, self.p = n, r, p
+        self.timeout = timeout
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.rejected = 0
+        self._average = 0.05
+        os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def _after_fork_in_child(self):
+        # The pool's threads stayed in the parent, and a forked pool never
+        # starts new ones while it counts the (dead) old ones as idle
+        self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                        thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def _scrypt(self, password, salt, n, r, p):
+        start = time.perf_counter()
+        digest = hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                                maxmem=256 * n * r + 1024 * 1024, dklen=32)
+        # Running average of one hash, used to suggest a Retry-After
+        self._average = self._average * 0.9 + (time.perf_counter() - start) * 0.1
+        return digest
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise Overloaded(self.retry_after())
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            raise Overloaded(self.retry_after())
+
+    def retry_after(self):
+        """Seconds a full backlog needs to drain, rounded up to at least 1."""
+        return max(1, round(self.max_pending / self.workers * self._average))
+
+    def hash(self, password):
+        salt = os.urandom(16)
+        digest = self._run(self._scrypt, password, salt, self.n, self.r, self.p)
+        return f"scrypt${self.n}${self.r}${self.p}${b64encode(salt)}${b64encode(digest)}"
+
+    def verify(self, password, encoded):
+        """Constant-time check of ``password`` against a stored hash."""
+        try:
+            scheme, n, r, p, salt, expected = encoded.split("$")
+        except ValueError:
+            return False
+        if scheme != "scrypt":
+            return False
+        digest = self._run(self._scrypt, password, b64decode(salt), int(n), int(r), int(p))
+        return hmac.compare_digest(digest, b64decode(expected))
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "average_hash_ms": round(self._average * 1000, 1),
+        }
+
+
+# Signing keys --------------------------------------------------------------
+
+class KeyRing:
+    """HMAC-SHA256 signing keys by key id; the newest one signs."""
+
+    def __init__(self, keys=None):
+        self._keys = OrderedDict()
+        self.current = None
+        for kid, secret in (keys or {}).items():
+            self.rotate(kid, secret)
+
+    @classmethod
+    def from_env(cls, name="AUTH_SIGNING_KEYS"):
+        """Load ``kid:secret,kid:secret`` (oldest first) or make a random key."""
+        value = os.environ.get(name, "")
+        keys = OrderedDict()
+        for part in value.split(","):
+            kid, _, secret = part.strip().partition(":")
+            if kid and secret:
+                keys[kid] = secret.encode("utf-8")
+        if not keys:
+            # Tokens from a previous run stop verifying, which is fine for a demo
+            keys["k1"] = secrets.token_bytes(32)
+        return cls(keys)
+
+    def rotate(self, kid=None, secret=None):
+        """Add a key and sign with it from now on; returns its id."""
+        kid = kid or f"k{len(self._keys) + 1}-{secrets.token_hex(2)}"
+        self._keys[kid] = secret or secrets.token_bytes(32)
+        self.current = kid
+        return kid
+
+    def retire(self, kid):
+        """Stop accepting tokens signed with ``kid``."""
+        if kid == self.current:
+            raise ValueError("Cannot retire the signing key; rotate first")
+        self._keys.pop(kid, None)
+
+    def get(self, kid):
+        return self._keys.get(kid)
+
+    def ids(self):
+        return list(self._keys)
+
+
+# Tokens --------------------------------------------------------------------
+
+def issue_token(keyring, subject, ttl=3600, **claims):
+    now = int(time.time())
+    payload = {"sub": subject, "iat": now, "exp": now + ttl, "kid": keyring.current, **claims}
+    body = b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    signature = hmac.new(keyring.get(keyring.current), body.encode("ascii"), hashlib.sha256)
+    return f"{body}.{b64encode(signature.digest())}"
+
+
+class TokenVerifier:
+    """Verify bearer tokens, caching successes until the token expires."""
+
+    def __init__(self, keyring, cache_size=4096):
+        self.keyring = keyring
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self, token):
+        """Return the token's claims or raise InvalidToken."""
+        # Cache by digest so the cache never holds usable credentials
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+        now = time.time()
+        with self._lock:
+            claims = self._cache.get(key)
+            if claims is not None:
+                if claims["exp"] > now and self.keyring.get(claims["kid"]) is not None:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return claims
+                del self._cache[key]
+            self.misses += 1
+
+        claims = self._check(token, now)
+        with self._lock:
+            self._cache[key] = claims
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return claims
+
+    def _check(self, token, now):
+        body, _, signature = token.partition(".")
+        try:
+            payload = json.loads(b64decode(body))
+            signature = b64decode(signature)
+        except ValueError:
+            raise InvalidToken("Malformed token")
+        if (not isinstance(payload, dict) or not isinstance(payload.get("exp"), int)
+                or not isinstance(payload.get("kid"), str)):
+            raise InvalidToken("Malformed token")
+        secret = self.keyring.get(payload["kid"])
+        if secret is None:
+            raise InvalidToken("Unknown signing key")
+        expected = hmac.new(secret, body.encode("ascii"), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, signature):
+            raise InvalidToken("Bad signature")
+        if payload["exp"] <= now:
+            raise InvalidToken("Token expired")
+        return payload
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "signing_key": self.keyring.current,
+            "accepted_keys": self.keyring.ids(),
+        }
+
+
+def require_auth(verifier):
+    """Decorator: reject the request with 401 unless it has a valid bearer token.
+
+    The token's claims are available as ``g.claims`` in the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            header = request.headers.get("Authorization", "")
+            scheme, _, token = header.partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return unauthorized("Missing bearer token")
+            try:
+                g.claims = verifier.verify(token.strip())
+            except InvalidToken as exc:
+                return unauthorized(str(exc))
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def unauthorized(message):
+    response = jsonify({"error": message, "status": 401})
+    response.status_code = 401
+    response.headers["WWW-Authenticate"] = 'Bearer realm="api"'
+    return response
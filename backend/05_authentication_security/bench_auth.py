@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Authentication Benchmark
+1. Throughput of an unauthenticated GET (/api/demo) against the same body
+   behind a bearer token (/api/secure/data), which goes through the
+   verified-token cache.
+2. A brute-force-sized burst of concurrent failed logins from distinct
+   IPs (so the per-IP login rate limit does not stop them first): reports
+   login latency for the attempts that were hashed, how many were turned
+   away with 503 + Retry-After, and the latency of /api/health requests
+   made while the burst is running.
+
+The general per-IP rate limit is switched off, since every request here
+comes from the same address.
+
+Usage: python bench_auth.py [requests] [burst_size]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.benchtools import build_environ, call, time_requests
+from common.loader import load_app
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else 0.0
+
+
+def throughput(app, count):
+    login = build_environ("/api/auth/login", method="POST", content_type="application/json",
+                          data=json.dumps({"username": "demo", "password": "demo-password"}))
+    token = json.loads(call(app, login)[2])["access_token"]
+    plain = build_environ("/api/demo")
+    secured = build_environ("/api/secure/data", headers={"Authorization": f"Bearer {token}"})
+    for name, environ in (("unauthenticated", plain), ("bearer token", secured)):
+        micros, (status, _, _) = time_requests(app, environ, count)
+        assert status.startswith("200"), status
+        print(f"{name:<18}{1e6 / micros:>12.0f} req/s{micros:>10.1f} us")
+
+
+def burst(app, size):
+    body = json.dumps({"username": "demo", "password": "wrong-guess"})
+    health = build_environ("/api/health")
+    barrier = threading.Barrier(size + 1)
+    results = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def attacker(number):
+        attempt = build_environ("/api/auth/login", method="POST", data=body,
+                                content_type="application/json")
+        attempt["REMOTE_ADDR"] = f"10.0.{number >> 8 & 255}.{number & 255}"
+        barrier.wait()
+        start = time.perf_counter()
+        status = call(app, attempt)[0]
+        with lock:
+            results.append((status[:3], time.perf_counter() - start))
+
+    probes = []
+
+    def prober():
+        barrier.wait()
+        while not done.is_set():
+            start = time.perf_counter()
+            call(app, health)
+            probes.append(time.perf_counter() - start)
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=attacker, args=(i,)) for i in range(size)]
+    probe = threading.Thread(target=prober)
+    start = time.perf_counter()
+    # Everyone waits on the barrier, so all attempts arrive at once
+    for thread in threads + [probe]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    probe.join()
+
+    hashed = [latency for status, latency in results if status == "401"]
+    rejected = [latency for status, latency in results if status == "503"]
+    print(f"burst of {size} failed logins finished in {elapsed:.2f} s")
+    print(f"  hashed   {len(hashed):>5}  p50 {percentile(hashed, 0.5) * 1000:>8.1f} ms"
+          f"  p99 {percentile(hashed, 0.99) * 1000:>8.1f} ms"
+          f"  max {max(hashed, default=0) * 1000:>8.1f} ms")
+    print(f"  rejected {len(rejected):>5}  p99 {percentile(rejected, 0.99) * 1000:>8.1f} ms (503)")
+    print(f"  /api/health during burst: {len(probes)} requests,"
+          f" p99 {percentile(probes, 0.99) * 1000:.1f} ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    os.environ["RATE_LIMIT_PER_SECOND"] = "0"
+    app = load_app("05_authentication_security")
+    throughput(app, count)
+    burst(app, size)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,93 @@ Middleware Error Handling Demo Server
 A comprehensive example of Middleware Error Handling implementation.
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+from flask.logging import default_handler
 import json
+import logging
+import os
+import sys
 from datetime import datetime
 
+# Shared helpers live in backend/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.admission import AdmissionMiddleware, ConcurrencyLimiter
+from common.async_logging import AccessLogMiddleware, LogPipeline
+from common.compression import CompressionMiddleware
+from common.conditional import VersionedPayload, conditional
+from common.ingest import ingest_request, wants_streaming_ingest
+from common.json_provider import install_json_provider
+from common.metrics import MetricsMiddleware
+from common.profiling import ProfilingMiddleware
+from common.static_responses import PerSecondJSON, StaticJSON, now_iso
+
 app = Flask(__name__)
+install_json_provider(app)
+# Per-route latency histograms; this wraps Flask directly so the matched
+# URL rule is still known when the response starts
+metrics = MetricsMiddleware(app.wsgi_app)
+app.wsgi_app = metrics
+# Opt-in request profiling: a random PROFILE_SAMPLE_RATE of requests, plus any
+# request whose X-Profile-Token header matches PROFILE_SECRET. Both are off by
+# default; the /api/profile endpoints need the secret and can change the rate
+# on a running server
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SECRET = os.environ.get("PROFILE_SECRET") or None
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "cprofile")
+profiler = ProfilingMiddleware(app.wsgi_app, sample_rate=PROFILE_SAMPLE_RATE,
+                               secret=PROFILE_SECRET, mode=PROFILE_MODE,
+                               exempt=("/api/profile", "/api/metrics"))
+app.wsgi_app = profiler
+# Compress responses above COMPRESSION_MIN_SIZE bytes for clients that accept it
+COMPRESSION_MIN_SIZE = 512
+app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=COMPRESSION_MIN_SIZE)
+# Admission control: at most ADMISSION_LIMIT requests run at once (0 turns it
+# off), ADMISSION_QUEUE more may wait up to ADMISSION_QUEUE_TIMEOUT seconds,
+# and the rest get an immediate 503. /api/data, which also takes bulk
+# uploads, has a tighter limit of its own. With ADMISSION_LATENCY_TARGET
+# (seconds) the limits adapt to observed latency instead of staying fixed.
+# Outermost, so a rejected request costs as little as possible
+ADMISSION_LIMIT = int(os.environ.get("ADMISSION_LIMIT", "64"))
+ADMISSION_QUEUE = int(os.environ.get("ADMISSION_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "0.1"))
+ADMISSION_LATENCY_TARGET = float(os.environ.get("ADMISSION_LATENCY_TARGET", "0")) or None
+DATA_ADMISSION_LIMIT = 16
+admission = None
+if ADMISSION_LIMIT:
+    def concurrency_limit(limit):
+        return ConcurrencyLimiter(limit, queue_size=ADMISSION_QUEUE,
+                                  queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+                                  latency_target=ADMISSION_LATENCY_TARGET)
+
+    admission = AdmissionMiddleware(
+        app.wsgi_app,
+        default=concurrency_limit(ADMISSION_LIMIT),
+        routes={"/api/data": concurrency_limit(min(DATA_ADMISSION_LIMIT, ADMISSION_LIMIT))},
+        # Health checks and monitoring must keep answering under overload
+        exempt=("/api/health", "/api/metrics", "/api/admission"),
+    )
+    app.wsgi_app = admission
+# Access and error logs go through a queue to a background writer, which
+# batches them into LOG_DIR/app.log (rotated at 64 MiB) and, when LOG_CONSOLE
+# is on (the default for the dev server), the console, so request threads
+# never block on file or console writes. ACCESS_LOG=0 turns the per-request
+# lines off; errors are logged either way
+LOG_DIR = os.environ.get("LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs"))
+ACCESS_LOG = os.environ.get("ACCESS_LOG", "1") != "0"
+LOG_CONSOLE = os.environ.get("LOG_CONSOLE", "1" if __name__ == '__main__' else "0") != "0"
+log_pipeline = LogPipeline(os.path.join(LOG_DIR, "app.log"),
+                           console=sys.stderr if LOG_CONSOLE else None).start()
+app.logger.removeHandler(default_handler)
+for logger in (app.logger, logging.getLogger("werkzeug")):
+    logger.addHandler(log_pipeline.handler)
+access_logger = logging.getLogger("access")
+access_logger.setLevel(logging.INFO)
+access_logger.propagate = False
+access_logger.addHandler(log_pipeline.handler)
+if ACCESS_LOG:
+    # Outermost, so shed (503) requests are logged too
+    app.wsgi_app = AccessLogMiddleware(app.wsgi_app, access_logger)
 
 # Sample data
 sample_data = {
@@ -22,45 +104,125 @@ sample_data = {
     ]
 }
 
+# sample_data never changes after startup, so its validators are computed once
+sample_payload = VersionedPayload(sample_data)
+
+# Immutable bodies are serialized once at startup and served as raw bytes;
+# the health body only embeds the time, so it is rebuilt once per second
+home_response = StaticJSON(app, {
+    "service": "Middleware Error Handling",
+    "status": "running",
+    "endpoints": [
+        "/api/demo",
+        "/api/health",
+        "/api/data",
+        "/api/metrics",
+        "/api/profile",
+        "/api/admission",
+        "/api/logging"
+    ]
+})
+demo_response = StaticJSON(app, sample_data)
+health_response = PerSecondJSON(app, lambda: {
+    "status": "healthy",
+    "service": "Middleware Error Handling",
+    "timestamp": now_iso()
+})
+
 @app.route('/')
 def home():
-    return jsonify({
-        "service": "Middleware Error Handling",
-        "status": "running",
-        "endpoints": [
-            "/api/demo",
-            "/api/health",
-            "/api/data"
-        ]
-    })
+    return home_response()
 
 @app.route('/api/demo')
+@conditional(sample_payload)
 def demo():
-    return jsonify(sample_data)
+    return demo_response()
 
 @app.route('/api/health')
 def health():
-    return jsonify({
-        "status": "healthy",
-        "service": "Middleware Error Handling",
-        "timestamp": datetime.now().isoformat()
-    })
+    return health_response()
 
 @app.route('/api/data', methods=['GET', 'POST'])
+@conditional(sample_payload)
 def data():
     if request.method == 'POST':
+        # NDJSON (or a JSON array with ?stream=true) is parsed incrementally
+        # in batches and answered with a summary instead of an echo
+        if wants_streaming_ingest():
+            return jsonify(ingest_request())
         data = request.get_json()
         return jsonify({
             "message": "Data received successfully",
             "received_data": data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         })
     else:
         return jsonify({
             "data": sample_data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         })
 
+@app.route('/api/metrics')
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/api/admission')
+def admission_stats():
+    if admission is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, "limiters": admission.stats()})
+
+@app.route('/api/logging')
+def logging_stats():
+    return jsonify(log_pipeline.stats())
+
+def profile_access():
+    """None when the request may use the profiler, else the error response."""
+    if not PROFILE_SECRET:
+        return jsonify({"error": "Profiling is not enabled (set PROFILE_SECRET)"}), 404
+    if not profiler.authorized(request.environ):
+        return jsonify({"error": "Missing or wrong X-Profile-Token"}), 403
+    return None
+
+@app.route('/api/profile', methods=['GET', 'POST', 'DELETE'])
+def profile():
+    denied = profile_access()
+    if denied:
+        return denied
+    if request.method == 'POST':
+        # {"sample_rate": 0.01, "mode": "sample"}: takes effect immediately
+        settings = request.get_json(silent=True) or {}
+        try:
+            profiler.configure(sample_rate=settings.get("sample_rate"), mode=settings.get("mode"))
+        except (TypeError, ValueError) as exc:
+            return jsonify({"error": str(exc)}), 400
+    elif request.method == 'DELETE':
+        profiler.reset()
+    return jsonify(profiler.stats())
+
+@app.route('/api/profile/download')
+def profile_download():
+    """?format=pstats|text|collapsed, optionally narrowed to one ?route=."""
+    denied = profile_access()
+    if denied:
+        return denied
+    route = request.args.get("route")
+    fmt = request.args.get("format", "pstats")
+    if fmt == "pstats":
+        body, mimetype = profiler.pstats_bytes(route), "application/octet-stream"
+    elif fmt == "text":
+        body, mimetype = profiler.pstats_text(route), "text/plain"
+    elif fmt == "collapsed":
+        body, mimetype = profiler.collapsed(route), "text/plain"
+    else:
+        return jsonify({"error": "format must be pstats, text or collapsed"}), 400
+    if body is None:
+        return jsonify({"error": "Nothing profiled yet", "route": route, "format": fmt}), 404
+    response = Response(body, mimetype=mimetype)
+    if fmt == "pstats":
+        response.headers["Content-Disposition"] = 'attachment; filename="requests.pstats"'
+    return response
+
 if __name__ == '__main__':
     print(f"Starting Middleware Error Handling demo server...")
     print("Visit: http://localhost:5000")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Admission Control Load Test
+Offers an open-loop stream of requests at a multiple of what a backend can
+serve and compares latency with and without AdmissionMiddleware in front.
+
+The backend models a server whose throughput is fixed: ``capacity`` requests
+are served at a time, each taking ``service_ms``; anything beyond that waits.
+Arrivals are evenly spaced and do not wait for earlier responses, like real
+clients. Without admission control the wait grows for as long as the
+overload lasts; with it, excess requests get an immediate 503 and the
+admitted ones keep close to the unloaded latency.
+
+Usage: python bench_admission.py [load_factor] [seconds] [capacity] [service_ms]
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.admission import AdmissionMiddleware, ConcurrencyLimiter
+from common.benchtools import build_environ, call
+
+
+def backend(capacity, service):
+    workers = threading.BoundedSemaphore(capacity)
+
+    def app(environ, start_response):
+        with workers:
+            time.sleep(service)
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"ok"]
+
+    return app
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else 0.0
+
+
+def offer(app, rate, seconds):
+    """Open-loop load: one request every 1/rate s.
+
+    Returns ([(status, latency)], seconds until the last response).
+    """
+    results = []
+    lock = threading.Lock()
+    environ = build_environ("/api/work")
+
+    def one():
+        start = time.perf_counter()
+        status = call(app, dict(environ))[0]
+        with lock:
+            results.append((status[:3], time.perf_counter() - start))
+
+    threads = []
+    begin = time.perf_counter()
+    for sent in range(int(rate * seconds)):
+        delay = begin + sent / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        thread = threading.Thread(target=one, daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - begin
+
+
+def report(name, results, elapsed):
+    admitted = [latency for status, latency in results if status == "200"]
+    shed = [latency for status, latency in results if status == "503"]
+    print(f"{name:<22}{len(admitted) / elapsed:>8.0f}/s"
+          f"{percentile(admitted, 0.5) * 1000:>9.1f}{percentile(admitted, 0.99) * 1000:>9.1f}"
+          f"{max(admitted, default=0) * 1000:>9.1f}"
+          f"{len(shed) / max(1, len(results)):>8.0%}{percentile(shed, 0.99) * 1000:>10.2f}")
+
+
+def main():
+    load = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    capacity = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    service = (float(sys.argv[4]) if len(sys.argv) > 4 else 20.0) / 1000
+    rate = load * capacity / service
+    threading.stack_size(256 * 1024)
+
+    print(f"capacity {capacity / service:.0f} req/s, offered {rate:.0f} req/s "
+          f"({load:g}x) for {seconds:g} s")
+    print(f"{'':<22}{'served':>10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'shed':>8}{'503 p99':>10}")
+
+    configs = [
+        ("half load", None, 0.5),
+        ("no admission control", None, load),
+        ("static limit", lambda: ConcurrencyLimiter(capacity, queue_size=capacity,
+                                                    queue_timeout=service), load),
+        # Starts well above capacity and has to find it from latency alone
+        ("adaptive (AIMD)", lambda: ConcurrencyLimiter(capacity * 4, queue_size=capacity,
+                                                       queue_timeout=service,
+                                                       latency_target=service * 1.5), load),
+    ]
+    for name, limiter, factor in configs:
+        app = backend(capacity, service)
+        if limiter is not None:
+            limiter = limiter()
+            app = AdmissionMiddleware(app, default=limiter)
+        report(name, *offer(app, capacity / service * factor, seconds))
+        if limiter is not None and limiter.latency_target:
+            print(f"{'':<22}limit settled at {int(limiter.limit)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Access Logging Benchmark
+Requests per second of this topic's GET /api/demo with access logging:
+
+- off
+- written synchronously by a plain logging.FileHandler in the request
+  thread, the usual setup
+- through LogPipeline: queued, then batched and written by a background
+  thread
+
+Both kinds of log go to a temporary directory. Runs in one thread and then
+with several threads issuing requests at once; each figure is the best of
+several rounds, alternating between the variants, to filter out noise from
+other processes. The pipeline's counters show whether any records had to be
+sampled out or dropped.
+
+Usage: python bench_logging.py [requests] [threads] [rounds]
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.async_logging import AccessLogMiddleware, BatchFormatter, LogPipeline
+from common.benchtools import build_environ, call
+from common.loader import load_module
+
+
+def access_logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(handler)
+    return logger
+
+
+def requests_per_second(app, environ, count, threads):
+    per_thread = count // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for _ in range(per_thread):
+            call(app, environ)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    # The app's own access log is replaced by the ones under test
+    os.environ["ACCESS_LOG"] = "0"
+    directory = tempfile.mkdtemp(prefix="bench_logging_")
+    os.environ["LOG_DIR"] = directory
+    app = load_module("06_middleware_error_handling").app.wsgi_app
+    environ = build_environ("/api/demo")
+
+    sync_handler = logging.FileHandler(os.path.join(directory, "sync.log"))
+    sync_handler.setFormatter(BatchFormatter())
+    pipeline = LogPipeline(os.path.join(directory, "async.log")).start()
+    variants = [
+        ("logging off", app),
+        ("FileHandler (sync)", AccessLogMiddleware(app, access_logger("bench.sync", sync_handler))),
+        ("LogPipeline (async)", AccessLogMiddleware(app, access_logger("bench.async",
+                                                                        pipeline.handler))),
+    ]
+
+    print(f"best of {rounds} rounds x {count} requests, logs in {directory}")
+    best = {name: [0.0, 0.0] for name, _ in variants}
+    for _ in range(rounds):
+        for name, target in variants:
+            for column, workers in enumerate((1, threads)):
+                rate = requests_per_second(target, environ, count, workers)
+                best[name][column] = max(best[name][column], rate)
+    print(f"{'':<22}{'1 thread':>14}{f'{threads} threads':>14}")
+    for name, (single, multi) in best.items():
+        print(f"{name:<22}{single:>10.0f} r/s{multi:>10.0f} r/s")
+
+    pipeline.stop()
+    stats = pipeline.stats()
+    print(f"pipeline: {stats['written']} written in {stats['batches']} batches, "
+          f"{stats['sampled_out']} sampled out, {stats['dropped']} dropped")
+
+
+if __name__ == '__main__':
+    main()
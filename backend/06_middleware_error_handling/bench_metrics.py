@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Metrics Overhead Benchmark
+Measures what MetricsMiddleware adds to a request, two ways:
+
+- around a minimal WSGI app, which isolates the middleware's own cost
+- around this topic's Flask app, on GET /api/health. A whole Flask request
+  varies by more than the middleware costs, so this row times the Flask
+  app inside the middleware and reports the middleware's self time (the
+  outer time minus the inner time, less the cost of taking those timings)
+  next to the full request
+
+Each figure is the best of several rounds, alternating between the two
+apps where two are compared, which filters out scheduler noise on busy or
+single-core hosts.
+
+Usage: python bench_metrics.py [requests_per_round] [rounds]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.benchtools import build_environ, call
+from common.loader import load_module
+from common.metrics import MetricsMiddleware
+
+BODY = [b'{"status":"healthy"}']
+
+
+def bare_app(environ, start_response):
+    start_response("200 OK", [("Content-Type", "application/json"), ("Content-Length", "20")])
+    return BODY
+
+
+def micros(app, environ, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        call(app, environ)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def best_pair(plain, measured, environ, count, rounds):
+    """Best per-request time of each app, alternating rounds between them."""
+    best_plain = best_measured = float("inf")
+    for _ in range(rounds):
+        best_plain = min(best_plain, micros(plain, environ, count))
+        best_measured = min(best_measured, micros(measured, environ, count))
+    return best_plain, best_measured
+
+
+def self_time(app, environ, count, rounds):
+    """Best (request us, middleware self us) for MetricsMiddleware around ``app``.
+
+    Self time is the time spent in the middleware call minus the time spent
+    in the app inside it. The same measurement without the middleware (the
+    cost of the timing wrapper itself) is taken in alternating rounds and
+    subtracted.
+    """
+    clock = time.perf_counter
+    inner = [0.0]
+
+    def timed(environ, start_response):
+        start = clock()
+        try:
+            return app(environ, start_response)
+        finally:
+            inner[0] += clock() - start
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def run(target):
+        inner[0] = outer = 0.0
+        for _ in range(count):
+            start = clock()
+            result = target(dict(environ), start_response)
+            outer += clock() - start
+            # Reading and closing the body happen outside both timers
+            b"".join(result)
+            if hasattr(result, "close"):
+                result.close()
+        return outer / count * 1e6, (outer - inner[0]) / count * 1e6
+
+    measured = MetricsMiddleware(timed)
+    best_total = best_self = best_baseline = float("inf")
+    for _ in range(rounds):
+        total, own = run(measured)
+        best_total, best_self = min(best_total, total), min(best_self, own)
+        best_baseline = min(best_baseline, run(timed)[1])
+    return best_total, best_self - best_baseline
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    environ = build_environ("/api/health")
+
+    flask_app = load_module("06_middleware_error_handling").metrics.app
+    print(f"best of {rounds} rounds x {count} requests")
+
+    base, with_metrics = best_pair(bare_app, MetricsMiddleware(bare_app), environ, count, rounds)
+    print(f"minimal WSGI app:  {base:.2f} us plain, {with_metrics:.2f} us with metrics, "
+          f"overhead {with_metrics - base:.2f} us")
+    total, overhead = self_time(flask_app, environ, count, rounds)
+    print(f"Flask /api/health: {total:.2f} us per request, "
+          f"middleware self time {overhead:.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,41 @@ WebSockets Real-time Demo Server
 A comprehensive example of WebSockets Real-time implementation.
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 import json
+import os
+import sys
 from datetime import datetime
 
+# Shared helpers live in backend/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.compression import CompressionMiddleware
+from common.conditional import VersionedPayload, conditional
+from common.ingest import ingest_request, wants_streaming_ingest
+from common.json_provider import install_json_provider
+from common.static_responses import PerSecondJSON, StaticJSON, now_iso
+from hub import POLICIES, BroadcastHub, event_stream, valid_topic
+from statesync import StateSync, sync_stream
+
 app = Flask(__name__)
+install_json_provider(app)
+# Compress responses above COMPRESSION_MIN_SIZE bytes for clients that accept it
+COMPRESSION_MIN_SIZE = 512
+app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=COMPRESSION_MIN_SIZE)
+
+# Realtime pushes over Server-Sent Events. Every stream client gets a queue
+# of at most STREAM_MAX_QUEUE frames; what happens when it fills up is the
+# client's ?policy= (drop_oldest by default, coalesce or disconnect)
+STREAM_MAX_QUEUE = 256
+STREAM_MAX_TOPICS = 32
+STREAM_HEARTBEAT = 15.0
+hub = BroadcastHub()
+# Versioned state topics: changes within STATE_TICK seconds go out as one
+# delta, and clients more than STATE_HISTORY versions behind get a snapshot
+STATE_TICK = 0.05
+STATE_HISTORY = 256
+state_sync = StateSync(tick=STATE_TICK, history=STATE_HISTORY)
 
 # Sample data
 sample_data = {
@@ -22,45 +52,143 @@ sample_data = {
     ]
 }
 
+# sample_data never changes after startup, so its validators are computed once
+sample_payload = VersionedPayload(sample_data)
+# The "sample" state topic starts from a copy; clients sync it via /api/sync/sample
+state_sync.channel("sample", sample_data)
+
+# Immutable bodies are serialized once at startup and served as raw bytes;
+# the health body only embeds the time, so it is rebuilt once per second
+home_response = StaticJSON(app, {
+    "service": "WebSockets Real-time",
+    "status": "running",
+    "endpoints": [
+        "/api/demo",
+        "/api/health",
+        "/api/data",
+        "/api/stream",
+        "/api/publish/<topic>",
+        "/api/hub",
+        "/api/state/<topic>",
+        "/api/sync/<topic>"
+    ]
+})
+demo_response = StaticJSON(app, sample_data)
+health_response = PerSecondJSON(app, lambda: {
+    "status": "healthy",
+    "service": "WebSockets Real-time",
+    "timestamp": now_iso()
+})
+
 @app.route('/')
 def home():
-    return jsonify({
-        "service": "WebSockets Real-time",
-        "status": "running",
-        "endpoints": [
-            "/api/demo",
-            "/api/health",
-            "/api/data"
-        ]
-    })
+    return home_response()
 
 @app.route('/api/demo')
+@conditional(sample_payload)
 def demo():
-    return jsonify(sample_data)
+    return demo_response()
 
 @app.route('/api/health')
 def health():
-    return jsonify({
-        "status": "healthy",
-        "service": "WebSockets Real-time",
-        "timestamp": datetime.now().isoformat()
-    })
+    return health_response()
 
 @app.route('/api/data', methods=['GET', 'POST'])
+@conditional(sample_payload)
 def data():
     if request.method == 'POST':
+        # NDJSON (or a JSON array with ?stream=true) is parsed incrementally
+        # in batches and answered with a summary instead of an echo
+        if wants_streaming_ingest():
+            return jsonify(ingest_request())
         data = request.get_json()
         return jsonify({
             "message": "Data received successfully",
             "received_data": data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         })
     else:
         return jsonify({
             "data": sample_data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         })
 
+def invalid_topic(topic):
+    # A line break would end the SSE "event:" line and let the rest of the
+    # topic inject frames into every matching stream
+    return jsonify({"error": "Topics must not contain line breaks", "topic": topic}), 400
+
+@app.route('/api/stream')
+def stream():
+    """SSE stream of ?topics=a,b with an optional ?policy= and ?max_queue=."""
+    topics = [t for t in request.args.get("topics", "").split(",") if t]
+    if not topics or len(topics) > STREAM_MAX_TOPICS:
+        return jsonify({"error": f"Give 1 to {STREAM_MAX_TOPICS} comma-separated topics"}), 400
+    for topic in topics:
+        if not valid_topic(topic):
+            return invalid_topic(topic)
+    policy = request.args.get("policy", "drop_oldest")
+    if policy not in POLICIES:
+        return jsonify({"error": f"policy must be one of {', '.join(POLICIES)}"}), 400
+    max_queue = min(request.args.get("max_queue", STREAM_MAX_QUEUE, type=int), STREAM_MAX_QUEUE)
+    subscriber = hub.subscribe(topics, max(1, max_queue), policy)
+    return Response(event_stream(hub, subscriber, STREAM_HEARTBEAT), mimetype="text/event-stream",
+                    headers={
+                        # Frames are shared by every client, so they are not
+                        # compressed per connection; proxies must not buffer
+                        "Cache-Control": "no-cache, no-transform",
+                        "X-Accel-Buffering": "no",
+                    })
+
+@app.route('/api/publish/<topic>', methods=['POST'])
+def publish(topic):
+    if not valid_topic(topic):
+        return invalid_topic(topic)
+    message = request.get_json(silent=True)
+    if message is None:
+        return jsonify({"error": "Body must be JSON"}), 400
+    return jsonify({"topic": topic, "delivered": hub.publish(topic, message)})
+
+@app.route('/api/hub')
+def hub_stats():
+    return jsonify(hub.stats())
+
+@app.route('/api/state/<topic>', methods=['GET', 'PATCH', 'PUT'])
+def state(topic):
+    """GET the current version; PATCH a JSON merge patch; PUT a whole new state."""
+    if not valid_topic(topic):
+        return invalid_topic(topic)
+    if request.method == 'GET':
+        if topic not in state_sync:
+            return jsonify({"error": "Unknown topic", "topic": topic}), 404
+        version, current = state_sync.get(topic)
+        return jsonify({"topic": topic, "version": version, "state": current})
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    if request.method == 'PUT':
+        state_sync.replace(topic, body)
+    else:
+        state_sync.update(topic, body)
+    # Published with the next tick, coalesced with whatever else arrives
+    return jsonify({"topic": topic, "queued": True}), 202
+
+@app.route('/api/sync/<topic>')
+def sync(topic):
+    """SSE deltas from ?since= (or Last-Event-ID on reconnect); a snapshot without."""
+    if not valid_topic(topic):
+        return invalid_topic(topic)
+    if topic not in state_sync:
+        return jsonify({"error": "Unknown topic", "topic": topic}), 404
+    since = request.args.get("since", request.headers.get("Last-Event-ID"))
+    try:
+        since = int(since) if since is not None else None
+    except ValueError:
+        return jsonify({"error": "since must be a version number"}), 400
+    return Response(sync_stream(state_sync, topic, since, STREAM_HEARTBEAT),
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"})
+
 if __name__ == '__main__':
     print(f"Starting WebSockets Real-time demo server...")
     print("Visit: http://localhost:5000")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Broadcast Hub Benchmark
+Simulates up to 10k local clients as hub subscribers (no sockets or
+threads) and reports how the hub scales:
+
+- memory per connected client (tracemalloc)
+- publish latency to a topic with 1, 100 and all subscribers, and to a topic
+  nobody follows, for growing client counts; a publish only touches its own
+  topic's subscribers, so a small room costs the same among 10k clients as
+  among 100
+- the same broadcast serialized per recipient, for comparison
+- queue memory when every client stops reading, per slow-consumer policy
+
+Every client follows "all" and one of 100 "room-N" topics; client 0 also
+follows "solo".
+
+Usage: python bench_hub.py [max_clients] [publishes]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from hub import BroadcastHub, sse_frame
+
+MESSAGE = {"type": "price", "symbol": "ACME", "bid": 101.25, "ask": 101.5,
+           "ts": "2024-01-01T00:00:00Z"}
+ROOMS = 100
+
+
+def build(clients, max_queue=256, policy="drop_oldest"):
+    hub = BroadcastHub()
+    subscribers = [hub.subscribe(["all", f"room-{i % ROOMS}"] + (["solo"] if i == 0 else []),
+                                 max_queue, policy)
+                   for i in range(clients)]
+    return hub, subscribers
+
+
+def drain(subscribers):
+    for subscriber in subscribers:
+        subscriber.drain()
+
+
+def publish_micros(hub, subscribers, topic, count):
+    recipients = [subscriber for subscriber in subscribers if topic in subscriber.topics]
+    best = float("inf")
+    for _ in range(count):
+        start = time.perf_counter()
+        hub.publish(topic, MESSAGE)
+        best = min(best, time.perf_counter() - start)
+        # Readers keep up, so queues stay short as in normal operation
+        drain(recipients)
+    return best * 1e6
+
+
+def naive_micros(subscribers, count):
+    """Broadcast that serializes the message again for every recipient."""
+    best = float("inf")
+    for _ in range(count):
+        start = time.perf_counter()
+        for number, subscriber in enumerate(subscribers):
+            subscriber.push("all", sse_frame("all", MESSAGE, number))
+        best = min(best, time.perf_counter() - start)
+        drain(subscribers)
+    return best * 1e6
+
+
+def client_memory(clients):
+    tracemalloc.start()
+    hub, subscribers = build(clients)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / clients
+
+
+def stalled_memory(clients, policy, publishes):
+    """Bytes held by queues after ``publishes`` broadcasts nobody reads."""
+    hub, subscribers = build(clients, max_queue=64, policy=policy)
+    tracemalloc.start()
+    for _ in range(publishes):
+        hub.publish("all", MESSAGE)
+        hub.publish(f"room-{_ % ROOMS}", MESSAGE)
+    # Disconnected clients are gone from the server; only the hub held them
+    subscribers = [subscriber for subscriber in subscribers if not subscriber.closed]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    queued = sum(len(subscriber) for subscriber in subscribers)
+    return size, queued, hub.subscriber_count()
+
+
+def main():
+    max_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    publishes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    sizes = [n for n in (100, 1000, 10000) if n < max_clients] + [max_clients]
+
+    print(f"memory per client: {client_memory(max_clients):.0f} bytes "
+          f"(subscriber, queue and index entries)")
+    print()
+    print("best publish latency, us (serialize once)")
+    print(f"{'clients':>8}{'no subs':>10}{'1 sub':>10}{'room':>10}{'all':>12}{'per sub':>10}")
+    for clients in sizes:
+        hub, subscribers = build(clients)
+        row = [publish_micros(hub, subscribers, topic, publishes)
+               for topic in ("nobody", "solo", "room-0", "all")]
+        print(f"{clients:>8}{row[0]:>10.1f}{row[1]:>10.1f}{row[2]:>10.1f}{row[3]:>12.1f}"
+              f"{row[3] / clients * 1000:>8.0f} ns")
+    hub, subscribers = build(max_clients)
+    naive = naive_micros(subscribers, max(3, publishes // 4))
+    print(f"serialized per recipient, {max_clients} clients: {naive:.1f} us")
+    print()
+
+    print(f"every client stalled, 200 broadcasts to 'all' and rooms, queue bound 64")
+    print(f"{'policy':<12}{'queue memory':>14}{'frames held':>13}{'clients left':>14}")
+    for policy in ("drop_oldest", "coalesce", "disconnect"):
+        size, queued, left = stalled_memory(max_clients, policy, 200)
+        print(f"{policy:<12}{size / 2**20:>10.1f} MiB{queued:>13}{left:>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Broadcast Hub
+Topic-indexed publish/subscribe for realtime pushes (Server-Sent Events).
+
+- The hub keeps a topic -> subscribers index, so a publish only touches the
+  subscribers of its topic, however many clients are connected in total
+- A message is serialized once, into the finished SSE frame, and the same
+  bytes object is queued for every recipient
+- Every subscriber has a bounded queue; a consumer that falls behind is
+  handled by its ``policy`` instead of growing memory without limit:
+
+  - ``drop_oldest``: the oldest queued frame makes room for the new one
+  - ``coalesce``: only the newest frame per topic is kept, for state-like
+    topics where intermediate values are worthless
+  - ``disconnect``: the subscriber is closed and removed from the hub
+
+- Publishing never blocks on a subscriber: a push is an append, plus a
+  wake-up only when the consumer is actually waiting
+"""
+
+import itertools
+import json
+import threading
+from collections import OrderedDict, deque
+
+POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+
+def valid_topic(topic):
+    """Whether ``topic`` can go into an ``event:`` line; SSE lines end at CR or LF."""
+    return bool(topic) and "\r" not in topic and "\n" not in topic
+
+
+def sse_frame(topic, data, message_id=None):
+    """One Server-Sent Events frame, ready to write to every client."""
+    payload = json.dumps(data, separators=(",", ":"))
+    head = f"id: {message_id}\n" if message_id is not None else ""
+    # JSON never contains a raw newline, so the payload is a single data line
+    return f"{head}event: {topic}\ndata: {payload}\n\n".encode()
+
+
+class Subscriber:
+    """One client's subscriptions and its bounded send queue."""
+
+    __slots__ = ("topics", "max_queue", "policy", "closed", "dropped", "delivered",
+                 "_queue", "_waiting", "_wakeup")
+
+    def __init__(self, topics, max_queue=256, policy="drop_oldest"):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, got {policy!r}")
+        self.topics = frozenset(topics)
+        self.max_queue = max_queue
+        self.policy = policy
+        self.closed = False
+        self.dropped = 0
+        self.delivered = 0
+        # Coalescing keeps one frame per topic, in arrival order
+        if policy == "coalesce":
+            self._queue = OrderedDict()
+        else:
+            self._queue = deque(maxlen=max_queue if policy == "drop_oldest" else None)
+        self._waiting = False
+        self._wakeup = None
+
+    def push(self, topic, frame):
+        """Queue ``frame``; False when the subscriber has to be disconnected.
+
+        Publishers (under the hub lock) and the consumer (without it) touch
+        the queue concurrently, so only single, atomic deque / OrderedDict
+        operations are used on it.
+        """
+        queue = self._queue
+        if self.policy == "drop_oldest":
+            if len(queue) >= self.max_queue:
+                self.dropped += 1
+            # maxlen makes append drop the oldest frame in the same step
+            queue.append(frame)
+        elif self.policy == "coalesce":
+            if queue.pop(topic, None) is not None:
+                self.dropped += 1
+            elif len(queue) >= self.max_queue:
+                try:
+                    queue.popitem(last=False)
+                    self.dropped += 1
+                except KeyError:
+                    pass
+            queue[topic] = frame
+        elif len(queue) >= self.max_queue:
+            self.close()
+            return False
+        else:
+            queue.append(frame)
+        if self._waiting:
+            self._wakeup.set()
+        return True
+
+    def drain(self):
+        """Take every queued frame (oldest first)."""
+        queue = self._queue
+        frames = []
+        try:
+            if self.policy == "coalesce":
+                while True:
+                    frames.append(queue.popitem(last=False)[1])
+            else:
+                while True:
+                    frames.append(queue.popleft())
+        except (IndexError, KeyError):
+            pass
+        self.delivered += len(frames)
+        return frames
+
+    def wait(self, timeout):
+        """Frames queued now or within ``timeout`` seconds; [] on timeout."""
+        if self._queue or self.closed:
+            return self.drain()
+        if self._wakeup is None:
+            self._wakeup = threading.Event()
+        self._wakeup.clear()
+        # Publishers check _waiting after appending, so a frame pushed after
+        # the check below still sets the event
+        self._waiting = True
+        try:
+            if not self._queue:
+                self._wakeup.wait(timeout)
+        finally:
+            self._waiting = False
+        return self.drain()
+
+    def close(self):
+        """Stop delivery; frames still queued are released right away."""
+        self.closed = True
+        self._queue.clear()
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def __len__(self):
+        return len(self._queue)
+
+
+class BroadcastHub:
+    """Topic -> subscribers index with serialize-once fan-out."""
+
+    def __init__(self):
+        self._topics = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.disconnected = 0
+
+    def subscribe(self, topics, max_queue=256, policy="drop_oldest"):
+        subscriber = Subscriber(topics, max_queue, policy)
+        with self._lock:
+            for topic in subscriber.topics:
+                # A dict keeps insertion order and O(1) removal
+                self._topics.setdefault(topic, {})[subscriber] = None
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self._lock:
+            self._remove(subscriber)
+
+    def _remove(self, subscriber):
+        for topic in subscriber.topics:
+            members = self._topics.get(topic)
+            if members is not None:
+                members.pop(subscriber, None)
+                if not members:
+                    del self._topics[topic]
+
+    def publish(self, topic, data):
+        """Send ``data`` to the subscribers of ``topic``; returns how many got it."""
+        message_id = next(self._ids)
+        if topic not in self._topics:
+            self.published += 1
+            return 0
+        # Serialized once, outside the lock, whatever the number of recipients
+        return self.publish_frame(topic, sse_frame(topic, data, message_id))
+
+    def publish_frame(self, topic, frame):
+        """Send an already serialized frame to the subscribers of ``topic``."""
+        with self._lock:
+            members = self._topics.get(topic)
+            if not members:
+                self.published += 1
+                return 0
+            return self._fan_out(topic, frame, members)
+
+    def _fan_out(self, topic, frame, members):
+        # Runs under the hub lock: pushes only append, so this stays short
+        count = len(members)
+        slow = None
+        for subscriber in members:
+            if not subscriber.push(topic, frame):
+                slow = slow or []
+                slow.append(subscriber)
+        if slow:
+            for subscriber in slow:
+                self._remove(subscriber)
+            self.disconnected += len(slow)
+        self.published += 1
+        return count - len(slow) if slow else count
+
+    def subscriber_count(self, topic=None):
+        with self._lock:
+            if topic is not None:
+                return len(self._topics.get(topic, ()))
+            return len({s for members in self._topics.values() for s in members})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "topics": {topic: len(members) for topic, members in self._topics.items()},
+                "published": self.published,
+                "disconnected": self.disconnected,
+            }
+
+
+def event_stream(hub, subscriber, heartbeat=15.0):
+    """SSE body for one client: queued frames, and a comment line when idle.
+
+    The heartbeat keeps proxies from timing the connection out and lets the
+    server notice a client that went away (the write fails).
+    """
+    try:
+        # Tells EventSource how long to wait before reconnecting
+        yield b"retry: 2000\n\n"
+        while not subscriber.closed:
+            frames = subscriber.wait(heartbeat)
+            if frames:
+                yield b"".join(frames)
+            elif not subscriber.closed:
+                yield b": keep-alive\n\n"
+    finally:
+        hub.unsubscribe(subscriber)
@@ -0,0 +1,257 @@
+"""
+State Sync
+Versioned per-topic state pushed to clients as deltas instead of full objects.
+
+- Changes are JSON merge patches (RFC 7386): a partial object whose keys
+  replace the current ones, nested objects are merged and ``null`` deletes
+  (so state values themselves cannot be ``null``)
+- Updates arriving within ``tick`` seconds of the first pending one are
+  applied together and become the next version
+- Each topic remembers, for its last ``history`` versions, the previous
+  values of the top-level keys each version changed. A client at version N
+  receives one delta: the difference between those keys' values at N and
+  now, so a value changed ten times costs one entry. A client older than
+  the history (or new) receives a snapshot instead
+- Frames are serialized once per (topic, from-version) and shared by every
+  client at that version, which in steady state is all of them
+
+Clients acknowledge versions implicitly: every frame carries the version as
+its SSE id, so a reconnecting EventSource resumes with ``Last-Event-ID``.
+"""
+
+import copy
+import json
+import threading
+import time
+from collections import deque
+
+
+def merge_patch(target, patch):
+    """Apply merge ``patch`` to the dict ``target`` in place."""
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict):
+            current = target.get(key)
+            if not isinstance(current, dict):
+                current = target[key] = {}
+            merge_patch(current, value)
+        else:
+            target[key] = value
+    return target
+
+
+def diff(old, new):
+    """The merge patch that turns ``old`` into ``new`` (both dicts)."""
+    patch = {key: None for key in old if key not in new}
+    for key, value in new.items():
+        previous = old.get(key, _MISSING)
+        if previous == value and type(previous) is type(value):
+            continue
+        if isinstance(value, dict) and isinstance(previous, dict):
+            patch[key] = diff(previous, value)
+        else:
+            patch[key] = value
+    return patch
+
+
+_MISSING = object()
+
+
+def _frame(event, version, body):
+    payload = json.dumps(body, separators=(",", ":"))
+    return f"id: {version}\nevent: {event}\ndata: {payload}\n\n".encode()
+
+
+class _Channel:
+    """One topic: state, version, recent undo entries and pending patches."""
+
+    def __init__(self, topic, state, history):
+        self.topic = topic
+        self.state = state
+        self.version = 1
+        # (version, {top-level key: value before that version or _MISSING})
+        self.history = deque(maxlen=history)
+        self.pending = []
+        self.updates = 0
+        self.serialized = 0
+        self.changed = threading.Condition()
+        # from-version -> frame, valid for the current version only
+        self.frames = {}
+
+    def frame_since(self, since):
+        """(version, frame) bringing a client at ``since`` up to date; None if current.
+
+        Called with ``changed`` held.
+        """
+        if since == self.version:
+            return None
+        frame = self.frames.get(since)
+        if frame is None:
+            oldest = self.history[0][0] - 1 if self.history else self.version
+            if since is None or not oldest <= since < self.version:
+                frame = self.frames.get(None)
+                if frame is None:
+                    self.serialized += 1
+                    frame = self.frames[None] = _frame("snapshot", self.version, {
+                        "topic": self.topic, "version": self.version, "state": self.state})
+            else:
+                patch = self._delta(since)
+                self.serialized += 1
+                frame = self.frames[since] = _frame("delta", self.version, {
+                    "topic": self.topic, "from": since, "to": self.version, "patch": patch})
+        return self.version, frame
+
+    def _delta(self, since):
+        # The value each touched key had at ``since``: the first "before"
+        # recorded after it
+        before = {}
+        for version, previous in self.history:
+            if version > since:
+                for key, value in previous.items():
+                    before.setdefault(key, value)
+        patch = {}
+        for key, old in before.items():
+            new = self.state.get(key, _MISSING)
+            if new is _MISSING:
+                if old is not _MISSING:
+                    patch[key] = None
+            elif isinstance(old, dict) and isinstance(new, dict):
+                nested = diff(old, new)
+                if nested:
+                    patch[key] = nested
+            elif old is _MISSING or old != new or type(old) is not type(new):
+                patch[key] = new
+        return patch
+
+    def apply(self, patches):
+        """Apply ``patches`` as one new version (``changed`` held)."""
+        previous = {}
+        for patch in patches:
+            for key in patch:
+                if key not in previous:
+                    value = self.state.get(key, _MISSING)
+                    # Nested dicts are patched in place, so keep a copy
+                    previous[key] = copy.deepcopy(value) if isinstance(value, dict) else value
+            merge_patch(self.state, patch)
+        self.version += 1
+        self.history.append((self.version, previous))
+        self.frames = {}
+
+
+class StateSync:
+    """Versioned state per topic with tick-coalesced delta fan-out.
+
+    With ``tick`` set, a background thread publishes pending changes
+    ``tick`` seconds after the first of them; with ``tick=None`` the caller
+    publishes by calling ``flush()``.
+    """
+
+    def __init__(self, tick=0.05, history=256):
+        self.tick = tick
+        self.history = history
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._ticker = None
+
+    def __contains__(self, topic):
+        return topic in self._channels
+
+    def channel(self, topic, initial=None):
+        with self._lock:
+            channel = self._channels.get(topic)
+            if channel is None:
+                channel = self._channels[topic] = _Channel(topic, copy.deepcopy(initial or {}),
+                                                           self.history)
+            return channel
+
+    def get(self, topic):
+        """(version, state copy) of ``topic``; pending changes are not included."""
+        channel = self.channel(topic)
+        with channel.changed:
+            return channel.version, copy.deepcopy(channel.state)
+
+    def update(self, topic, patch):
+        """Queue a merge patch for ``topic``; it goes out with the next tick."""
+        if not patch:
+            return
+        channel = self.channel(topic)
+        with channel.changed:
+            # Kept as a list: merge patches do not compose exactly (a delete
+            # followed by a partial re-add cannot be one patch)
+            channel.pending.append(patch)
+            channel.updates += 1
+        if self.tick is not None:
+            self._ensure_ticker()
+            self._dirty.set()
+
+    def replace(self, topic, state):
+        """Queue a whole new state; only the difference is sent."""
+        channel = self.channel(topic)
+        with channel.changed:
+            current = copy.deepcopy(channel.state)
+            for patch in channel.pending:
+                merge_patch(current, patch)
+        self.update(topic, diff(current, state))
+
+    def flush(self):
+        """Turn every channel's pending patch into a new version; returns how many."""
+        with self._lock:
+            channels = list(self._channels.values())
+        published = 0
+        for channel in channels:
+            with channel.changed:
+                if not channel.pending:
+                    continue
+                patches, channel.pending = channel.pending, []
+                channel.apply(patches)
+                channel.changed.notify_all()
+                published += 1
+        return published
+
+    def _ensure_ticker(self):
+        if self._ticker is None:
+            with self._lock:
+                if self._ticker is None:
+                    self._ticker = threading.Thread(target=self._run, name="state-sync-tick",
+                                                    daemon=True)
+                    self._ticker.start()
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            # The window opens with the first pending change: everything
+            # that arrives during it rides along in the same frame
+            time.sleep(self.tick)
+            self._dirty.clear()
+            self.flush()
+
+    def wait_frame(self, topic, since, timeout):
+        """Next (version, frame) for a client at ``since``; None after ``timeout``."""
+        channel = self.channel(topic)
+        with channel.changed:
+            if since == channel.version:
+                channel.changed.wait(timeout)
+            return channel.frame_since(since)
+
+    def stats(self):
+        with self._lock:
+            channels = list(self._channels.values())
+        return {
+            channel.topic: {"version": channel.version, "updates": channel.updates,
+                            "history": len(channel.history), "serialized": channel.serialized}
+            for channel in channels
+        }
+
+
+def sync_stream(sync, topic, since=None, heartbeat=15.0):
+    """SSE body for one client: a snapshot or delta, then a delta per version."""
+    yield b"retry: 2000\n\n"
+    while True:
+        result = sync.wait_frame(topic, since, heartbeat)
+        if result is None:
+            yield b": keep-alive\n\n"
+            continue
+        since, frame = result
+        yield frame
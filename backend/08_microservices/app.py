@@ -6,9 +6,66 @@ A comprehensive example of Microservices implementation.
 
 from flask import Flask, jsonify, request
 import json
+import os
+import sys
 from datetime import datetime
 
+# Shared helpers live in backend/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.balancer import HealthChecker, ServiceRegistry
+from common.compression import CompressionMiddleware
+from common.conditional import VersionedPayload, conditional
+from common.http_client import ServiceClient, UpstreamError, UpstreamTimeout
+from common.ingest import ingest_request, wants_streaming_ingest
+from common.json_provider import install_json_provider
+from common.static_responses import PerSecondJSON, StaticJSON, now_iso
+from gateway import Gateway
+from rpc import RpcServer
+
 app = Flask(__name__)
+install_json_provider(app)
+# Compress responses above COMPRESSION_MIN_SIZE bytes for clients that accept it
+COMPRESSION_MIN_SIZE = 512
+app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=COMPRESSION_MIN_SIZE)
+# Calls to other services reuse pooled keep-alive connections instead of
+# paying a TCP connect each time. UPSTREAMS names them, e.g.
+# "users=http://127.0.0.1:5001,orders=http://127.0.0.1:5002"; with
+# UPSTREAM_HEDGE=1 a GET slower than the upstream's p95 is sent twice
+UPSTREAM_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", "2.0"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", "0.5"))
+UPSTREAM_HEDGE = os.environ.get("UPSTREAM_HEDGE", "0") != "0"
+# A service with several instances (named more than once in UPSTREAMS, or
+# listed in the SERVICE_REGISTRY JSON file) is balanced by UPSTREAM_POLICY
+# (p2c, least or round_robin); HEALTH_CHECK_INTERVAL seconds between
+# active health checks, 0 to rely on failed requests alone
+UPSTREAM_POLICY = os.environ.get("UPSTREAM_POLICY", "p2c")
+SERVICE_REGISTRY = os.environ.get("SERVICE_REGISTRY") or None
+HEALTH_CHECK_INTERVAL = float(os.environ.get("HEALTH_CHECK_INTERVAL", "2.0"))
+registry = ServiceRegistry(SERVICE_REGISTRY) if SERVICE_REGISTRY else None
+services = ServiceClient.from_env("UPSTREAMS", registry=registry, timeout=UPSTREAM_TIMEOUT,
+                                  connect_timeout=UPSTREAM_CONNECT_TIMEOUT,
+                                  hedge=UPSTREAM_HEDGE, policy=UPSTREAM_POLICY)
+health_checker = None
+if HEALTH_CHECK_INTERVAL and services.names():
+    health_checker = HealthChecker(services, interval=HEALTH_CHECK_INTERVAL).start()
+# Composite endpoints call every upstream concurrently and answer by the
+# slowest one's deadline (GATEWAY_DEADLINE, or per upstream in
+# GATEWAY_DEADLINES="users=0.2,orders=1.0") with whatever arrived in time
+GATEWAY_DEADLINE = float(os.environ.get("GATEWAY_DEADLINE", "0.5"))
+GATEWAY_DEADLINES = {
+    name.strip(): float(seconds)
+    for name, _, seconds in (item.partition("=") for item in
+                             os.environ.get("GATEWAY_DEADLINES", "").split(",") if item.strip())
+}
+GATEWAY_CACHE_TTL = float(os.environ.get("GATEWAY_CACHE_TTL", "1.0"))
+gateway = Gateway(services, deadline=GATEWAY_DEADLINE, deadlines=GATEWAY_DEADLINES,
+                  cache_ttl=GATEWAY_CACHE_TTL)
+# Composite name -> the path requested from every upstream
+COMPOSITES = {
+    "health": "/api/health",
+    "demo": "/api/demo",
+}
 
 # Sample data
 sample_data = {
@@ -22,44 +79,131 @@ sample_data = {
     ]
 }
 
+# sample_data never changes after startup, so its validators are computed once
+sample_payload = VersionedPayload(sample_data)
+
+# Immutable bodies are serialized once at startup and served as raw bytes;
+# the health body only embeds the time, so it is rebuilt once per second
+home_response = StaticJSON(app, {
+    "service": "Microservices",
+    "status": "running",
+    "endpoints": [
+        "/api/demo",
+        "/api/health",
+        "/api/data",
+        "/api/rpc",
+        "/api/upstreams",
+        "/api/services/<name>/health",
+        "/api/gateway",
+        "/api/gateway/health",
+        "/api/gateway/demo"
+    ]
+})
+demo_response = StaticJSON(app, sample_data)
+health_response = PerSecondJSON(app, lambda: {
+    "status": "healthy",
+    "service": "Microservices",
+    "timestamp": now_iso()
+})
+
 @app.route('/')
 def home():
-    return jsonify({
-        "service": "Microservices",
-        "status": "running",
-        "endpoints": [
-            "/api/demo",
-            "/api/health",
-            "/api/data"
-        ]
-    })
+    return home_response()
 
 @app.route('/api/demo')
+@conditional(sample_payload)
 def demo():
-    return jsonify(sample_data)
+    return demo_response()
 
 @app.route('/api/health')
 def health():
-    return jsonify({
-        "status": "healthy",
-        "service": "Microservices",
-        "timestamp": datetime.now().isoformat()
-    })
+    return health_response()
 
 @app.route('/api/data', methods=['GET', 'POST'])
+@conditional(sample_payload)
 def data():
     if request.method == 'POST':
-        data = request.get_json()
-        return jsonify({
-            "message": "Data received successfully",
-            "received_data": data,
-            "timestamp": datetime.now().isoformat()
-        })
+        # NDJSON (or a JSON array with ?stream=true) is parsed incrementally
+        # in batches and answered with a summary instead of an echo
+        if wants_streaming_ingest():
+            return jsonify(ingest_request())
+        return jsonify(received_data(request.get_json()))
     else:
-        return jsonify({
-            "data": sample_data,
-            "timestamp": datetime.now().isoformat()
-        })
+        return jsonify(data_payload())
+
+# Bodies shared by the HTTP views and the RPC methods
+def data_payload():
+    return {
+        "data": sample_data,
+        "timestamp": now_iso()
+    }
+
+def received_data(data):
+    return {
+        "message": "Data received successfully",
+        "received_data": data,
+        "timestamp": now_iso()
+    }
+
+# The same endpoints over the binary RPC transport (rpc.py) for internal
+# callers, on RPC_PORT when it is set. They answer from memory, so they run
+# inline on the connection thread
+RPC_PORT = int(os.environ.get("RPC_PORT", "0"))
+rpc_server = None
+if RPC_PORT:
+    rpc_server = RpcServer(os.environ.get("RPC_HOST", "127.0.0.1"), RPC_PORT)
+    rpc_server.register("health", lambda params: {"status": "healthy", "service": "Microservices",
+                                                  "timestamp": now_iso()}, inline=True)
+    rpc_server.register("demo", lambda params: sample_data, inline=True)
+    rpc_server.register("data.get", lambda params: data_payload(), inline=True)
+    rpc_server.register("data.post", received_data, inline=True)
+    rpc_server.start()
+
+@app.route('/api/rpc')
+def rpc_stats():
+    if rpc_server is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **rpc_server.stats()})
+
+@app.route('/api/upstreams')
+def upstreams():
+    return jsonify(services.stats())
+
+@app.route('/api/services/<name>/health')
+def service_health(name):
+    if name not in services.names():
+        return jsonify({"error": f"Unknown service: {name}"}), 404
+    response = services.get(name, "/api/health")
+    return app.response_class(response.body, status=response.status,
+                              mimetype="application/json")
+
+@app.route('/api/gateway')
+def gateway_stats():
+    return jsonify({"composites": sorted(COMPOSITES), "upstreams": services.names(),
+                    **gateway.stats()})
+
+@app.route('/api/gateway/<composite>')
+def gateway_composite(composite):
+    path = COMPOSITES.get(composite)
+    if path is None:
+        return jsonify({"error": f"Unknown composite: {composite}"}), 404
+    names = services.names()
+    if not names:
+        return jsonify({"error": "No upstreams configured; set UPSTREAMS"}), 503
+    result, cached = gateway.aggregate(composite, {name: (name, path) for name in names})
+    answered = sum(1 for item in result["results"].values() if "error" not in item)
+    return jsonify({
+        "composite": composite,
+        "answered": answered,
+        "upstreams": len(result["results"]),
+        "cached": cached,
+        **result
+    }), 200 if answered else 502
+
+@app.errorhandler(UpstreamError)
+def upstream_error(error):
+    status = 504 if isinstance(error, UpstreamTimeout) else 502
+    return jsonify({"error": str(error), "upstream": error.upstream}), status
 
 if __name__ == '__main__':
     print(f"Starting Microservices demo server...")
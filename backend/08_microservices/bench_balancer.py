@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Load Balancing Benchmark
+Runs four local instances of one stub service and compares how
+common.http_client spreads requests over them:
+
+1. Skewed instances: three answer in about 2 ms, one is slowed to 40 ms.
+   Latency percentiles and the slow instance's share of requests for
+   round-robin, least-outstanding-requests and power-of-two-choices
+2. Ejection and gradual re-admission: one instance answers 503 for a while
+   and then recovers; its share of requests per 250 ms window shows it
+   being ejected, then ramped back up over the slow-start period
+3. Discovery: instances listed in a registry file, with one added while
+   the client is running
+
+Usage: python bench_balancer.py [requests] [workers]
+"""
+
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common.balancer import HealthChecker, ServiceRegistry
+from common.http_client import ServiceClient, UpstreamError
+from stubs import StubService
+
+BODY = b'{"status":"ok"}'
+
+
+def instance_handler(state):
+    """Answers after ``state["delay"]`` seconds, or 503 while ``state["down"]``."""
+    def handle(method, path, body):
+        if state["down"]:
+            return 503, b'{"error":"unavailable"}'
+        time.sleep(state["delay"])
+        return 200, BODY
+    return handle
+
+
+def run_load(client, count, workers):
+    samples = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for _ in range(count // workers):
+            start = time.perf_counter()
+            client.get("items", "/api/item")
+            local.append(time.perf_counter() - start)
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(samples)
+
+
+def skewed(count, workers):
+    states = [{"delay": 0.002, "down": False} for _ in range(4)]
+    states[0]["delay"] = 0.04
+    stubs = [StubService(instance_handler(state)) for state in states]
+    urls = [stub.url for stub in stubs]
+    print(f"1. {count} requests from {workers} workers; instance 0 answers in 40 ms, "
+          f"the others in 2 ms")
+    print(f"{'policy':<14}{'mean ms':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'to slow':>9}")
+    for policy in ("round_robin", "least", "p2c"):
+        client = ServiceClient({"items": {"url": urls, "policy": policy}})
+        samples = run_load(client, count, workers)
+        instances = client.stats()["items"]["instances"]
+        share = instances[0]["requests"] / sum(instance["requests"] for instance in instances)
+
+        def ms(fraction):
+            return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+        print(f"{policy:<14}{statistics.mean(samples) * 1000:>9.1f}{ms(0.5):>9.1f}"
+              f"{ms(0.9):>9.1f}{ms(0.99):>9.1f}{share:>9.1%}")
+        client.close()
+    for stub in stubs:
+        stub.stop()
+
+
+def recovery(workers):
+    states = [{"delay": 0.002, "down": False} for _ in range(4)]
+    stubs = [StubService(instance_handler(state)) for state in states]
+    client = ServiceClient({"items": {"url": [stub.url for stub in stubs], "eject_after": 3,
+                                      "eject_time": 1.0, "slow_start": 2.0}})
+    checker = HealthChecker(client, interval=0.25).start()
+    instance = client.upstreams["items"].balancer.instances[0]
+    windows = []
+    stop = threading.Event()
+
+    def worker():
+        while not stop.is_set():
+            try:
+                client.get("items", "/api/item")
+            except UpstreamError:
+                pass
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    start = time.monotonic()
+    previous = (0, 0, 0)
+    for window in range(24):
+        if window == 4:
+            states[0]["down"] = True
+        elif window == 8:
+            states[0]["down"] = False
+        time.sleep(0.25)
+        instances = client.upstreams["items"].balancer.instances
+        totals = (instance.requests, sum(other.requests for other in instances), instance.errors)
+        windows.append((time.monotonic() - start, states[0]["down"],
+                        totals[0] - previous[0], totals[1] - previous[1], totals[2] - previous[2]))
+        previous = totals
+    stop.set()
+    for thread in threads:
+        thread.join()
+    checker.stop()
+
+    print()
+    print("2. instance 0 answers 503 from 1.0 s to 2.0 s (eject after 3 failures, "
+          "probe every 250 ms, 2 s slow start)")
+    print(f"{'t':>6}  {'state':<6}{'share':>8}{'503s':>6}")
+    for elapsed, down, requests, total, errors in windows:
+        share = requests / total if total else 0.0
+        print(f"{elapsed:>5.2f}s  {'down' if down else 'up':<6}{share:>8.1%}{errors:>6}  "
+              f"{'#' * round(share * 40)}")
+    client.close()
+    for stub in stubs:
+        stub.stop()
+
+
+def discovery():
+    stubs = [StubService(instance_handler({"delay": 0, "down": False})) for _ in range(4)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "registry.json")
+        with open(path, "w") as handle:
+            json.dump({"items": [stub.url for stub in stubs[:3]]}, handle)
+        registry = ServiceRegistry(path, refresh=0.1)
+        client = ServiceClient(registry=registry)
+        for _ in range(30):
+            client.get("items", "/api/item")
+        before = len(client.upstreams["items"].balancer.instances)
+        with open(path, "w") as handle:
+            json.dump({"items": [stub.url for stub in stubs]}, handle)
+        # Make sure the new file is seen as changed on coarse-mtime filesystems
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+        time.sleep(0.15)
+        for _ in range(30):
+            client.get("items", "/api/item")
+        instances = client.upstreams["items"].balancer.instances
+        print()
+        print(f"3. registry file: {before} instances, then {len(instances)} after adding one; "
+              f"requests per instance {[instance.requests for instance in instances]} "
+              f"(the new one is in slow start)")
+        client.close()
+    for stub in stubs:
+        stub.stop()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    skewed(count, workers)
+    recovery(4)
+    discovery()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Gateway Fan-out Benchmark
+Serves all ten topic apps on ephemeral local ports, each behind a simulated
+network + processing latency (5, 10, ... 50 ms), and measures this topic's
+gateway aggregating their /api/health:
+
+1. Calling the upstreams one after another against the gateway's
+   concurrent fan-out (composite latency: sum vs slowest)
+2. The same fan-out when one upstream hangs for 2 s: the answer arrives by
+   the deadline, without that upstream
+3. Cached composites and coalescing of concurrent misses
+
+It finishes with one GET /api/gateway/health through the 08 Flask app.
+
+Usage: python bench_gateway.py [rounds] [deadline_ms]
+"""
+
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import make_server
+
+from common.http_client import ServiceClient
+from common.loader import load_app, load_module, topic_dirs
+from gateway import Gateway
+
+
+def delayed(app, seconds):
+    """``app`` answering ``seconds`` later, as a remote service would."""
+    def wsgi(environ, start_response):
+        time.sleep(seconds[0])
+        return app(environ, start_response)
+    return wsgi
+
+
+def serve_topics():
+    """(servers, {name: url}, {name: [delay]}) for every topic app."""
+    servers, urls, delays = [], {}, {}
+    for index, directory in enumerate(topic_dirs()):
+        name = os.path.basename(directory)[3:]
+        delays[name] = [0.005 * (index + 1)]
+        server = make_server("127.0.0.1", 0, delayed(load_app(directory), delays[name]),
+                             threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        urls[name] = f"http://127.0.0.1:{server.server_port}"
+    return servers, urls, delays
+
+
+def sequential(client, calls):
+    return {label: client.get(name, path).status for label, (name, path) in calls.items()}
+
+
+def timed_ms(function, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    # Werkzeug logs every request it serves
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    deadline = (float(sys.argv[2]) if len(sys.argv) > 2 else 200) / 1000
+    servers, urls, delays = serve_topics()
+    client = ServiceClient(urls)
+    calls = {name: (name, "/api/health") for name in urls}
+    gateway = Gateway(client, deadline=deadline, cache_ttl=0)
+    # Open the pooled connections before measuring
+    sequential(client, calls)
+    gateway.fan_out(calls)
+
+    print(f"{len(urls)} upstreams, simulated latency 5-50 ms, deadline {deadline * 1000:.0f} ms, "
+          f"median / max of {rounds} rounds")
+    print(f"{'composite /api/health':<36}{'median ms':>10}{'max ms':>10}")
+    print(f"{'one after another':<36}{'%10.1f%10.1f' % timed_ms(lambda: sequential(client, calls), rounds)}")
+    print(f"{'concurrent fan-out':<36}{'%10.1f%10.1f' % timed_ms(lambda: gateway.fan_out(calls), rounds)}")
+
+    slow = sorted(urls)[0]
+    delays[slow][0] = 2.0
+    result = gateway.fan_out(calls)
+    answered = sum(1 for item in result["results"].values() if "error" not in item)
+    print(f"{slow + ' hangs for 2 s':<36}{result['elapsed_ms']:>10.1f}{'':>10}  "
+          f"partial, {answered}/{len(calls)} answered, {slow}: {result['results'][slow]['error']}")
+    delays[slow][0] = 0.005
+
+    cached = Gateway(client, deadline=deadline, cache_ttl=1.0)
+    cached.aggregate("health", calls)
+    print(f"{'cached composite':<36}{'%10.3f%10.3f' % timed_ms(lambda: cached.aggregate('health', calls), rounds)}")
+
+    # Concurrent misses share one fan-out
+    coalescing = Gateway(client, deadline=deadline, cache_ttl=1.0)
+    barrier = threading.Barrier(16)
+
+    def caller():
+        barrier.wait()
+        coalescing.aggregate("health", calls)
+
+    threads = [threading.Thread(target=caller) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = coalescing.stats()
+    fan_outs = stats["calls"] - stats["cache_hits"] - stats["coalesced"]
+    print(f"16 concurrent callers, cold cache: {fan_outs} fan-out, {stats['coalesced']} coalesced, "
+          f"{stats['cache_hits']} cache hits")
+
+    # The same through the 08 Flask app
+    module = load_module("08_microservices")
+    for name, url in urls.items():
+        module.services.add(name, url)
+    response = module.app.test_client().get("/api/gateway/health")
+    body = response.get_json()
+    print(f"GET /api/gateway/health -> {response.status_code}, {body['answered']}/{body['upstreams']} "
+          f"answered in {body['elapsed_ms']:.1f} ms")
+
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+RPC vs HTTP Benchmark
+Compares the binary RPC transport (rpc.py) with JSON over HTTP to this
+topic's Flask app, for the /api/data endpoints (GET, and POST of a
+20-record batch):
+
+1. Serialization: JSON encode + decode against MessagePack, per payload
+2. Bytes on the wire per call, counted by a relay between client and server
+3. Latency and CPU per call, sequentially: ServiceClient (pooled
+   keep-alive) to the Flask app on Werkzeug's threaded server, against
+   RpcClient to an RpcServer serving the same functions. Client and server
+   share this process, so the CPU figure covers both ends
+4. Throughput from several threads: a pool of HTTP connections against
+   one multiplexed RPC connection
+
+Usage: python bench_rpc.py [calls] [threads]
+"""
+
+import json
+import logging
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import make_server
+
+from common.http_client import ServiceClient
+from common.loader import load_module
+import rpc
+from rpc import RpcClient, RpcServer, packb, unpackb
+
+RECORDS = [{"id": index, "name": f"item-{index}", "price": index * 1.25, "active": index % 2 == 0,
+            "tags": ["a", "b"]} for index in range(20)]
+
+
+def micros(function, count=20000):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(count):
+            function()
+        best = min(best, (time.perf_counter() - start) / count * 1e6)
+    return best
+
+
+class CountingRelay:
+    """TCP relay to ``port`` that counts the bytes going each way."""
+
+    def __init__(self, port):
+        self.target = port
+        self.sent = self.received = 0
+        self._listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection(("127.0.0.1", self.target))
+            for sock in (client, upstream):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._pipe, args=(client, upstream, "sent"), daemon=True).start()
+            threading.Thread(target=self._pipe, args=(upstream, client, "received"),
+                             daemon=True).start()
+
+    def _pipe(self, source, target, counter):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                setattr(self, counter, getattr(self, counter) + len(data))
+                target.sendall(data)
+        except OSError:
+            pass
+        finally:
+            target.close()
+
+    def close(self):
+        self._listener.close()
+
+
+def sequential(call, count):
+    samples = []
+    cpu = time.process_time()
+    for _ in range(count):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    cpu = (time.process_time() - cpu) / count * 1e6
+    samples.sort()
+    return (statistics.median(samples) * 1e6, samples[int(len(samples) * 0.99)] * 1e6, cpu)
+
+
+def concurrent(call, count, threads):
+    def worker():
+        for _ in range(count // threads):
+            call()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return count // threads * threads / (time.perf_counter() - start)
+
+
+def main():
+    # Werkzeug logs every request it serves
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    module = load_module("08_microservices")
+
+    http_server = make_server("127.0.0.1", 0, module.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    rpc_server = RpcServer()
+    rpc_server.register("data.get", lambda params: module.data_payload(), inline=True)
+    rpc_server.register("data.post", module.received_data, inline=True)
+    rpc_server.start()
+
+    http_url = f"http://127.0.0.1:{http_server.server_port}"
+    client = ServiceClient({"data": http_url})
+    rpc_client = RpcClient("127.0.0.1", rpc_server.port)
+    calls = {
+        "GET": (lambda: client.get("data", "/api/data").json(),
+                lambda: rpc_client.call("data.get")),
+        "POST": (lambda: client.post("data", "/api/data", json_body=RECORDS).json(),
+                 lambda: rpc_client.call("data.post", RECORDS)),
+    }
+
+    codec = "msgpack" if rpc.msgpack is not None else "struct codec (msgpack not installed)"
+    print(f"MessagePack: {codec}")
+    print()
+    print(f"{'1. serialization':<24}{'JSON us':>9}{'MsgPack us':>12}{'JSON B':>8}{'MsgPack B':>11}")
+    for name, payload in (("GET /api/data response", module.data_payload()),
+                          ("POST 20-record body", RECORDS)):
+        encoded_json = json.dumps(payload, separators=(",", ":")).encode()
+        encoded = packb(payload)
+        json_us = micros(lambda: json.loads(json.dumps(payload, separators=(",", ":")).encode()))
+        pack_us = micros(lambda: unpackb(packb(payload)))
+        print(f"{name:<24}{json_us:>9.1f}{pack_us:>12.1f}{len(encoded_json):>8}{len(encoded):>11}")
+
+    print()
+    print(f"{'2. bytes per call':<24}{'HTTP up':>9}{'HTTP down':>11}{'RPC up':>8}{'RPC down':>10}")
+    http_relay = CountingRelay(http_server.server_port)
+    rpc_relay = CountingRelay(rpc_server.port)
+    relayed_http = ServiceClient({"data": f"http://127.0.0.1:{http_relay.port}"})
+    relayed_rpc = RpcClient("127.0.0.1", rpc_relay.port)
+    for name, http_call, rpc_call in (
+            ("GET /api/data", lambda: relayed_http.get("data", "/api/data"),
+             lambda: relayed_rpc.call("data.get")),
+            ("POST 20 records", lambda: relayed_http.post("data", "/api/data", json_body=RECORDS),
+             lambda: relayed_rpc.call("data.post", RECORDS))):
+        counts = []
+        for relay, call in ((http_relay, http_call), (rpc_relay, rpc_call)):
+            relay.sent = relay.received = 0
+            for _ in range(100):
+                call()
+            counts += [relay.sent / 100, relay.received / 100]
+        print(f"{name:<24}{counts[0]:>9.0f}{counts[1]:>11.0f}{counts[2]:>8.0f}{counts[3]:>10.0f}")
+    relayed_http.close()
+    relayed_rpc.close()
+
+    print()
+    print(f"{'3. sequential calls':<24}{'p50 us':>9}{'p99 us':>9}{'CPU us/call':>13}")
+    for name, (http_call, rpc_call) in calls.items():
+        http_call(), rpc_call()
+        for transport, call in (("HTTP + JSON", http_call), ("RPC + MsgPack", rpc_call)):
+            p50, p99, cpu = sequential(call, count)
+            print(f"{name + ' ' + transport:<24}{p50:>9.0f}{p99:>9.0f}{cpu:>13.0f}")
+
+    print()
+    print(f"4. {threads} threads: HTTP connection pool vs one multiplexed RPC connection")
+    for name, (http_call, rpc_call) in calls.items():
+        http_rate = concurrent(http_call, count, threads)
+        rpc_rate = concurrent(rpc_call, count, threads)
+        print(f"{name:<6} HTTP {http_rate:>7.0f} calls/s   RPC {rpc_rate:>7.0f} calls/s")
+
+    client.close()
+    rpc_client.close()
+    http_server.shutdown()
+    rpc_server.stop()
+
+
+if __name__ == '__main__':
+    main()
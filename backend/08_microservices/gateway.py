@@ -0,0 +1,149 @@
+"""
+API Gateway
+Composite endpoints that fan one request out to several upstream services.
+
+- Sub-requests run concurrently on a shared thread pool, so a composite call
+  takes about as long as its slowest upstream, not the sum of all of them
+- Every upstream has a deadline (the gateway default or a per-upstream
+  override). An upstream that has not answered by then is reported as
+  ``deadline exceeded`` and the composite answer goes out without it. Each
+  sub-request is sent with what is left of its deadline as its timeout, so
+  an abandoned one gives its worker back by the deadline too
+- Aggregated answers are cached for ``cache_ttl`` seconds (partial ones for
+  ``partial_ttl``), and concurrent misses for the same composite share one
+  fan-out instead of each starting their own
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from common.http_client import UpstreamError, UpstreamTimeout
+
+
+class Gateway:
+    """Fans composite calls out over a ``ServiceClient``."""
+
+    def __init__(self, client, deadline=0.5, deadlines=None, workers=32, cache_ttl=1.0,
+                 partial_ttl=0.25):
+        self.client = client
+        self.deadline = deadline
+        self.deadlines = dict(deadlines or {})
+        self.cache_ttl = cache_ttl
+        self.partial_ttl = partial_ttl
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="gateway")
+        self._cache = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.partial = 0
+        os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def _after_fork_in_child(self):
+        # The pool's threads, and any fan-out in flight, stayed in the parent
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="gateway")
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def deadline_for(self, name):
+        return self.deadlines.get(name, self.deadline)
+
+    def aggregate(self, key, calls):
+        """Cached composite result for ``calls`` (``{label: (upstream, path)}``).
+
+        Returns ``(result, cached)``; see ``fan_out`` for ``result``.
+        """
+        self.calls += 1
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1], True
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return pending.result(), True
+        try:
+            result = self.fan_out(calls)
+            ttl = self.partial_ttl if result["partial"] else self.cache_ttl
+            with self._lock:
+                if ttl > 0:
+                    self._cache[key] = (time.monotonic() + ttl, result)
+                del self._inflight[key]
+            pending.set_result(result)
+            return result, False
+        except BaseException as exc:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.set_exception(exc)
+            raise
+
+    def fan_out(self, calls):
+        """Run every GET in ``calls`` concurrently, each within its upstream's deadline.
+
+        Returns ``{"partial": bool, "elapsed_ms": float, "results": {label: ...}}``
+        where each result has the upstream's ``status`` and ``body``, or an
+        ``error`` when it failed or missed its deadline.
+        """
+        start = time.monotonic()
+        futures = {}
+        for label, (name, path) in calls.items():
+            until = start + self.deadline_for(name)
+            futures[label] = (self._executor.submit(self._call, name, path, until), until)
+        results = {}
+        partial = False
+        # Shortest deadline first: every wait ends by its own deadline, and
+        # the whole loop by the longest one
+        for label, (future, until) in sorted(futures.items(), key=lambda item: item[1][1]):
+            try:
+                results[label] = future.result(timeout=max(0.0, until - time.monotonic()))
+            except FutureTimeout:
+                results[label] = {"error": "deadline exceeded"}
+                partial = True
+            except UpstreamError as exc:
+                results[label] = {"error": str(exc)}
+                partial = True
+        if partial:
+            self.partial += 1
+        return {
+            "partial": partial,
+            "elapsed_ms": round((time.monotonic() - start) * 1000, 2),
+            "results": {label: results[label] for label in calls},
+        }
+
+    def _call(self, name, path, until):
+        start = time.monotonic()
+        remaining = until - start
+        if remaining <= 0:
+            # Queued behind other calls until its deadline had passed
+            raise UpstreamTimeout(name, "deadline exceeded before sending")
+        response = self.client.get(name, path, timeout=remaining)
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.body.decode("utf-8", "replace")
+        return {"status": response.status, "body": body,
+                "elapsed_ms": round((time.monotonic() - start) * 1000, 2)}
+
+    def stats(self):
+        with self._lock:
+            cached = len(self._cache)
+        return {
+            "calls": self.calls,
+            "cache_hits": self.hits,
+            "coalesced": self.coalesced,
+            "partial": self.partial,
+            "cached_composites": cached,
+            "deadline": self.deadline,
+            "deadlines": self.deadlines,
+        }
@@ -0,0 +1,486 @@
+"""
+Binary RPC
+A compact alternative to JSON-over-HTTP for internal calls between services.
+
+Frames are length-prefixed: a 9-byte header (payload length, request id,
+kind) followed by a MessagePack payload. A request carries
+``[method, params]``; the response carries the result, or an error message.
+
+- One persistent TCP connection carries many concurrent calls: every call
+  has its own request id, and responses come back in whatever order they
+  finish, so a slow call does not hold up the ones behind it
+- Nothing is parsed but the fixed header; there are no request lines,
+  header fields or URL routing, and MessagePack is smaller than JSON and
+  needs no escaping
+- MessagePack comes from ``msgpack`` when it is installed; otherwise a
+  struct-based codec for the same format (nil, bool, int, float, str,
+  bytes, array, map) is used, so both ends interoperate either way
+- Handlers registered ``inline`` run on the connection's reader thread,
+  which suits fast in-memory answers; the rest run on a thread pool
+- A started server that forks hands the port to its children: each child
+  binds its own ``SO_REUSEPORT`` socket (the kernel balances connections
+  over them) and the parent stops accepting, so in a pre-forked deployment
+  every worker serves RPC and the supervisor none
+"""
+
+import itertools
+import os
+import socket
+import struct
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+HEADER = struct.Struct("!IIB")
+REQUEST, RESPONSE, ERROR = 0, 1, 2
+MAX_FRAME = 16 * 2**20
+
+
+class RpcError(Exception):
+    """The call failed remotely, or the connection was lost."""
+
+
+class RpcTimeout(RpcError):
+    pass
+
+
+# MessagePack ------------------------------------------------------------------
+
+_u8, _u16, _u32, _u64 = (struct.Struct(fmt) for fmt in ("!B", "!H", "!I", "!Q"))
+_i8, _i16, _i32, _i64 = (struct.Struct(fmt) for fmt in ("!b", "!h", "!i", "!q"))
+_f64 = struct.Struct("!d")
+_FIXSTR = [bytes((0xA0 | size,)) for size in range(32)]
+_FIXARRAY = [bytes((0x90 | size,)) for size in range(16)]
+_FIXMAP = [bytes((0x80 | size,)) for size in range(16)]
+_FIXINT = [bytes((value,)) for value in range(128)]
+
+
+def _pack(value, out):
+    kind = type(value)
+    if kind is str:
+        data = value.encode()
+        size = len(data)
+        if size < 32:
+            out.append(_FIXSTR[size])
+        elif size < 0x100:
+            out.append(b"\xd9" + _u8.pack(size))
+        elif size < 0x10000:
+            out.append(b"\xda" + _u16.pack(size))
+        else:
+            out.append(b"\xdb" + _u32.pack(size))
+        out.append(data)
+    elif kind is int:
+        if 0 <= value < 128:
+            out.append(_FIXINT[value])
+        elif -32 <= value < 0:
+            out.append(bytes((value & 0xFF,)))
+        elif -0x80000000 <= value < 0x80000000:
+            out.append(b"\xd2" + _i32.pack(value))
+        elif 0 <= value < 2**64:
+            out.append(b"\xcf" + _u64.pack(value))
+        else:
+            out.append(b"\xd3" + _i64.pack(value))
+    elif kind is dict:
+        size = len(value)
+        out.append(_FIXMAP[size] if size < 16 else
+                   b"\xde" + _u16.pack(size) if size < 0x10000 else b"\xdf" + _u32.pack(size))
+        for key, item in value.items():
+            _pack(key, out)
+            _pack(item, out)
+    elif kind is list or kind is tuple:
+        size = len(value)
+        out.append(_FIXARRAY[size] if size < 16 else
+                   b"\xdc" + _u16.pack(size) if size < 0x10000 else b"\xdd" + _u32.pack(size))
+        for item in value:
+            _pack(item, out)
+    elif value is None:
+        out.append(b"\xc0")
+    elif value is True:
+        out.append(b"\xc3")
+    elif value is False:
+        out.append(b"\xc2")
+    elif kind is float:
+        out.append(b"\xcb" + _f64.pack(value))
+    elif kind is bytes or kind is bytearray:
+        size = len(value)
+        out.append(b"\xc4" + _u8.pack(size) if size < 0x100 else
+                   b"\xc5" + _u16.pack(size) if size < 0x10000 else b"\xc6" + _u32.pack(size))
+        out.append(bytes(value))
+    else:
+        raise TypeError(f"Cannot serialize {kind.__name__} over RPC")
+
+
+def _unpack(data, offset):
+    """(value, next offset) for the object starting at ``offset``."""
+    tag = data[offset]
+    offset += 1
+    if tag < 0x80:
+        return tag, offset
+    if tag >= 0xE0:
+        return tag - 0x100, offset
+    if 0xA0 <= tag < 0xC0:
+        end = offset + (tag & 0x1F)
+        return data[offset:end].decode(), end
+    if 0x80 <= tag < 0x90:
+        return _unpack_map(data, offset, tag & 0x0F)
+    if 0x90 <= tag < 0xA0:
+        return _unpack_array(data, offset, tag & 0x0F)
+    if tag == 0xC0:
+        return None, offset
+    if tag == 0xC2:
+        return False, offset
+    if tag == 0xC3:
+        return True, offset
+    if tag in _SIZED:
+        kind, length = _SIZED[tag]
+        size = length.unpack_from(data, offset)[0]
+        offset += length.size
+        if kind == "str":
+            end = offset + size
+            return data[offset:end].decode(), end
+        if kind == "bin":
+            end = offset + size
+            return bytes(data[offset:end]), end
+        if kind == "array":
+            return _unpack_array(data, offset, size)
+        return _unpack_map(data, offset, size)
+    if tag in _NUMBERS:
+        number = _NUMBERS[tag]
+        return number.unpack_from(data, offset)[0], offset + number.size
+    raise ValueError(f"Unsupported MessagePack type 0x{tag:02x}")
+
+
+def _unpack_array(data, offset, size):
+    items = []
+    append = items.append
+    for _ in range(size):
+        # Small ints and short strings, the bulk of most payloads, are
+        # decoded here without a call
+        tag = data[offset]
+        if tag < 0x80:
+            append(tag)
+            offset += 1
+        elif 0xA0 <= tag < 0xC0:
+            end = offset + 1 + (tag & 0x1F)
+            append(data[offset + 1:end].decode())
+            offset = end
+        else:
+            item, offset = _unpack(data, offset)
+            append(item)
+    return items, offset
+
+
+def _unpack_map(data, offset, size):
+    result = {}
+    for _ in range(size):
+        tag = data[offset]
+        if 0xA0 <= tag < 0xC0:
+            end = offset + 1 + (tag & 0x1F)
+            key = data[offset + 1:end].decode()
+            offset = end
+        else:
+            key, offset = _unpack(data, offset)
+        tag = data[offset]
+        if tag < 0x80:
+            result[key] = tag
+            offset += 1
+        elif 0xA0 <= tag < 0xC0:
+            end = offset + 1 + (tag & 0x1F)
+            result[key] = data[offset + 1:end].decode()
+            offset = end
+        else:
+            result[key], offset = _unpack(data, offset)
+    return result, offset
+
+
+_SIZED = {
+    0xC4: ("bin", _u8), 0xC5: ("bin", _u16), 0xC6: ("bin", _u32),
+    0xD9: ("str", _u8), 0xDA: ("str", _u16), 0xDB: ("str", _u32),
+    0xDC: ("array", _u16), 0xDD: ("array", _u32),
+    0xDE: ("map", _u16), 0xDF: ("map", _u32),
+}
+_NUMBERS = {
+    0xCA: struct.Struct("!f"), 0xCB: _f64,
+    0xCC: _u8, 0xCD: _u16, 0xCE: _u32, 0xCF: _u64,
+    0xD0: _i8, 0xD1: _i16, 0xD2: _i32, 0xD3: _i64,
+}
+
+
+def packb(value):
+    """MessagePack bytes for ``value``."""
+    if msgpack is not None:
+        return msgpack.packb(value)
+    out = []
+    _pack(value, out)
+    return b"".join(out)
+
+
+def unpackb(data):
+    if msgpack is not None:
+        return msgpack.unpackb(data)
+    value, end = _unpack(data, 0)
+    if end != len(data):
+        raise ValueError("Trailing data after MessagePack object")
+    return value
+
+
+# Framing ----------------------------------------------------------------------
+
+def frame(request_id, kind, payload):
+    return HEADER.pack(len(payload), request_id, kind) + payload
+
+
+def read_frame(reader):
+    """(request id, kind, payload) from a buffered reader; None at end of stream."""
+    header = reader.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    size, request_id, kind = HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise RpcError(f"Frame of {size} bytes exceeds {MAX_FRAME}")
+    payload = reader.read(size)
+    if len(payload) < size:
+        return None
+    return request_id, kind, payload
+
+
+# Server -----------------------------------------------------------------------
+
+class RpcServer:
+    """Serves registered handlers; one reader thread per connection."""
+
+    def __init__(self, host="127.0.0.1", port=0, workers=16):
+        self._handlers = {}
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="rpc")
+        self._listener = self._listen(host, port)
+        self.host = host
+        self.port = self._listener.getsockname()[1]
+        self.calls = 0
+        self.errors = 0
+        self.connections = 0
+        self._started = False
+        self._closed = False
+        self._fork_hooks = False
+
+    @staticmethod
+    def _listen(host, port):
+        return socket.create_server((host, port), reuse_port=hasattr(socket, "SO_REUSEPORT"))
+
+    def register(self, name, function, inline=False):
+        """Serve ``function(params)`` as ``name``; ``inline`` for fast, non-blocking ones."""
+        self._handlers[name] = (function, inline)
+        return function
+
+    def start(self):
+        self._started = True
+        if not self._fork_hooks:
+            self._fork_hooks = True
+            os.register_at_fork(after_in_parent=self._after_fork_in_parent,
+                                after_in_child=self._after_fork_in_child)
+        threading.Thread(target=self._accept, name="rpc-accept", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._closed = True
+        self._close_listener()
+
+    def _close_listener(self):
+        try:
+            # Wakes the accept thread, which close() alone would leave blocked
+            self._listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._listener.close()
+
+    def _after_fork_in_parent(self):
+        # The children serve the port from now on; connections left in this
+        # socket's backlog would otherwise wait for an accept that never comes
+        if self._started and not self._closed and self._listener.fileno() != -1:
+            self._close_listener()
+
+    def _after_fork_in_child(self):
+        # The accept, connection and pool threads stayed in the parent
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="rpc")
+        self.calls = self.errors = self.connections = 0
+        # After a reload re-imported this module (SIGHUP to launcher.py), the
+        # app made a new server for the port and this one stays retired
+        current = getattr(sys.modules.get(__name__), "RpcServer", None) is RpcServer
+        if self._started and not self._closed and current:
+            # Closing the inherited socket leaves it open in the parent
+            self._listener.close()
+            self._listener = self._listen(self.host, self.port)
+            self.start()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(sock,), name="rpc-conn",
+                             daemon=True).start()
+
+    def _serve(self, sock):
+        reader = sock.makefile("rb", buffering=65536)
+        write_lock = threading.Lock()
+
+        def reply(request_id, kind, value):
+            send(request_id, kind, packb(value))
+
+        def send(request_id, kind, payload):
+            data = frame(request_id, kind, payload)
+            with write_lock:
+                sock.sendall(data)
+
+        def run(request_id, function, params):
+            try:
+                result = function(params)
+                # Encoded here, so a result that cannot be sent is reported
+                # to the caller instead of leaving it to time out
+                payload = packb(result)
+                if len(payload) > MAX_FRAME:
+                    raise ValueError(f"result of {len(payload)} bytes exceeds {MAX_FRAME}")
+            except Exception as exc:
+                self.errors += 1
+                reply(request_id, ERROR, f"{type(exc).__name__}: {exc}")
+            else:
+                send(request_id, RESPONSE, payload)
+
+        try:
+            while True:
+                received = read_frame(reader)
+                if received is None:
+                    return
+                request_id, kind, payload = received
+                self.calls += 1
+                try:
+                    method, params = unpackb(payload)
+                    function, inline = self._handlers[method]
+                except (ValueError, TypeError, KeyError, IndexError, struct.error) as exc:
+                    self.errors += 1
+                    reply(request_id, ERROR, f"Bad request: {exc!r}")
+                    continue
+                if inline:
+                    run(request_id, function, params)
+                else:
+                    self._executor.submit(run, request_id, function, params)
+        except (OSError, RpcError):
+            pass
+        finally:
+            reader.close()
+            sock.close()
+
+    def stats(self):
+        return {"port": self.port, "connections": self.connections, "calls": self.calls,
+                "errors": self.errors, "methods": sorted(self._handlers)}
+
+
+# Client -----------------------------------------------------------------------
+
+class _Pending:
+    """A call waiting for its response; the lock is released when it arrives."""
+
+    __slots__ = ("lock", "kind", "value")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lock.acquire()
+        self.kind = ERROR
+        self.value = "connection lost"
+
+
+class RpcClient:
+    """Multiplexes concurrent calls over one persistent connection."""
+
+    def __init__(self, host, port, timeout=2.0, connect_timeout=0.5):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._sock = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _connection(self):
+        sock = self._sock
+        if sock is not None:
+            return sock
+        with self._lock:
+            if self._sock is None:
+                sock = socket.create_connection((self.host, self.port), self.connect_timeout)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                # The reader thread blocks until a response or the socket closes
+                sock.settimeout(None)
+                self._sock = sock
+                threading.Thread(target=self._read, args=(sock,), name="rpc-client",
+                                 daemon=True).start()
+            return self._sock
+
+    def _read(self, sock):
+        reader = sock.makefile("rb", buffering=65536)
+        try:
+            while True:
+                received = read_frame(reader)
+                if received is None:
+                    break
+                request_id, kind, payload = received
+                pending = self._pending.pop(request_id, None)
+                if pending is not None:
+                    pending.kind = kind
+                    pending.value = payload
+                    pending.lock.release()
+        except (OSError, RpcError):
+            pass
+        finally:
+            reader.close()
+            self._disconnect(sock)
+
+    def _disconnect(self, sock):
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+        sock.close()
+        # Calls still waiting on this connection fail now, not at their timeout
+        for request_id, pending in list(self._pending.items()):
+            if self._pending.pop(request_id, None) is not None:
+                pending.lock.release()
+
+    def call(self, method, params=None, timeout=None):
+        """Call ``method`` remotely; raises RpcError / RpcTimeout."""
+        try:
+            sock = self._connection()
+        except OSError as exc:
+            raise RpcError(f"connect to {self.host}:{self.port} failed: {exc}") from None
+        request_id = next(self._ids) & 0xFFFFFFFF
+        pending = self._pending[request_id] = _Pending()
+        data = frame(request_id, REQUEST, packb([method, params]))
+        try:
+            with self._write_lock:
+                sock.sendall(data)
+        except OSError as exc:
+            self._pending.pop(request_id, None)
+            self._disconnect(sock)
+            raise RpcError(f"send failed: {exc}") from None
+        timeout = self.timeout if timeout is None else timeout
+        if not pending.lock.acquire(timeout=timeout):
+            self._pending.pop(request_id, None)
+            raise RpcTimeout(f"{method}: no response within {timeout}s")
+        if pending.kind == RESPONSE:
+            return unpackb(pending.value)
+        message = pending.value
+        raise RpcError(f"{method}: {unpackb(message) if isinstance(message, bytes) else message}")
+
+    def close(self):
+        sock = self._sock
+        if sock is not None:
+            self._disconnect(sock)
@@ -0,0 +1,91 @@
+"""
+Stub Services
+Tiny HTTP/1.1 keep-alive services on ephemeral local ports, standing in for
+real upstreams in this topic's benchmarks and checks.
+
+``StubService(handler)`` serves ``handler(method, path, body) -> (status,
+body_bytes)`` from a background thread; ``url`` is its base URL. With
+``close_every=N`` every Nth response silently closes its keep-alive
+connection afterwards, the way servers drop idle connections.
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def json_handler(payload, delay=None):
+    """Handler answering every request with ``payload``; ``delay()`` seconds of latency."""
+    body = json.dumps(payload).encode()
+
+    def handle(method, path, request_body):
+        if delay is not None:
+            time.sleep(delay())
+        return 200, body
+
+    return handle
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, the body waits
+    # for the client's delayed ACK (about 40 ms) on every kept-alive request
+    disable_nagle_algorithm = True
+
+    def _serve(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request_body = self.rfile.read(length) if length else b""
+        status, body = self.server.handler(self.command, self.path, request_body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        server = self.server
+        with server.lock:
+            server.served += 1
+            if server.close_every and server.served % server.close_every == 0:
+                self.close_connection = True
+
+    do_GET = do_POST = do_PUT = do_DELETE = _serve
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Stubs come and go within a process; do not keep their ports in TIME_WAIT
+    allow_reuse_address = True
+    # Many benchmark threads connect at once; the default backlog of 5
+    # overflows and turns into connect timeouts
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # A client that gave up (timeout checks) is expected, not an error
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class StubService:
+    def __init__(self, handler, host="127.0.0.1", close_every=None):
+        self.server = _Server((host, 0), _Handler)
+        self.server.handler = handler
+        self.server.close_every = close_every
+        self.server.served = 0
+        self.server.lock = threading.Lock()
+        self.url = f"http://{host}:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
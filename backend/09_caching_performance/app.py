@@ -6,9 +6,46 @@ A comprehensive example of Caching Performance implementation.
 
 from flask import Flask, jsonify, request
 import json
+import os
+import sys
+import tempfile
 from datetime import datetime
 
+# Shared helpers live in backend/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.compression import CompressionMiddleware
+from common.conditional import VersionedPayload, conditional
+from common.ingest import ingest_request, wants_streaming_ingest
+from common.json_provider import install_json_provider
+from common.static_responses import PerSecondJSON, StaticJSON, now_iso
+
+from cache import LRUCache, cached, path_key, query_key, single_flight
+
 app = Flask(__name__)
+install_json_provider(app)
+# Compress responses above COMPRESSION_MIN_SIZE bytes for clients that accept it
+COMPRESSION_MIN_SIZE = 512
+app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=COMPRESSION_MIN_SIZE)
+
+# Response cache: bounded by resident bytes, entries expire after CACHE_TTL seconds
+# and may be served stale for CACHE_STALE_TTL more while they are refreshed
+CACHE_MAX_BYTES = 8 * 1024 * 1024
+CACHE_TTL = 30.0
+CACHE_STALE_TTL = 10.0
+
+# CACHE_BACKEND=shm shares one memory-mapped cache between all worker processes
+if os.environ.get("CACHE_BACKEND") == "shm":
+    from shm_cache import SharedMemoryCache
+
+    response_cache = SharedMemoryCache(
+        os.environ.get("CACHE_SHM_PATH",
+                       os.path.join(tempfile.gettempdir(), "caching_performance.cache")),
+        max_bytes=CACHE_MAX_BYTES,
+        default_ttl=CACHE_TTL,
+    )
+else:
+    response_cache = LRUCache(max_bytes=CACHE_MAX_BYTES, default_ttl=CACHE_TTL)
 
 # Sample data
 sample_data = {
@@ -22,45 +59,69 @@ sample_data = {
     ]
 }
 
+# sample_data never changes after startup, so its validators are computed once
+sample_payload = VersionedPayload(sample_data)
+
+# Immutable bodies are serialized once at startup and served as raw bytes;
+# the health body only embeds the time, so it is rebuilt once per second
+home_response = StaticJSON(app, {
+    "service": "Caching Performance",
+    "status": "running",
+    "endpoints": [
+        "/api/demo",
+        "/api/health",
+        "/api/data",
+        "/api/cache/stats"
+    ]
+})
+demo_response = StaticJSON(app, sample_data)
+health_response = PerSecondJSON(app, lambda: {
+    "status": "healthy",
+    "service": "Caching Performance",
+    "timestamp": now_iso()
+})
+
 @app.route('/')
+@cached(response_cache, key=path_key, stale_ttl=CACHE_STALE_TTL)
 def home():
-    return jsonify({
-        "service": "Caching Performance",
-        "status": "running",
-        "endpoints": [
-            "/api/demo",
-            "/api/health",
-            "/api/data"
-        ]
-    })
+    return home_response()
 
 @app.route('/api/demo')
+@conditional(sample_payload)
+@cached(response_cache, key=path_key, tags=("data",), stale_ttl=CACHE_STALE_TTL)
 def demo():
-    return jsonify(sample_data)
+    return demo_response()
 
 @app.route('/api/health')
 def health():
-    return jsonify({
-        "status": "healthy",
-        "service": "Caching Performance",
-        "timestamp": datetime.now().isoformat()
-    })
+    return health_response()
 
 @app.route('/api/data', methods=['GET', 'POST'])
+@conditional(sample_payload)
+@cached(response_cache, key=query_key, tags=("data",), stale_ttl=CACHE_STALE_TTL)
 def data():
     if request.method == 'POST':
+        response_cache.invalidate_tag("data")
+        # NDJSON (or a JSON array with ?stream=true) is parsed incrementally
+        # in batches and answered with a summary instead of an echo
+        if wants_streaming_ingest():
+            return jsonify(ingest_request())
         data = request.get_json()
         return jsonify({
             "message": "Data received successfully",
             "received_data": data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         })
     else:
         return jsonify({
             "data": sample_data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         })
 
+@app.route('/api/cache/stats')
+def cache_stats():
+    return jsonify({**response_cache.stats(), "single_flight": single_flight.stats()})
+
 if __name__ == '__main__':
     print(f"Starting Caching Performance demo server...")
     print("Visit: http://localhost:5000")
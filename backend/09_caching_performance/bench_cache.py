@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Response Cache Benchmark
+Compares requests per second for the cached GET endpoints with a warm cache
+against the same endpoints recomputed on every request.
+
+Usage: python bench_cache.py [requests_per_endpoint]
+"""
+
+import sys
+import time
+
+from app import app, response_cache
+
+ENDPOINTS = ["/", "/api/demo", "/api/data"]
+
+
+def run(client, path, count, warm):
+    response_cache.clear()
+    start = time.perf_counter()
+    for _ in range(count):
+        if not warm:
+            response_cache.clear()
+        client.get(path)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    client = app.test_client()
+
+    print(f"{'endpoint':<14}{'uncached req/s':>16}{'cached req/s':>16}{'speedup':>10}")
+    for path in ENDPOINTS:
+        cold = run(client, path, count, warm=False)
+        warm = run(client, path, count, warm=True)
+        print(f"{path:<14}{cold:>16.0f}{warm:>16.0f}{warm / cold:>9.2f}x")
+
+    print()
+    print("Cache stats:", response_cache.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Shared-Memory Cache Benchmark
+Forks 1, 4 and 16 worker processes that each serve the same working set of
+cached responses, once with a private LRUCache per worker and once with one
+SharedMemoryCache shared by all of them. Reports the mean wall-clock and CPU time
+per hit and the total proportional set size (PSS) of all workers, which
+charges shared pages to each process only by its share. On hosts with fewer
+cores than workers the wall-clock figure includes time spent descheduled.
+
+Usage: python bench_shm.py [entries] [body_bytes] [lookups_per_worker]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from cache import CacheEntry, LRUCache
+from shm_cache import SharedMemoryCache
+
+WORKER_COUNTS = (1, 4, 16)
+MAX_BYTES = 256 * 1024 * 1024
+
+
+def pss_kb():
+    """Proportional set size of this process in KiB (Linux only)."""
+    with open("/proc/self/smaps_rollup") as smaps:
+        for line in smaps:
+            if line.startswith("Pss:"):
+                return int(line.split()[1])
+    return 0
+
+
+def worker(backend, path, entries, body_bytes, lookups, barrier, results):
+    if backend == "lru":
+        cache = LRUCache(max_bytes=MAX_BYTES, default_ttl=3600)
+        # A private cache has to be filled by every worker
+        for i in range(entries):
+            cache.set(f"GET:/api/item/{i}", CacheEntry(os.urandom(body_bytes), ttl=3600))
+    else:
+        cache = SharedMemoryCache(path)
+
+    keys = [f"GET:/api/item/{i % entries}" for i in range(lookups)]
+    barrier.wait()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    hits = 0
+    for key in keys:
+        if cache.get(key) is not None:
+            hits += 1
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    results.put((elapsed / lookups * 1e6, cpu / lookups * 1e6, hits / lookups, pss_kb()))
+    # Stay alive until every worker has measured its memory
+    barrier.wait()
+
+
+def run(backend, workers, entries, body_bytes, lookups):
+    path = os.path.join(tempfile.gettempdir(), f"bench_shm_{os.getpid()}.cache")
+    if backend == "shm":
+        cache = SharedMemoryCache(path, max_bytes=MAX_BYTES, default_ttl=3600)
+        for i in range(entries):
+            cache.set(f"GET:/api/item/{i}", CacheEntry(os.urandom(body_bytes), ttl=3600))
+        cache.close()
+
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker,
+                        args=(backend, path, entries, body_bytes, lookups, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    if os.path.exists(path):
+        os.remove(path)
+
+    wall = sum(s[0] for s in samples) / workers
+    cpu = sum(s[1] for s in samples) / workers
+    hit_rate = min(s[2] for s in samples)
+    total_pss = sum(s[3] for s in samples)
+    return wall, cpu, hit_rate, total_pss
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    body_bytes = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+    lookups = int(sys.argv[3]) if len(sys.argv) > 3 else 50000
+
+    print(f"{entries} entries x {body_bytes} bytes, {lookups} lookups per worker")
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'backend':<8}{'workers':>8}{'wall us':>10}{'cpu us':>10}{'hit rate':>10}{'total PSS MiB':>16}")
+    for backend in ("lru", "shm"):
+        for workers in WORKER_COUNTS:
+            wall, cpu, hit_rate, total_pss = run(backend, workers, entries, body_bytes, lookups)
+            print(f"{backend:<8}{workers:>8}{wall:>10.2f}{cpu:>10.2f}{hit_rate:>10.2f}"
+                  f"{total_pss / 1024:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+"""
+Response Cache
+An LRU + TTL store bounded by resident bytes, plus a Flask route decorator
+that serves pre-serialized responses straight from memory.
+
+Expensive keys are protected against stampedes: concurrent misses for one key
+are coalesced into a single computation, hot entries are refreshed early with
+probabilistic (XFetch) expiry, and recently expired entries may be served
+stale while a background refresh runs.
+"""
+
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, copy_current_request_context, make_response, request
+
+# Rough per-entry bookkeeping cost (key, entry object, OrderedDict node)
+ENTRY_OVERHEAD = 256
+
+# Headers that must never be replayed from the cache
+UNCACHEABLE_HEADERS = {"content-length", "set-cookie", "date"}
+
+
+class CacheEntry:
+    """A serialized response plus the metadata needed to expire it."""
+
+    __slots__ = (
+        "body", "status", "headers", "tags",
+        "created", "expires", "stale_until", "delta", "size",
+    )
+
+    def __init__(self, body, status=200, headers=(), tags=(), ttl=60.0,
+                 stale_ttl=0.0, delta=0.0):
+        self.body = body
+        self.status = status
+        self.headers = list(headers)
+        self.tags = tuple(tags)
+        self.created = time.monotonic()
+        self.expires = self.created + ttl
+        # Past ``expires`` but before ``stale_until`` the entry may still be
+        # served while it is being revalidated
+        self.stale_until = self.expires + stale_ttl
+        # Time it took to compute the value, used to scale early refresh
+        self.delta = delta
+        self.size = (
+            len(body)
+            + sum(len(k) + len(v) for k, v in self.headers)
+            + ENTRY_OVERHEAD
+        )
+
+    def expired(self, now=None):
+        return (now if now is not None else time.monotonic()) >= self.expires
+
+    def ttl_remaining(self, now=None):
+        return self.expires - (now if now is not None else time.monotonic())
+
+    def should_refresh_early(self, beta=1.0, now=None):
+        """XFetch: refresh with a probability that rises as expiry approaches.
+
+        See Vattani et al., "Optimal Probabilistic Cache Stampede Prevention".
+        """
+        if beta <= 0 or self.delta <= 0:
+            return False
+        now = now if now is not None else time.monotonic()
+        return now - self.delta * beta * math.log(1.0 - random.random()) >= self.expires
+
+    def to_response(self):
+        return Response(self.body, status=self.status, headers=self.headers)
+
+
+class LRUCache:
+    """Thread-safe LRU cache whose capacity is measured in bytes, not entries."""
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, default_ttl=60.0):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_hits = 0
+
+    def get(self, key, allow_stale=False):
+        """Return the live entry for ``key`` or None.
+
+        With ``allow_stale`` an expired entry that is still inside its
+        stale-while-revalidate window is returned as well; callers can tell
+        by checking ``entry.expired()``.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expired(now):
+                if not allow_stale or now >= entry.stale_until:
+                    self._remove(key)
+                    self.expirations += 1
+                    self.misses += 1
+                    return None
+                self.stale_hits += 1
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        if entry.size > self.max_bytes:
+            # Never let one oversized body flush the whole cache
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+                return True
+            return False
+
+    def invalidate_tag(self, tag):
+        """Drop every entry stored under ``tag``; returns how many were removed."""
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "lru",
+                "entries": len(self._entries),
+                "resident_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "stale_hits": self.stale_hits,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller (the leader) runs the function; callers arriving while
+    it is in flight block and share its result or exception.
+    """
+
+    class _Call:
+        __slots__ = ("done", "result", "error")
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+        self.background_refreshes = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = self._Call()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        return self._lead(key, call, fn)
+
+    def _lead(self, key, call, fn):
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do_background(self, key, fn):
+        """Start ``fn`` in a daemon thread unless ``key`` is already in flight."""
+        with self._lock:
+            if key in self._calls:
+                return False
+            # Registered before the thread starts, so the rest of a stale
+            # burst finds it in flight instead of starting refreshes of its own
+            call = self._calls[key] = self._Call()
+            self.executions += 1
+            self.background_refreshes += 1
+
+        def run():
+            try:
+                self._lead(key, call, fn)
+            except Exception:
+                # The stale entry keeps being served; the next request retries
+                pass
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "background_refreshes": self.background_refreshes,
+            }
+
+
+# Shared by every @cached view unless a route passes its own
+single_flight = SingleFlight()
+
+
+# Key functions -------------------------------------------------------------
+
+def path_key():
+    """Key on method and path only; the query string is ignored."""
+    return f"{request.method}:{request.path}"
+
+
+def query_key():
+    """Key on method, path and the normalized (sorted) query string."""
+    args = sorted(request.args.items(multi=True))
+    query = "&".join(f"{k}={v}" for k, v in args)
+    return f"{request.method}:{request.path}?{query}"
+
+
+def header_key(*names, base=query_key):
+    """Build a key function that also varies on the selected request headers."""
+    lowered = [name.lower() for name in names]
+
+    def key_func():
+        varies = "|".join(f"{name}={request.headers.get(name, '')}" for name in lowered)
+        return f"{base()}|{varies}"
+
+    return key_func
+
+
+def cached(cache, ttl=None, key=query_key, tags=(), stale_ttl=0.0, beta=1.0,
+           flight=single_flight):
+    """Cache successful GET/HEAD responses of a view as raw bytes.
+
+    ``stale_ttl`` enables stale-while-revalidate for that many seconds past
+    expiry, ``beta`` scales XFetch early refresh (0 disables it) and
+    ``flight`` coalesces concurrent misses (None disables coalescing).
+    """
+
+    def decorator(view):
+        def compute(cache_key, args, kwargs):
+            start = time.perf_counter()
+            response = make_response(view(*args, **kwargs))
+            entry = CacheEntry(
+                response.get_data(),
+                status=response.status_code,
+                headers=[
+                    (k, v) for k, v in response.headers.items()
+                    if k.lower() not in UNCACHEABLE_HEADERS
+                ],
+                tags=tags,
+                ttl=cache.default_ttl if ttl is None else ttl,
+                stale_ttl=stale_ttl,
+                delta=time.perf_counter() - start,
+            )
+            if response.status_code == 200:
+                cache.set(cache_key, entry)
+            return entry
+
+        def refresh_in_background(cache_key, args, kwargs):
+            if flight is None:
+                return
+            refresh = copy_current_request_context(
+                lambda: compute(cache_key, args, kwargs)
+            )
+            flight.do_background(cache_key, refresh)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+
+            cache_key = key()
+            entry = cache.get(cache_key, allow_stale=stale_ttl > 0)
+            if entry is not None:
+                now = time.monotonic()
+                if entry.expired(now):
+                    refresh_in_background(cache_key, args, kwargs)
+                    status = "STALE"
+                else:
+                    if entry.should_refresh_early(beta, now):
+                        refresh_in_background(cache_key, args, kwargs)
+                    status = "HIT"
+                response = entry.to_response()
+                response.headers["X-Cache"] = status
+                return response
+
+            if flight is None:
+                entry = compute(cache_key, args, kwargs)
+            else:
+                entry = flight.do(cache_key, lambda: compute(cache_key, args, kwargs))
+            response = entry.to_response()
+            response.headers["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
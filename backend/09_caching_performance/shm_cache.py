@@ -0,0 +1,451 @@
+"""
+Shared-Memory Response Cache
+A cache backend stored in a memory-mapped file so that every prefork worker on
+the host shares one copy of each cached response.
+
+Layout of the file:
+
+    [file header][stripe 0][stripe 1]...[stripe N-1]
+
+    stripe = [stripe header][hash table][slab class 0][slab class 1]...
+
+Each stripe owns a fixed-size open-addressing hash table (linear probing with
+backward-shift deletion) and its own slab area, split into fixed-size chunks
+per size class. A key hashes to exactly one stripe, so a stripe is guarded by
+one lock: a threading.Lock inside the process plus an fcntl byte-range lock
+across processes. When a size class runs out of chunks, the least recently
+used of a few sampled entries of that class is evicted.
+
+It exposes the same interface as cache.LRUCache and can be passed to @cached.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from cache import CacheEntry
+
+MAGIC = b"SHMCACHE"
+VERSION = 1
+NO_CHUNK = 0xFFFFFFFF
+SLAB_CLASSES = (512, 2048, 8192, 32768, 131072)
+EVICTION_SAMPLES = 5
+
+# magic, version, stripes, slots per stripe, class count, 8 sizes, 8 chunk counts
+FILE_HEADER = struct.Struct("<8sIIII8I8I")
+FILE_HEADER_SIZE = 4096
+
+# hits, misses, evictions, expirations, invalidations, stale hits,
+# resident bytes, entries, then per-class free list heads and bump pointers
+STRIPE_HEADER = struct.Struct("<8Q8I8I")
+STRIPE_HEADER_SIZE = 192
+COUNTERS = ("hits", "misses", "evictions", "expirations",
+            "invalidations", "stale_hits", "resident_bytes", "entries")
+
+# state, slab class, chunk, key hash, expires, stale until, last access, delta, length
+SLOT = struct.Struct("<BBxxIQdddfI")
+EMPTY, USED = 0, 1
+
+# status, key length, tags length, headers length, body length
+PAYLOAD_HEADER = struct.Struct("<HHHII")
+MAX_FIELD = 0xFFFF
+
+
+def _align(value, boundary=4096):
+    return (value + boundary - 1) // boundary * boundary
+
+
+class SharedMemoryCache:
+    """Byte-bounded cache shared by all processes that open the same file."""
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, default_ttl=60.0, stripes=16):
+        self.path = path
+        self.default_ttl = default_ttl
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, 0)
+        try:
+            header = os.pread(self._fd, FILE_HEADER.size, 0)
+            if len(header) == FILE_HEADER.size and header[:8] == MAGIC:
+                fields = FILE_HEADER.unpack(header)
+                if fields[1] != VERSION:
+                    raise ValueError(f"{path} was created by an incompatible cache version")
+                self._stripes, self._slots = fields[2], fields[3]
+                count = fields[4]
+                self._classes = fields[5:5 + count]
+                self._chunks = fields[13:13 + count]
+                self._compute_layout()
+                self._map()
+            else:
+                self._stripes = stripes
+                self._classes = SLAB_CLASSES
+                # Give every size class an equal share of the byte budget
+                share = max_bytes // len(SLAB_CLASSES) // stripes
+                self._chunks = tuple(max(1, share // size) for size in SLAB_CLASSES)
+                # Keep the table at most half full so probe chains stay short
+                self._slots = 2 * sum(self._chunks)
+                self._compute_layout()
+                os.ftruncate(self._fd, self._size)
+                self._map()
+                self._format()
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 0)
+
+        self.max_bytes = self._stripes * sum(
+            size * count for size, count in zip(self._classes, self._chunks)
+        )
+        self._thread_locks = [threading.Lock() for _ in range(self._stripes)]
+
+    # Layout ---------------------------------------------------------------
+
+    def _compute_layout(self):
+        self._table_offset = STRIPE_HEADER_SIZE
+        offset = self._table_offset + self._slots * SLOT.size
+        self._class_offsets = []
+        for size, count in zip(self._classes, self._chunks):
+            self._class_offsets.append(offset)
+            offset += size * count
+        self._stripe_size = _align(offset)
+        self._size = FILE_HEADER_SIZE + self._stripes * self._stripe_size
+
+    def _map(self):
+        self._mm = mmap.mmap(self._fd, self._size, mmap.MAP_SHARED,
+                             mmap.PROT_READ | mmap.PROT_WRITE)
+
+    def _format(self):
+        pad = (0,) * (8 - len(self._classes))
+        FILE_HEADER.pack_into(
+            self._mm, 0, MAGIC, VERSION, self._stripes, self._slots,
+            len(self._classes), *self._classes, *pad, *self._chunks, *pad,
+        )
+        for stripe in range(self._stripes):
+            self._reset_stripe(stripe)
+
+    def _reset_stripe(self, stripe):
+        base = self._stripe_base(stripe)
+        STRIPE_HEADER.pack_into(self._mm, base, *(0,) * 8, *(NO_CHUNK,) * 8, *(0,) * 8)
+        # A zeroed slot is EMPTY; slab chunks are handed out lazily by the
+        # bump pointer, so their pages are never touched until used
+        table = base + self._table_offset
+        self._mm[table:table + self._slots * SLOT.size] = bytes(self._slots * SLOT.size)
+
+    def _stripe_base(self, stripe):
+        return FILE_HEADER_SIZE + stripe * self._stripe_size
+
+    def _chunk_offset(self, stripe, cls, chunk):
+        return self._stripe_base(stripe) + self._class_offsets[cls] + chunk * self._classes[cls]
+
+    def _slot_offset(self, stripe, index):
+        return self._stripe_base(stripe) + self._table_offset + index * SLOT.size
+
+    # Locking and counters ---------------------------------------------------
+
+    def _acquire(self, stripe):
+        self._thread_locks[stripe].acquire()
+        # Byte ``stripe + 1`` of the file stands for the stripe; byte 0
+        # guards creation of the file
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe + 1)
+
+    def _release(self, stripe):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe + 1)
+        self._thread_locks[stripe].release()
+
+    @contextmanager
+    def _locked(self, stripe):
+        self._acquire(stripe)
+        try:
+            yield
+        finally:
+            self._release(stripe)
+
+    def _header(self, stripe):
+        return list(STRIPE_HEADER.unpack_from(self._mm, self._stripe_base(stripe)))
+
+    def _bump(self, stripe, counter, amount=1):
+        offset = self._stripe_base(stripe) + 8 * COUNTERS.index(counter)
+        value, = struct.unpack_from("<Q", self._mm, offset)
+        struct.pack_into("<Q", self._mm, offset, max(0, value + amount))
+
+    # Slab allocation --------------------------------------------------------
+
+    def _alloc_chunk(self, stripe, cls):
+        base = self._stripe_base(stripe)
+        free_offset = base + 64 + 4 * cls
+        bump_offset = base + 96 + 4 * cls
+        head, = struct.unpack_from("<I", self._mm, free_offset)
+        if head != NO_CHUNK:
+            following, = struct.unpack_from("<I", self._mm, self._chunk_offset(stripe, cls, head))
+            struct.pack_into("<I", self._mm, free_offset, following)
+            return head
+        bump, = struct.unpack_from("<I", self._mm, bump_offset)
+        if bump < self._chunks[cls]:
+            struct.pack_into("<I", self._mm, bump_offset, bump + 1)
+            return bump
+        return NO_CHUNK
+
+    def _free_chunk(self, stripe, cls, chunk):
+        free_offset = self._stripe_base(stripe) + 64 + 4 * cls
+        head, = struct.unpack_from("<I", self._mm, free_offset)
+        struct.pack_into("<I", self._mm, self._chunk_offset(stripe, cls, chunk), head)
+        struct.pack_into("<I", self._mm, free_offset, chunk)
+
+    # Hash table -------------------------------------------------------------
+
+    def _hash(self, key):
+        data = key.encode("utf-8")
+        return data, int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+    def _home(self, key_hash):
+        return (key_hash // self._stripes) % self._slots
+
+    def _read_slot(self, stripe, index):
+        return SLOT.unpack_from(self._mm, self._slot_offset(stripe, index))
+
+    def _find(self, stripe, key_hash, key_bytes):
+        index = self._home(key_hash)
+        for _ in range(self._slots):
+            slot = self._read_slot(stripe, index)
+            if slot[0] == EMPTY:
+                return -1, None
+            if slot[3] == key_hash and self._slot_key(stripe, slot) == key_bytes:
+                return index, slot
+            index = (index + 1) % self._slots
+        return -1, None
+
+    def _slot_key(self, stripe, slot):
+        offset = self._chunk_offset(stripe, slot[1], slot[2])
+        key_len = PAYLOAD_HEADER.unpack_from(self._mm, offset)[1]
+        start = offset + PAYLOAD_HEADER.size
+        return self._mm[start:start + key_len]
+
+    def _delete_at(self, stripe, index):
+        slot = self._read_slot(stripe, index)
+        self._free_chunk(stripe, slot[1], slot[2])
+        self._bump(stripe, "resident_bytes", -slot[8])
+        self._bump(stripe, "entries", -1)
+
+        # Backward-shift deletion keeps probe chains intact without tombstones
+        hole = index
+        probe = index
+        while True:
+            probe = (probe + 1) % self._slots
+            moved = self._read_slot(stripe, probe)
+            if moved[0] == EMPTY:
+                break
+            home = self._home(moved[3])
+            if hole <= probe:
+                stays = hole < home <= probe
+            else:
+                stays = home > hole or home <= probe
+            if stays:
+                continue
+            SLOT.pack_into(self._mm, self._slot_offset(stripe, hole), *moved)
+            hole = probe
+        SLOT.pack_into(self._mm, self._slot_offset(stripe, hole), EMPTY, 0, 0, 0, 0.0, 0.0, 0.0, 0.0, 0)
+
+    def _evict_one(self, stripe, cls):
+        """Evict the least recently used of a few sampled entries of ``cls``."""
+        start = random.randrange(self._slots)
+        victim, oldest = -1, None
+        found = 0
+        for step in range(self._slots):
+            index = (start + step) % self._slots
+            slot = self._read_slot(stripe, index)
+            if slot[0] == USED and slot[1] == cls:
+                if oldest is None or slot[6] < oldest:
+                    victim, oldest = index, slot[6]
+                found += 1
+                if found >= EVICTION_SAMPLES:
+                    break
+        if victim < 0:
+            return False
+        self._delete_at(stripe, victim)
+        self._bump(stripe, "evictions")
+        return True
+
+    # Serialization ----------------------------------------------------------
+
+    @staticmethod
+    def _encode(key_bytes, entry):
+        tags = "\0".join(entry.tags).encode("utf-8")
+        headers = "\0".join(f"{k}\0{v}" for k, v in entry.headers).encode("utf-8")
+        if max(len(key_bytes), len(tags), len(headers)) > MAX_FIELD:
+            # Does not fit the payload header; the response is just not cached
+            return None
+        return b"".join((
+            PAYLOAD_HEADER.pack(entry.status, len(key_bytes), len(tags), len(headers), len(entry.body)),
+            key_bytes, tags, headers, entry.body,
+        ))
+
+    @staticmethod
+    def _decode_tags(payload):
+        _, key_len, tags_len, _, _ = PAYLOAD_HEADER.unpack_from(payload)
+        start = PAYLOAD_HEADER.size + key_len
+        tags = bytes(payload[start:start + tags_len]).decode("utf-8")
+        return tags.split("\0") if tags else []
+
+    @staticmethod
+    def _decode(payload, expires, stale_until, delta, now):
+        status, key_len, tags_len, headers_len, body_len = PAYLOAD_HEADER.unpack_from(payload)
+        offset = PAYLOAD_HEADER.size + key_len
+        tags = payload[offset:offset + tags_len].decode("utf-8")
+        offset += tags_len
+        flat = payload[offset:offset + headers_len].decode("utf-8").split("\0") if headers_len else []
+        offset += headers_len
+        body = payload[offset:offset + body_len]
+        return CacheEntry(
+            body,
+            status=status,
+            headers=list(zip(flat[::2], flat[1::2])),
+            tags=tags.split("\0") if tags else (),
+            ttl=expires - now,
+            stale_ttl=stale_until - expires,
+            delta=delta,
+        )
+
+    # Public interface -------------------------------------------------------
+
+    def get(self, key, allow_stale=False):
+        key_bytes, key_hash = self._hash(key)
+        stripe = key_hash % self._stripes
+        # Wall-clock time is comparable across processes
+        now = time.time()
+        # Hits are the hot path, so lock explicitly rather than via _locked()
+        self._acquire(stripe)
+        try:
+            index, slot = self._find(stripe, key_hash, key_bytes)
+            if slot is None:
+                self._bump(stripe, "misses")
+                return None
+            _, cls, chunk, _, expires, stale_until, _, delta, length = slot
+            if now >= expires:
+                if not allow_stale or now >= stale_until:
+                    self._delete_at(stripe, index)
+                    self._bump(stripe, "expirations")
+                    self._bump(stripe, "misses")
+                    return None
+                self._bump(stripe, "stale_hits")
+            # Record the access time for eviction sampling
+            struct.pack_into("<d", self._mm, self._slot_offset(stripe, index) + 32, now)
+            self._bump(stripe, "hits")
+            offset = self._chunk_offset(stripe, cls, chunk)
+            payload = self._mm[offset:offset + length]
+        finally:
+            self._release(stripe)
+        return self._decode(payload, expires, stale_until, delta, now)
+
+    def set(self, key, entry):
+        key_bytes, key_hash = self._hash(key)
+        payload = self._encode(key_bytes, entry)
+        if payload is None:
+            return False
+        cls = next((i for i, size in enumerate(self._classes) if len(payload) <= size), None)
+        if cls is None:
+            return False
+
+        stripe = key_hash % self._stripes
+        now = time.time()
+        expires = now + entry.ttl_remaining()
+        stale_until = expires + (entry.stale_until - entry.expires)
+        with self._locked(stripe):
+            index, _ = self._find(stripe, key_hash, key_bytes)
+            if index >= 0:
+                self._delete_at(stripe, index)
+
+            chunk = self._alloc_chunk(stripe, cls)
+            while chunk == NO_CHUNK:
+                if not self._evict_one(stripe, cls):
+                    return False
+                chunk = self._alloc_chunk(stripe, cls)
+
+            offset = self._chunk_offset(stripe, cls, chunk)
+            self._mm[offset:offset + len(payload)] = payload
+
+            index = self._home(key_hash)
+            while self._read_slot(stripe, index)[0] != EMPTY:
+                index = (index + 1) % self._slots
+            SLOT.pack_into(
+                self._mm, self._slot_offset(stripe, index),
+                USED, cls, chunk, key_hash, expires, stale_until, now, entry.delta, len(payload),
+            )
+            self._bump(stripe, "resident_bytes", len(payload))
+            self._bump(stripe, "entries")
+        return True
+
+    def delete(self, key):
+        key_bytes, key_hash = self._hash(key)
+        stripe = key_hash % self._stripes
+        with self._locked(stripe):
+            index, _ = self._find(stripe, key_hash, key_bytes)
+            if index < 0:
+                return False
+            self._delete_at(stripe, index)
+            self._bump(stripe, "invalidations")
+            return True
+
+    def invalidate_tag(self, tag):
+        """Drop every entry stored under ``tag``; returns how many were removed."""
+        removed = 0
+        for stripe in range(self._stripes):
+            with self._locked(stripe):
+                doomed = []
+                for index in range(self._slots):
+                    slot = self._read_slot(stripe, index)
+                    if slot[0] != USED:
+                        continue
+                    offset = self._chunk_offset(stripe, slot[1], slot[2])
+                    if tag in self._decode_tags(self._mm[offset:offset + slot[8]]):
+                        doomed.append((slot[3], self._slot_key(stripe, slot)))
+                # Deleting shifts later slots back, so look each key up again
+                for key_hash, key_bytes in doomed:
+                    index, _ = self._find(stripe, key_hash, key_bytes)
+                    if index >= 0:
+                        self._delete_at(stripe, index)
+                        self._bump(stripe, "invalidations")
+                        removed += 1
+        return removed
+
+    def clear(self):
+        for stripe in range(self._stripes):
+            with self._locked(stripe):
+                header = self._header(stripe)
+                entries = header[COUNTERS.index("entries")]
+                self._reset_stripe(stripe)
+                # Keep the lifetime counters, drop only the contents
+                for name, value in zip(COUNTERS[:6], header[:6]):
+                    self._bump(stripe, name, value)
+                self._bump(stripe, "invalidations", entries)
+
+    def stats(self):
+        totals = dict.fromkeys(COUNTERS, 0)
+        for stripe in range(self._stripes):
+            with self._locked(stripe):
+                header = self._header(stripe)
+            for name, value in zip(COUNTERS, header):
+                totals[name] += value
+        lookups = totals["hits"] + totals["misses"]
+        return {
+            "backend": "shm",
+            "path": self.path,
+            "entries": totals["entries"],
+            "resident_bytes": totals["resident_bytes"],
+            "max_bytes": self.max_bytes,
+            "mapped_bytes": self._size,
+            "hits": totals["hits"],
+            "misses": totals["misses"],
+            "hit_rate": round(totals["hits"] / lookups, 4) if lookups else 0.0,
+            "evictions": totals["evictions"],
+            "stale_hits": totals["stale_hits"],
+            "expirations": totals["expirations"],
+            "invalidations": totals["invalidations"],
+        }
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Launcher Benchmark
+Runs launcher.py as a separate process and loads it with keep-alive clients
+in their own processes (so the load generator is not held back by this
+process's GIL):
+
+1. Throughput of GET /api/health with 1, 2 and 4 workers. Workers only
+   help while there are idle cores: on a single-core machine every row is
+   about the same
+2. Errors seen by the clients while, under load, the launcher reloads
+   (SIGHUP), a worker is killed with SIGKILL and replaced, and workers are
+   recycled for exceeding --max-memory
+
+Usage: python bench_launcher.py [topic] [seconds] [clients]
+"""
+
+import multiprocessing
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.http_client import ServiceClient, UpstreamError
+
+LAUNCHER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "launcher.py")
+
+
+class Launcher:
+    """launcher.py in a subprocess, with its log lines collected."""
+
+    def __init__(self, topic, *options):
+        self.process = subprocess.Popen(
+            [sys.executable, LAUNCHER, topic, "--bind", "127.0.0.1:0", *options],
+            stderr=subprocess.PIPE, text=True)
+        self.lines = []
+        self._ready = threading.Event()
+        threading.Thread(target=self._read, daemon=True).start()
+        if not self._ready.wait(30):
+            raise RuntimeError("launcher did not start:\n" + "".join(self.lines))
+        self.url = re.search(r"http://\S+", self.lines[0]).group(0)
+
+    def _read(self):
+        for line in self.process.stderr:
+            self.lines.append(line)
+            if " serving " in line:
+                self._ready.set()
+
+    def started(self):
+        return [int(pid) for pid in re.findall(r"worker (\d+) started", "".join(self.lines))]
+
+    def wait_for_workers(self, count, timeout=30):
+        deadline = time.monotonic() + timeout
+        while len(self.started()) < count and time.monotonic() < deadline:
+            time.sleep(0.05)
+        # Workers answer once they have entered their accept loop
+        time.sleep(0.5)
+
+    def count(self, pattern):
+        return len(re.findall(pattern, "".join(self.lines)))
+
+    def stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait(60)
+
+
+def client_loop(url, seconds, results):
+    client = ServiceClient({"app": url}, timeout=5.0)
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            errors += client.get("app", "/api/health").status != 200
+        except UpstreamError:
+            errors += 1
+        done += 1
+    client.close()
+    results.put((done, errors))
+
+
+def load(url, seconds, clients):
+    """(requests/s, errors) from ``clients`` processes for ``seconds``."""
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=client_loop, args=(url, seconds, results))
+                 for _ in range(clients)]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return sum(done for done, _ in totals) / seconds, sum(errors for _, errors in totals)
+
+
+def during_load(url, seconds, clients, actions):
+    """Run ``load`` while ``actions`` ((delay, function) pairs) happen."""
+    def act():
+        start = time.monotonic()
+        for delay, function in actions:
+            time.sleep(max(0.0, start + delay - time.monotonic()))
+            function()
+
+    thread = threading.Thread(target=act)
+    thread.start()
+    rate, errors = load(url, seconds, clients)
+    thread.join()
+    return rate, errors
+
+
+def main():
+    topic = sys.argv[1] if len(sys.argv) > 1 else "10"
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    clients = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    print(f"{os.cpu_count()} CPU(s), {clients} keep-alive client processes, "
+          f"GET /api/health for {seconds:.0f} s per row")
+    print(f"{'1. workers x 8 threads':<32}{'req/s':>9}{'errors':>8}")
+    for workers in (1, 2, 4):
+        for label, options in (("shared socket", ()), ("SO_REUSEPORT", ("--reuse-port",))):
+            launcher = Launcher(topic, "--workers", str(workers), *options)
+            launcher.wait_for_workers(workers)
+            rate, errors = load(launcher.url, seconds, clients)
+            launcher.stop()
+            print(f"{f'{workers} ({label})':<32}{rate:>9.0f}{errors:>8}")
+
+    print()
+    print(f"{'2. under load, 2 workers':<32}{'req/s':>9}{'errors':>8}  launcher log")
+    launcher = Launcher(topic, "--workers", "2")
+    launcher.wait_for_workers(2)
+    rate, errors = during_load(launcher.url, seconds, clients,
+                               [(seconds / 3, lambda: launcher.process.send_signal(signal.SIGHUP))])
+    print(f"{'reload (SIGHUP)':<32}{rate:>9.0f}{errors:>8}  "
+          f"{launcher.count('stopping worker .*: reload')} workers replaced")
+
+    victim = launcher.started()[-1]
+    rate, errors = during_load(launcher.url, seconds, clients,
+                               [(seconds / 3, lambda: os.kill(victim, signal.SIGKILL))])
+    time.sleep(1.5)
+    print(f"{'SIGKILL one worker':<32}{rate:>9.0f}{errors:>8}  "
+          f"{launcher.count('died')} died, replaced by worker {launcher.started()[-1]}")
+    launcher.stop()
+
+    # Every worker is above 1 MiB, so workers are recycled continually
+    launcher = Launcher(topic, "--workers", "2", "--max-memory", "1")
+    launcher.wait_for_workers(2)
+    rate, errors = load(launcher.url, seconds, clients)
+    launcher.stop()
+    print(f"{'--max-memory 1 (recycling)':<32}{rate:>9.0f}{errors:>8}  "
+          f"{launcher.count('MiB resident')} workers recycled")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+Production Launcher
+Serves a topic's ``app.py`` with a pre-forked pool of worker processes,
+each answering requests from a fixed pool of threads. ``app.run(debug=True)``
+is one process with the reloader and debugger, for development only.
+
+- The app is imported once in the launcher (preload) and the workers are
+  forked from it, so they start instantly and share its memory pages
+  copy-on-write. ``--no-preload`` imports it in every worker instead
+- Workers share the port either through one listening socket created by
+  the launcher and inherited by every worker (default), or through their
+  own ``SO_REUSEPORT`` sockets, which the kernel balances connections over
+  (``--reuse-port``, Linux)
+- A worker takes a connection only when one of its ``--threads`` threads is
+  free; otherwise the connection waits in the kernel backlog, where a less
+  busy worker can pick it up
+- A worker that dies is replaced (with a back-off when workers keep dying
+  right after starting). A worker whose resident memory passes
+  ``--max-memory`` MiB is recycled: a replacement starts, then the old one
+  stops gracefully
+- Graceful stop (SIGTERM to a worker): stop accepting, close idle
+  keep-alive connections, finish requests in flight, exit. The launcher
+  kills a worker that takes longer than ``--graceful-timeout``
+
+Signals to the launcher: SIGHUP reloads (re-imports the app, starts a new
+set of workers, then stops the old ones; the listening socket stays open
+throughout, so no connection is refused), SIGTTIN / SIGTTOU add or remove a
+worker, SIGTERM / SIGINT stop everything gracefully.
+
+Threads an app starts while it is imported stay in the launcher. The ones
+in this repo restart in each forked worker: the async log writer, health
+checker and service client pools (common), the write-behind writer (03),
+the password hashing pool (05), and the gateway pool and RPC server (08).
+Every topic has been checked with two workers. State an app keeps in
+memory is per worker: 04's items, 05's registered users, 07's subscribers
+and channels, and counters, rate limits and in-process caches everywhere.
+
+Usage: python launcher.py <topic|app.py> [--bind HOST:PORT] [--workers N] [--threads N]
+"""
+
+import argparse
+import atexit
+import errno
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from common.loader import BACKEND_DIR, load_app, resolve_app_path
+
+log = logging.getLogger("launcher")
+
+
+# Worker ------------------------------------------------------------------------
+
+class _Handler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        # Also bounds how long an idle keep-alive connection holds a thread
+        self.timeout = self.server.keepalive
+        super().setup()
+        self.server.track(self.connection, busy=False)
+
+    def parse_request(self):
+        # The request line has arrived: from here on the connection is busy
+        self.server.track(self.connection, busy=True)
+        return super().parse_request()
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        self.server.track(self.connection, busy=False)
+        if self.server.stopping:
+            self.close_connection = True
+
+    def finish(self):
+        self.server.untrack(self.connection)
+        super().finish()
+
+    def log_request(self, code="-", size="-"):
+        if self.server.access_log:
+            super().log_request(code, size)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug's WSGI server with a fixed thread pool and graceful stop."""
+
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, listener, app, threads=8, keepalive=5.0, access_log=False):
+        host, port = listener.getsockname()[:2]
+        super().__init__(host, port, app, handler=_Handler, fd=listener.fileno())
+        self.keepalive = keepalive
+        self.access_log = access_log
+        self.stopping = False
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="request")
+        self._slots = threading.BoundedSemaphore(threads)
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def _handle_request_noblock(self):
+        # Accept only with a free thread; until then the connection stays
+        # in the kernel backlog, where another worker can take it
+        if not self._slots.acquire(timeout=0.5):
+            return
+        try:
+            request, client_address = self.get_request()
+        except OSError:
+            # Another worker accepted it first (shared socket), or it was reset
+            self._slots.release()
+            return
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def track(self, connection, busy):
+        with self._lock:
+            self._connections[connection] = busy
+
+    def untrack(self, connection):
+        with self._lock:
+            self._connections.pop(connection, None)
+
+    def stop(self):
+        """Stop accepting and close idle connections; returns once serve_forever has."""
+        self.stopping = True
+        self.shutdown()
+        with self._lock:
+            idle = [connection for connection, busy in self._connections.items() if not busy]
+        for connection in idle:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def drain(self):
+        """Wait for requests in flight to finish."""
+        self._pool.shutdown(wait=True)
+
+
+def _listen(host, port, backlog, reuse_port):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    if backlog:
+        sock.listen(backlog)
+    # Workers poll a shared socket: a connection another worker took must
+    # not leave this one blocked in accept()
+    sock.setblocking(False)
+    return sock
+
+
+def _run_worker(arbiter, app):
+    """Body of a worker process; never returns."""
+    code = 0
+    try:
+        # The launcher handles Ctrl-C and reloads; a worker only stops on SIGTERM
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGTTIN, signal.SIG_IGN)
+        signal.signal(signal.SIGTTOU, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.set_wakeup_fd(-1)
+        os.close(arbiter.wake_read)
+        os.close(arbiter.wake_write)
+        if app is None:
+            app = load_app(arbiter.target)
+        if arbiter.reuse_port:
+            listener = _listen(arbiter.host, arbiter.port, arbiter.backlog, reuse_port=True)
+        else:
+            listener = arbiter.listener
+        server = PooledWSGIServer(listener, app, arbiter.threads, arbiter.keepalive,
+                                  arbiter.access_log)
+        if arbiter.reuse_port:
+            listener.close()
+
+        def on_term(signum, frame):
+            # serve_forever runs on this thread, so it is stopped from another
+            threading.Thread(target=server.stop, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, on_term)
+        server.serve_forever(poll_interval=0.5)
+        server.drain()
+    except Exception:
+        log.exception("worker %d failed", os.getpid())
+        code = 1
+    finally:
+        try:
+            atexit._run_exitfuncs()
+        finally:
+            # Never unwind into the launcher's stack that this process inherited
+            os._exit(code)
+
+
+# Launcher ----------------------------------------------------------------------
+
+def _loggers():
+    return [logging.getLogger()] + [logger for logger in logging.Logger.manager.loggerDict.values()
+                                    if isinstance(logger, logging.Logger)]
+
+
+def _rss_mib(pid):
+    """Resident set size of ``pid`` in MiB; None when /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Arbiter:
+    """Forks and supervises the workers."""
+
+    def __init__(self, target, host="0.0.0.0", port=5000, workers=None, threads=8,
+                 reuse_port=False, preload=True, max_memory=0, graceful_timeout=30.0,
+                 keepalive=5.0, backlog=2048, access_log=False):
+        self.target = resolve_app_path(target)
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.threads = threads
+        self.reuse_port = reuse_port
+        self.preload = preload
+        self.max_memory = max_memory
+        self.graceful_timeout = graceful_timeout
+        self.keepalive = keepalive
+        self.backlog = backlog
+        self.access_log = access_log
+        self.app = None
+        self._handlers = None
+        self.listener = None
+        self.generation = 0
+        # pid -> (generation, started)
+        self.children = {}
+        # pid -> kill deadline
+        self.retiring = {}
+        self.crashes = 0
+        self.recycled = 0
+        self._signals = []
+        self._stopping = False
+        self._spawn_after = 0.0
+        self.wake_read = self.wake_write = -1
+
+    # Setup -----------------------------------------------------------------
+
+    def _load(self):
+        """Import (or re-import) the app in the launcher."""
+        # Handlers the previous import attached to (global) loggers would
+        # otherwise stay, and every record would be logged twice
+        if self._handlers is None:
+            self._handlers = {handler for logger in _loggers() for handler in logger.handlers}
+        else:
+            for logger in _loggers():
+                for handler in list(logger.handlers):
+                    if handler not in self._handlers:
+                        logger.removeHandler(handler)
+                        handler.close()
+        # Drop this repo's modules so a reload picks up changed code
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, "__file__", None) or ""
+            if path.startswith(BACKEND_DIR) and path != os.path.abspath(__file__):
+                del sys.modules[name]
+        app = load_app(self.target)
+        # Objects from the import never need collecting; freezing them keeps
+        # the workers' garbage collector from writing to (and so copying)
+        # the pages they share with the launcher
+        gc.freeze()
+        return app
+
+    def _bind(self):
+        if self.reuse_port:
+            # Bound but not listening: reserves the port (and resolves port 0)
+            # without taking any connections, which go to the workers' sockets
+            self.listener = _listen(self.host, self.port, 0, reuse_port=True)
+        else:
+            self.listener = _listen(self.host, self.port, self.backlog, reuse_port=False)
+        self.port = self.listener.getsockname()[1]
+
+    def _install_signals(self):
+        self.wake_read, self.wake_write = os.pipe()
+        os.set_blocking(self.wake_read, False)
+        os.set_blocking(self.wake_write, False)
+        signal.set_wakeup_fd(self.wake_write)
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN,
+                       signal.SIGTTOU, signal.SIGCHLD):
+            signal.signal(signum, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    # Workers ---------------------------------------------------------------
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(self, self.app)
+        self.children[pid] = (self.generation, time.monotonic())
+        log.info("worker %d started (generation %d)", pid, self.generation)
+        return pid
+
+    def _retire(self, pid, reason):
+        if pid in self.retiring:
+            return
+        log.info("stopping worker %d: %s", pid, reason)
+        self.retiring[pid] = time.monotonic() + self.graceful_timeout
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            _, started = self.children.pop(pid, (None, 0.0))
+            if self.retiring.pop(pid, None) is not None or self._stopping:
+                continue
+            self.crashes += 1
+            log.warning("worker %d died (%s)", pid, _describe(status))
+            if time.monotonic() - started < 1.0:
+                # Dying right after start (e.g. an import error): back off
+                # instead of forking in a tight loop
+                delay = min(30.0, 2 ** min(self.crashes, 5) / 4)
+                self._spawn_after = time.monotonic() + delay
+                log.warning("worker exited within 1 s of starting; retrying in %.1f s", delay)
+
+    def _active(self):
+        return [pid for pid in self.children if pid not in self.retiring]
+
+    def _maintain(self):
+        now = time.monotonic()
+        active = self._active()
+        if now >= self._spawn_after:
+            for _ in range(self.workers - len(active)):
+                self._spawn()
+        for pid in active[self.workers:]:
+            self._retire(pid, "fewer workers requested")
+        if self.max_memory:
+            for pid in self._active():
+                rss = _rss_mib(pid)
+                if rss is not None and rss > self.max_memory:
+                    # Replacement first, so capacity does not dip
+                    self.recycled += 1
+                    self._spawn()
+                    self._retire(pid, f"{rss:.0f} MiB resident, above {self.max_memory} MiB")
+        for pid, deadline in list(self.retiring.items()):
+            if now > deadline:
+                log.warning("worker %d did not stop in %.0f s; killing it", pid,
+                            self.graceful_timeout)
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                self.retiring[pid] = float("inf")
+
+    def _reload(self):
+        log.info("reloading %s", self.target)
+        if self.preload:
+            try:
+                self.app = self._load()
+            except Exception:
+                log.exception("reload failed; keeping the running workers")
+                return
+        old = self._active()
+        self.generation += 1
+        # New workers first: the listening socket never closes, so requests
+        # keep being accepted by whichever generation is free
+        for _ in range(self.workers):
+            self._spawn()
+        for pid in old:
+            self._retire(pid, "reload")
+
+    # Main loop -------------------------------------------------------------
+
+    def run(self):
+        if self.preload:
+            self.app = self._load()
+        self._bind()
+        self._install_signals()
+        log.info("serving %s on http://%s:%d with %d workers x %d threads (%s)",
+                 os.path.relpath(self.target, BACKEND_DIR), self.host, self.port, self.workers,
+                 self.threads, "SO_REUSEPORT" if self.reuse_port else "shared socket")
+        self._maintain()
+        while True:
+            try:
+                select.select([self.wake_read], [], [], 1.0)
+            except InterruptedError:
+                pass
+            try:
+                while os.read(self.wake_read, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+            signals, self._signals = self._signals, []
+            for signum in signals:
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.stop()
+                    return
+                if signum == signal.SIGHUP:
+                    self._reload()
+                elif signum == signal.SIGTTIN:
+                    self.workers += 1
+                elif signum == signal.SIGTTOU and self.workers > 1:
+                    self.workers -= 1
+            self._reap()
+            self._maintain()
+
+    def stop(self):
+        """Stop every worker gracefully, then close the socket."""
+        self._stopping = True
+        for pid in list(self.children):
+            self._retire(pid, "shutdown")
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            self._reap_blocking(0.1)
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.listener.close()
+        log.info("stopped")
+
+    def _reap_blocking(self, interval):
+        time.sleep(interval)
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if not pid:
+                return
+            self.children.pop(pid, None)
+            self.retiring.pop(pid, None)
+
+
+def _describe(status):
+    if os.WIFSIGNALED(status):
+        return f"signal {signal.Signals(os.WTERMSIG(status)).name}"
+    return f"exit code {os.waitstatus_to_exitcode(status)}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a topic app.py with pre-forked workers.")
+    parser.add_argument("target", help='topic prefix ("09"), topic directory or path to app.py')
+    parser.add_argument("--bind", default="0.0.0.0:5000", help="HOST:PORT (port 0 picks a free one)")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 0)),
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=8, help="request threads per worker")
+    parser.add_argument("--reuse-port", action="store_true",
+                        help="one SO_REUSEPORT socket per worker instead of a shared one")
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        help="import the app in each worker instead of once before forking")
+    parser.add_argument("--max-memory", type=float, default=0,
+                        help="recycle workers above this resident memory in MiB (0: off)")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    parser.add_argument("--keepalive", type=float, default=5.0,
+                        help="seconds an idle keep-alive connection is kept open")
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s [%(process)d] %(levelname)s %(message)s")
+    # Werkzeug's own per-request log is replaced by --access-log
+    logging.getLogger("werkzeug").setLevel(logging.INFO if args.access_log else logging.WARNING)
+    host, _, port = args.bind.rpartition(":")
+    arbiter = Arbiter(args.target, host.strip("[]") or "0.0.0.0", int(port), args.workers,
+                      args.threads, args.reuse_port, args.preload, args.max_memory,
+                      args.graceful_timeout, args.keepalive, access_log=args.access_log)
+    try:
+        arbiter.run()
+    except OSError as exc:
+        if exc.errno == errno.EADDRINUSE:
+            log.error("%s is already in use", args.bind)
+            return 1
+        raise
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
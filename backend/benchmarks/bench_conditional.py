@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Conditional GET Benchmark
+Compares the server-side cost of full 200 responses against 304 Not Modified
+responses for /api/demo and /api/data in each backend topic app.
+
+Usage: python benchmarks/bench_conditional.py [topic ...] [--requests N]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.benchtools import build_environ, time_requests
+from common.loader import load_app, topic_dirs
+
+ENDPOINTS = ["/api/demo", "/api/data"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare 200 and 304 response cost")
+    parser.add_argument("topics", nargs="*", help="topic prefixes such as 01 or 09 (default: all)")
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    topics = args.topics or [os.path.basename(d) for d in topic_dirs()]
+    print(f"{'app':<32}{'endpoint':<12}{'200 us':>10}{'304 us':>10}{'200 B':>8}{'304 B':>8}")
+    for topic in topics:
+        app = load_app(topic)
+        name = os.path.basename(app.root_path)
+        for path in ENDPOINTS:
+            full_us, (status, headers, body) = time_requests(app, build_environ(path), args.requests)
+            etag = dict(headers).get("ETag")
+            if etag is None:
+                # Not conditional (e.g. 03's streamed /api/data pages)
+                print(f"{name:<32}{path:<12}{full_us:>10.1f}{'no ETag':>10}{len(body):>8}{'':>8}")
+                continue
+            cheap_environ = build_environ(path, headers={"If-None-Match": etag})
+            cheap_us, (cheap_status, _, cheap_body) = time_requests(app, cheap_environ, args.requests)
+            assert cheap_status.startswith("304"), cheap_status
+            print(f"{name:<32}{path:<12}{full_us:>10.1f}{cheap_us:>10.1f}"
+                  f"{len(body):>8}{len(cheap_body):>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Streaming Ingest Benchmark
+Posts a generated NDJSON upload of the given size to /api/data of a topic app
+and reports throughput and peak RSS growth. The body is produced on the fly,
+so the benchmark itself never holds the upload in memory. Each mode runs in a
+fresh process so peak RSS figures are independent.
+
+- stream:   application/x-ndjson through the streaming parser
+- buffered: the same records as one JSON array through request.get_json()
+
+Usage: python benchmarks/bench_ingest.py [megabytes] [--topic 01] [--buffered-mb 16]
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import queue
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.benchtools import build_environ, call
+from common.loader import load_app
+
+RECORD = b'{"id": 123456789, "name": "sensor-reading", "value": 42.125, "tags": ["a", "b", "c"]}'
+
+
+class GeneratedBody(io.RawIOBase):
+    """A read-only stream of ``size`` bytes of NDJSON records, built on demand."""
+
+    def __init__(self, size):
+        unit = RECORD + b"\n"
+        # A whole number of records, so the pattern repeats seamlessly
+        self.block = unit * (64 * 1024 // len(unit) + 1)
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        offset = self.position % len(self.block)
+        count = min(len(buffer), self.size - self.position, len(self.block) - offset)
+        buffer[:count] = self.block[offset:offset + count]
+        self.position += count
+        return count
+
+
+def ndjson_size(megabytes):
+    unit = len(RECORD) + 1
+    return megabytes * 1024 * 1024 // unit * unit
+
+
+def run(mode, megabytes, topic, results):
+    app = load_app(topic)
+    if mode == "stream":
+        size = ndjson_size(megabytes)
+        stream = io.BufferedReader(GeneratedBody(size), 64 * 1024)
+        content_type = "application/x-ndjson"
+    else:
+        count = ndjson_size(megabytes) // (len(RECORD) + 1)
+        body = b"[" + b",".join([RECORD] * count) + b"]"
+        size = len(body)
+        stream = io.BytesIO(body)
+        del body
+        content_type = "application/json"
+
+    environ = build_environ("/api/data", method="POST")
+    environ.update({
+        "wsgi.input": stream,
+        "CONTENT_TYPE": content_type,
+        "CONTENT_LENGTH": str(size),
+    })
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    status, _, response = call(app, environ)
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((status, size, elapsed, (after - before) / 1024, response[:200]))
+
+
+def measure(mode, megabytes, topic):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run, args=(mode, megabytes, topic, results))
+    process.start()
+    try:
+        while True:
+            try:
+                return results.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError(f"{mode} run exited with code {process.exitcode}")
+    finally:
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming vs buffered ingest")
+    parser.add_argument("megabytes", nargs="?", type=int, default=1024)
+    parser.add_argument("--topic", default="01")
+    parser.add_argument("--buffered-mb", type=int, default=16,
+                        help="size for the buffered comparison (0 to skip)")
+    args = parser.parse_args()
+
+    runs = [("stream", args.megabytes)]
+    if args.buffered_mb:
+        runs.insert(0, ("stream", args.buffered_mb))
+        runs.insert(1, ("buffered", args.buffered_mb))
+
+    print(f"{'mode':<10}{'upload MiB':>12}{'MiB/s':>10}{'peak RSS growth MiB':>22}")
+    for mode, megabytes in runs:
+        status, size, elapsed, growth, response = measure(mode, megabytes, args.topic)
+        if not status.startswith("200"):
+            print(f"{mode}: {status} {response!r}")
+            continue
+        print(f"{mode:<10}{size / 2**20:>12.0f}{size / 2**20 / elapsed:>10.1f}{growth:>22.1f}")
+
+
+if __name__ == '__main__':
+    main()
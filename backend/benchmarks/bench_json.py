@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+JSON Serving Benchmark
+Per-endpoint requests per second for a topic app before and after the fast
+JSON provider and pre-serialized responses. "before" is a reference app
+built exactly like the original topic servers: stdlib json via jsonify and
+datetime.now() on every request.
+
+Usage: python benchmarks/bench_json.py [topic] [--requests N]
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from flask import Flask, jsonify, request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import json_provider
+from common.benchtools import build_environ, time_requests
+from common.loader import load_app
+
+ENDPOINTS = ["/", "/api/demo", "/api/health", "/api/data"]
+
+
+def build_reference_app(service):
+    app = Flask("reference")
+    sample_data = {
+        "message": f"Welcome to {service} demo!",
+        "timestamp": datetime.now().isoformat(),
+        "features": [
+            "RESTful API endpoints",
+            "JSON data handling",
+            "Error handling",
+            "Production-ready structure"
+        ]
+    }
+
+    @app.route('/')
+    def home():
+        return jsonify({
+            "service": service,
+            "status": "running",
+            "endpoints": ["/api/demo", "/api/health", "/api/data"]
+        })
+
+    @app.route('/api/demo')
+    def demo():
+        return jsonify(sample_data)
+
+    @app.route('/api/health')
+    def health():
+        return jsonify({
+            "status": "healthy",
+            "service": service,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    @app.route('/api/data', methods=['GET', 'POST'])
+    def data():
+        if request.method == 'POST':
+            return jsonify({
+                "message": "Data received successfully",
+                "received_data": request.get_json(),
+                "timestamp": datetime.now().isoformat()
+            })
+        return jsonify({"data": sample_data, "timestamp": datetime.now().isoformat()})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-endpoint req/s before and after")
+    parser.add_argument("topic", nargs="?", default="01")
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    after = load_app(args.topic)
+    service = after.test_client().get("/").get_json()["service"]
+    before = build_reference_app(service)
+
+    print(f"{service} ({'orjson' if json_provider.orjson else 'stdlib json'} provider)")
+    print(f"{'endpoint':<14}{'before req/s':>14}{'after req/s':>14}{'speedup':>10}")
+    for path in ENDPOINTS:
+        environ = build_environ(path)
+        before_us, _ = time_requests(before, environ, args.requests)
+        after_us, _ = time_requests(after, environ, args.requests)
+        print(f"{path:<14}{1e6 / before_us:>14.0f}{1e6 / after_us:>14.0f}{before_us / after_us:>9.2f}x")
+
+    body = b'{"items": [' + b",".join(b'{"id": %d, "name": "item"}' % i for i in range(500)) + b"]}"
+    environ = build_environ("/api/data", method="POST", data=body, content_type="application/json")
+    before_us, _ = time_requests(before, environ, args.requests // 5)
+    after_us, _ = time_requests(after, environ, args.requests // 5)
+    print(f"{'POST 500 rows':<14}{1e6 / before_us:>14.0f}{1e6 / after_us:>14.0f}{before_us / after_us:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
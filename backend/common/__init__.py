@@ -0,0 +1,6 @@
+"""
+Shared helpers for the backend topic servers.
+
+Each ``backend/<topic>/app.py`` puts the ``backend`` directory on ``sys.path``
+and imports from here, so every topic app behaves the same way.
+"""
@@ -0,0 +1,183 @@
+"""
+Admission Control
+Concurrency limits with a short, bounded wait queue, so an overloaded server
+turns excess requests away quickly instead of slowing every request down.
+
+``ConcurrencyLimiter`` admits up to ``limit`` requests at once. Beyond that,
+up to ``queue_size`` requests wait at most ``queue_timeout`` seconds for a
+slot, first come first served; anything else is rejected at once. A freed
+slot is handed straight to the oldest waiter, so newcomers cannot overtake
+the queue.
+
+With ``latency_target`` set the limit adapts (AIMD): it grows by about one
+per ``limit`` requests that finish within the target while the limiter is
+full, and shrinks by ``backoff`` when a request overshoots, at most once per
+``latency_target``. It stays between ``min_limit`` and ``max_limit``.
+
+``AdmissionMiddleware`` applies limiters to a WSGI app by path prefix and
+answers 503 with ``Retry-After``.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+
+class ConcurrencyLimiter:
+    """Admit ``limit`` concurrent requests, queue a few, reject the rest."""
+
+    def __init__(self, limit, queue_size=None, queue_timeout=0.05, latency_target=None,
+                 min_limit=1, max_limit=None, backoff=0.9, clock=time.monotonic):
+        self.limit = float(limit)
+        self.queue_size = int(limit) if queue_size is None else queue_size
+        self.queue_timeout = queue_timeout
+        self.latency_target = latency_target
+        self.min_limit = min_limit
+        self.max_limit = max_limit or max(int(limit) * 4, min_limit)
+        self.backoff = backoff
+        self.clock = clock
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._last_decrease = 0.0
+
+    def acquire(self):
+        """Take a slot; returns the admission time, or None when rejected."""
+        with self._lock:
+            if self.in_flight < int(self.limit) and not self._waiters:
+                self.in_flight += 1
+                self.admitted += 1
+                return self.clock()
+            if len(self._waiters) >= self.queue_size:
+                self.rejected += 1
+                return None
+            # [event, granted]; release() flips granted under the lock
+            waiter = [threading.Event(), False]
+            self._waiters.append(waiter)
+
+        waiter[0].wait(self.queue_timeout)
+        with self._lock:
+            if not waiter[1]:
+                self._waiters.remove(waiter)
+                self.timed_out += 1
+                self.rejected += 1
+                return None
+            self.admitted += 1
+        return self.clock()
+
+    def release(self, started=None):
+        """Give the slot back; ``started`` (from acquire()) feeds the adaptive limit."""
+        now = self.clock()
+        with self._lock:
+            if started is not None and self.latency_target:
+                self._adapt(now - started, now)
+            # Hand the slot straight to the oldest waiter, if the limit allows
+            if self._waiters and self.in_flight <= int(self.limit):
+                waiter = self._waiters.popleft()
+                waiter[1] = True
+                waiter[0].set()
+                return
+            self.in_flight -= 1
+
+    def _adapt(self, latency, now):
+        if latency > self.latency_target:
+            # One decrease per target interval, so a burst of slow responses
+            # from the same moment does not collapse the limit
+            if now - self._last_decrease >= self.latency_target:
+                self._last_decrease = now
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif self.in_flight >= int(self.limit):
+            # Only grow while the limit is actually what holds requests back
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def stats(self):
+        return {
+            "limit": int(self.limit),
+            "adaptive": bool(self.latency_target),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+class _Releasing:
+    """Response iterable that frees the admission slot once it is closed."""
+
+    __slots__ = ("iterable", "limiter", "started")
+
+    def __init__(self, iterable, limiter, started):
+        self.iterable = iterable
+        self.limiter = limiter
+        self.started = started
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    def close(self):
+        try:
+            if hasattr(self.iterable, "close"):
+                self.iterable.close()
+        finally:
+            limiter, self.limiter = self.limiter, None
+            if limiter is not None:
+                limiter.release(self.started)
+
+
+class AdmissionMiddleware:
+    """Put a WSGI app behind concurrency limiters.
+
+    ``routes`` maps path prefixes to their own limiters (checked in order,
+    first match wins); other paths share ``default``. Paths starting with an
+    ``exempt`` prefix are never limited. A slot is held until the response
+    body is closed, so streamed responses count for as long as they stream.
+    """
+
+    def __init__(self, app, default=None, routes=(), exempt=(), retry_after=1):
+        self.app = app
+        self.default = default
+        self.routes = tuple(routes.items() if isinstance(routes, dict) else routes)
+        self.exempt = tuple(exempt)
+        self.retry_after = retry_after
+
+    def _limiter(self, path):
+        if self.exempt and path.startswith(self.exempt):
+            return None
+        for prefix, limiter in self.routes:
+            if path.startswith(prefix):
+                return limiter
+        return self.default
+
+    def __call__(self, environ, start_response):
+        limiter = self._limiter(environ.get("PATH_INFO", ""))
+        if limiter is None:
+            return self.app(environ, start_response)
+        started = limiter.acquire()
+        if started is None:
+            return self._reject(start_response)
+        try:
+            result = self.app(environ, start_response)
+        except BaseException:
+            limiter.release(started)
+            raise
+        return _Releasing(result, limiter, started)
+
+    def _reject(self, start_response):
+        body = json.dumps({"error": "Server overloaded, retry later", "status": 503,
+                           "retry_after": self.retry_after}).encode()
+        start_response("503 Service Unavailable", [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body))),
+            ("Retry-After", str(self.retry_after)),
+        ])
+        return [body]
+
+    def stats(self):
+        limiters = [("default", self.default)] + list(self.routes)
+        return {name: limiter.stats() for name, limiter in limiters if limiter is not None}
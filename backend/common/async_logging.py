@@ -0,0 +1,294 @@
+"""
+Asynchronous Logging
+A logging pipeline that keeps file and console writes out of request threads.
+
+Request threads only put the ``LogRecord`` on a queue (``QueueHandler``).
+A single writer thread wakes every ``linger`` seconds, takes everything
+queued as one batch, formats it there, and writes it to a size-rotated file
+with one large write. Waking on a timer rather than per record keeps thread
+switches (and GIL hand-offs) down to a few per second.
+
+- Formatting is deferred to the writer: the request thread does not even
+  build the message string. Arguments are referenced, not copied, so they
+  must not be mutated after the logging call (true for the usual strings
+  and numbers)
+- Under pressure records are sampled, then dropped, rather than making the
+  request wait: above ``sample_above`` of ``capacity`` only one in
+  ``sample_every`` INFO/DEBUG records is kept, and at ``capacity`` they are
+  all dropped. Warnings and errors are always queued
+- The file is flushed every ``flush_interval`` seconds. An error wakes the
+  writer at once and its batch is flushed straight away, so errors reach
+  disk promptly
+- A process forked from one with a running pipeline (a pre-forking server
+  that imports the app first) gets a fresh queue and writer thread of its
+  own, appending to the same file
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler
+
+ACCESS_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+_STOP = object()
+
+
+class BatchFormatter(logging.Formatter):
+    """Formatter that renders the timestamp once per second, not per record."""
+
+    def __init__(self, fmt=ACCESS_FORMAT, datefmt=None):
+        super().__init__(fmt, datefmt)
+        self._second = None
+        self._stamp = None
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        if second != self._second:
+            self._second = second
+            self._stamp = time.strftime(datefmt or self.default_time_format,
+                                        self.converter(record.created))
+        if datefmt:
+            return self._stamp
+        return self.default_msec_format % (self._stamp, record.msecs)
+
+
+class _PipelineHandler(QueueHandler):
+    """QueueHandler that never blocks and leaves formatting to the writer."""
+
+    def __init__(self, pipeline):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+
+    def prepare(self, record):
+        # QueueHandler.prepare() formats the message here; the writer does it
+        # instead. A traceback is rendered now, while its frames are intact
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        pipeline = self.pipeline
+        if record.levelno < logging.WARNING:
+            backlog = pipeline.queue.qsize()
+            if backlog >= pipeline.capacity:
+                pipeline.dropped += 1
+                return
+            if backlog >= pipeline.sample_threshold:
+                pipeline._sample_count += 1
+                if pipeline._sample_count % pipeline.sample_every:
+                    pipeline.sampled_out += 1
+                    return
+        self.queue.put_nowait(record)
+        if record.levelno >= logging.ERROR:
+            pipeline._wake.set()
+
+    def close(self):
+        # Detaching the handler for good (an app being re-imported) also
+        # ends its writer
+        super().close()
+        self.pipeline.stop()
+
+
+class LogPipeline:
+    """Queue, writer thread and rotating file behind ``handler``.
+
+    Attach ``handler`` to the loggers that should go through the pipeline;
+    ``console`` (a stream such as ``sys.stderr``) also receives every batch.
+    """
+
+    def __init__(self, path, max_bytes=64 * 2**20, backups=5, capacity=10000,
+                 sample_above=0.5, sample_every=10, linger=0.05, flush_interval=1.0,
+                 formatter=None, console=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.capacity = capacity
+        self.sample_threshold = int(capacity * sample_above)
+        self.sample_every = sample_every
+        self.linger = linger
+        self.flush_interval = flush_interval
+        self.formatter = formatter or BatchFormatter()
+        self.console = console
+        # SimpleQueue is unbounded and lock-free to put on; the bound is
+        # enforced by the handler, which can then treat levels differently
+        self.queue = queue.SimpleQueue()
+        self.handler = _PipelineHandler(self)
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.batches = 0
+        self.rotations = 0
+        self._sample_count = 0
+        self._file = None
+        self._size = 0
+        self._thread = None
+        self._wake = threading.Event()
+        # Held while a batch is written, and across fork()
+        self._io_lock = threading.Lock()
+        self._fork_hooks = False
+
+    # Lifecycle ---------------------------------------------------------------
+
+    def start(self):
+        if self._thread is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._open()
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+            if not self._fork_hooks:
+                self._fork_hooks = True
+                os.register_at_fork(before=self._before_fork,
+                                    after_in_parent=self._io_lock.release,
+                                    after_in_child=self._after_fork_in_child)
+        return self
+
+    def stop(self, timeout=5.0):
+        """Write out everything queued so far and close the file."""
+        if self._thread is not None:
+            self.queue.put(_STOP)
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _before_fork(self):
+        # Between batches, with the file buffer empty, so the child neither
+        # inherits a half-written batch nor writes the parent's lines again
+        self._io_lock.acquire()
+        if self._thread is not None:
+            self._file.flush()
+
+    def _after_fork_in_child(self):
+        # Threads do not survive fork(): records queued in the parent stay
+        # the parent's, and this process starts its own writer
+        self._io_lock = threading.Lock()
+        if self._thread is None:
+            return
+        self._thread = None
+        self.queue = self.handler.queue = queue.SimpleQueue()
+        self._wake = threading.Event()
+        self.start()
+
+    # Writer thread -----------------------------------------------------------
+
+    def _open(self):
+        # A large buffer: batches usually go to the OS in a single write
+        self._file = open(self.path, "a", encoding="utf-8", buffering=1 << 20)
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        """app.log -> app.log.1 -> ... -> app.log.<backups>, like RotatingFileHandler."""
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        self._open()
+
+    def _run(self):
+        get_nowait = self.queue.get_nowait
+        last_flush = time.monotonic()
+        dirty = stopping = False
+        while not stopping:
+            self._wake.wait(self.linger)
+            self._wake.clear()
+            batch = []
+            urgent = False
+            # Everything queued so far is one batch
+            while True:
+                try:
+                    record = get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+                urgent = urgent or record.levelno >= logging.ERROR
+            with self._io_lock:
+                if batch:
+                    self._write(batch)
+                    dirty = True
+                now = time.monotonic()
+                if dirty and (urgent or stopping or now - last_flush >= self.flush_interval):
+                    self._file.flush()
+                    if self.console is not None:
+                        self.console.flush()
+                    last_flush, dirty = now, False
+        self._file.close()
+
+    def _write(self, batch):
+        format_record = self.formatter.format
+        lines = []
+        for record in batch:
+            try:
+                lines.append(format_record(record))
+            except Exception:
+                # A bad format string costs that record, not the batch
+                lines.append(f"<unformattable log record from {record.name}: {record.msg!r}>")
+        text = "\n".join(lines) + "\n"
+        if self.max_bytes and self._size + len(text) > self.max_bytes and self._size:
+            self._rotate()
+        self._file.write(text)
+        self._size += len(text)
+        if self.console is not None:
+            self.console.write(text)
+        self.written += len(batch)
+        self.batches += 1
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+        }
+
+
+class AccessLogMiddleware:
+    """Log one line per request: client, method, path, status and duration.
+
+    The record is built from plain values and handed to ``logger``'s
+    handlers directly; Logger.info() would also walk the stack to find the
+    caller, which is always this middleware. With a ``LogPipeline`` handler
+    attached, nothing is formatted or written in the request thread.
+    """
+
+    message = '%s "%s %s" %s %.1fms'
+
+    def __init__(self, app, logger, clock=time.perf_counter):
+        self.app = app
+        self.logger = logger
+        self.clock = clock
+
+    def __call__(self, environ, start_response):
+        start = self.clock()
+        status = ["500"]
+
+        def capture(code, headers, exc_info=None):
+            status[0] = code[:3]
+            return start_response(code, headers, exc_info)
+
+        try:
+            return self.app(environ, capture)
+        finally:
+            logger = self.logger
+            if logger.isEnabledFor(logging.INFO):
+                args = (environ.get("REMOTE_ADDR", "-"), environ.get("REQUEST_METHOD"),
+                        environ.get("PATH_INFO"), status[0], (self.clock() - start) * 1000)
+                logger.handle(logger.makeRecord(logger.name, logging.INFO, __file__, 0,
+                                                self.message, args, None))
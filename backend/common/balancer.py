@@ -0,0 +1,324 @@
+"""
+Client-Side Load Balancing
+Instance selection, health tracking and service discovery for
+``common.http_client`` upstreams that run as several instances.
+
+- ``Balancer`` picks an instance per request. ``p2c`` (power of two
+  choices) samples two instances and takes the one with fewer requests in
+  flight; ``least`` scans all of them; ``round_robin`` is there to compare
+  against. Counting outstanding requests steers traffic away from a slow
+  instance as soon as requests pile up on it, which round-robin never does
+- Passive health: ``eject_after`` consecutive failures (connection errors,
+  timeouts or 5xx answers) eject an instance for ``eject_time`` seconds.
+  When every instance is ejected, all of them are used again rather than
+  failing every request
+- An instance coming back (after ejection, or new in the registry) starts
+  with a low weight that ramps up to full over ``slow_start`` seconds, so a
+  cold or barely recovered instance is not handed its full share at once
+- ``HealthChecker`` probes every instance in the background and ejects or
+  re-admits it, so an instance is also found dead or alive without traffic
+- ``ServiceRegistry`` holds service name -> instance URLs, in memory or
+  loaded from a JSON file that is re-read when it changes. Clients cache the
+  membership and only compare a version number per request. A file that
+  does not parse (caught mid-write, or broken) is logged and the last good
+  membership stays in use
+"""
+
+import http.client
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+POLICIES = ("p2c", "least", "round_robin")
+
+log = logging.getLogger(__name__)
+
+
+class Instance:
+    """One instance of an upstream: its address, pool and load/health state."""
+
+    def __init__(self, url, pool):
+        parts = urlsplit(url)
+        self.url = url
+        self.base_path = parts.path.rstrip("/")
+        self.host_header = parts.netloc
+        self.pool = pool
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.admitted_at = None
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+
+    def stats(self, now, slow_start):
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejections": self.ejections,
+            "ejected": self.ejected_until > now,
+            "weight": round(_weight(self, now, slow_start), 2),
+            "connections_opened": self.pool.opened,
+            "idle": self.pool.idle,
+        }
+
+
+def _weight(instance, now, slow_start):
+    """1.0, or less while the instance is in its slow-start window."""
+    admitted = instance.admitted_at
+    if admitted is None:
+        return 1.0
+    ramp = (now - admitted) / slow_start if slow_start else 1.0
+    if ramp >= 1.0:
+        instance.admitted_at = None
+        return 1.0
+    return max(0.05, ramp)
+
+
+class Balancer:
+    """Picks instances by load and ejects and re-admits them by health."""
+
+    def __init__(self, instances, policy="p2c", eject_after=3, eject_time=5.0, slow_start=10.0,
+                 rng=None):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, got {policy!r}")
+        self.instances = list(instances)
+        self.policy = policy
+        self.eject_after = eject_after
+        self.eject_time = eject_time
+        self.slow_start = slow_start
+        self._rng = rng or random.Random()
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def _candidates(self, now):
+        available = []
+        for instance in self.instances:
+            if instance.ejected_until:
+                if instance.ejected_until > now:
+                    continue
+                # Ejection over: back in rotation, ramping up from a low weight
+                instance.ejected_until = 0.0
+                instance.failures = 0
+                instance.admitted_at = now
+            available.append(instance)
+        # Everything ejected: spreading requests beats refusing all of them
+        return available or self.instances
+
+    def _load(self, instance, now):
+        # A ramping instance looks proportionally busier than it is
+        return (instance.outstanding + 1) / _weight(instance, now, self.slow_start)
+
+    def pick(self):
+        """The instance for the next request; pair every pick with ``release``."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = self._candidates(now)
+            if len(candidates) == 1:
+                chosen = candidates[0]
+            elif self.policy == "p2c":
+                first, second = self._rng.sample(candidates, 2)
+                chosen = first if self._load(first, now) <= self._load(second, now) else second
+            elif self.policy == "least":
+                # Rotating the start breaks ties without always favouring the first
+                offset = next(self._turn) % len(candidates)
+                rotated = candidates[offset:] + candidates[:offset]
+                chosen = min(rotated, key=lambda instance: self._load(instance, now))
+            else:
+                chosen = candidates[next(self._turn) % len(candidates)]
+            chosen.outstanding += 1
+            chosen.requests += 1
+        return chosen
+
+    def release(self, instance, ok):
+        with self._lock:
+            instance.outstanding -= 1
+            if ok:
+                instance.failures = 0
+                return
+            instance.errors += 1
+            instance.failures += 1
+            if instance.failures >= self.eject_after and not instance.ejected_until:
+                self._eject(instance, time.monotonic())
+
+    def _eject(self, instance, now):
+        instance.ejected_until = now + self.eject_time
+        instance.ejections += 1
+
+    def mark(self, instance, healthy):
+        """Record an active health check result."""
+        now = time.monotonic()
+        with self._lock:
+            if healthy:
+                if instance.ejected_until:
+                    instance.ejected_until = 0.0
+                    instance.failures = 0
+                    instance.admitted_at = now
+            elif not instance.ejected_until:
+                self._eject(instance, now)
+            else:
+                # Still failing: stay out for another full period
+                instance.ejected_until = now + self.eject_time
+
+    def set_instances(self, urls, make_pool):
+        """Update membership to ``urls``; instances already known keep their state."""
+        now = time.monotonic()
+        with self._lock:
+            known = {instance.url: instance for instance in self.instances}
+            instances = []
+            for url in urls:
+                instance = known.pop(url, None)
+                if instance is None:
+                    instance = Instance(url, make_pool(url))
+                    if self.instances:
+                        instance.admitted_at = now
+                instances.append(instance)
+            self.instances = instances
+        for instance in known.values():
+            instance.pool.close()
+
+    def stats(self):
+        now = time.monotonic()
+        return [instance.stats(now, self.slow_start) for instance in self.instances]
+
+
+class HealthChecker:
+    """Background thread that probes every instance of a client's upstreams.
+
+    Each probe is a GET of ``path`` on its own short-lived connection, so a
+    probe never waits behind (or takes) a pooled connection. A process
+    forked while it runs starts its own checker thread.
+    """
+
+    def __init__(self, client, interval=2.0, path="/api/health", timeout=0.5):
+        self.client = client
+        self.interval = interval
+        self.path = path
+        self.timeout = timeout
+        self.probes = 0
+        self.failed = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._fork_hooks = False
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="health-check", daemon=True)
+            self._thread.start()
+            if not self._fork_hooks:
+                self._fork_hooks = True
+                os.register_at_fork(after_in_child=self._after_fork_in_child)
+        return self
+
+    def _after_fork_in_child(self):
+        if self._thread is not None and not self._stop.is_set():
+            self._thread = None
+            self.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        for upstream in list(self.client.upstreams.values()):
+            balancer = upstream.balancer
+            for instance in list(balancer.instances):
+                healthy = self.probe(instance)
+                self.probes += 1
+                self.failed += not healthy
+                balancer.mark(instance, healthy)
+
+    def probe(self, instance):
+        pool = instance.pool
+        cls = http.client.HTTPSConnection if pool.https else http.client.HTTPConnection
+        connection = cls(pool.host, pool.port, timeout=self.timeout)
+        try:
+            connection.request("GET", instance.base_path + self.path,
+                               headers={"Host": instance.host_header, "Connection": "close"})
+            response = connection.getresponse()
+            response.read()
+            return response.status < 500
+        except (OSError, http.client.HTTPException):
+            return False
+        finally:
+            connection.close()
+
+
+class ServiceRegistry:
+    """Service name -> instance URLs, in memory or from a JSON file.
+
+    The file holds ``{"users": ["http://127.0.0.1:5001", ...], ...}`` and is
+    checked for changes at most every ``refresh`` seconds. ``version`` goes
+    up whenever the membership changes.
+    """
+
+    def __init__(self, path=None, refresh=5.0):
+        self.path = path
+        self.refresh = refresh
+        self.version = 0
+        self._services = {}
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        if path:
+            self._reload()
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            with open(self.path, encoding="utf-8") as handle:
+                services = {name: list(urls) for name, urls in json.load(handle).items()}
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, AttributeError, TypeError) as exc:
+            # Runs in request threads: keep the last good membership and
+            # read the file again at the next check
+            log.warning("ignoring service registry %s: %s", self.path, exc)
+            return
+        with self._lock:
+            self._mtime = mtime
+            self._services = services
+            self.version += 1
+
+    def current(self):
+        """The version, re-reading the file first if it is due for a check."""
+        if self.path:
+            now = time.monotonic()
+            if now - self._checked >= self.refresh:
+                self._checked = now
+                self._reload()
+        return self.version
+
+    def lookup(self, name):
+        with self._lock:
+            return list(self._services.get(name, ()))
+
+    def names(self):
+        with self._lock:
+            return sorted(self._services)
+
+    def register(self, name, url):
+        with self._lock:
+            urls = self._services.setdefault(name, [])
+            if url not in urls:
+                urls.append(url)
+                self.version += 1
+
+    def deregister(self, name, url):
+        with self._lock:
+            urls = self._services.get(name, [])
+            if url in urls:
+                urls.remove(url)
+                self.version += 1
@@ -0,0 +1,277 @@
+"""
+Response Compression
+WSGI middleware that negotiates gzip, deflate and, when the optional
+``brotli`` / ``zstandard`` packages are installed, br and zstd from
+``Accept-Encoding``.
+
+- Bodies below ``min_size`` bytes (health checks and friends) are sent as is.
+- Buffered bodies are compressed in one go. Bodies the app marks as static
+  (``environ[STATIC_BODY] = (source, body)``, as ``static_responses`` does)
+  keep their compressed form in a small LRU keyed by the source, so they are
+  compressed only once per encoding; dynamic bodies are never cached.
+- Responses without a Content-Length are streamed and compressed chunk by
+  chunk, flushing after each chunk so clients still see data as it arrives.
+"""
+
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# Preferred first when the client gives several encodings the same q-value
+PREFERENCE = ("zstd", "br", "gzip", "deflate")
+
+# environ key for ``(source, body)``: ``body`` is a response body that
+# ``source`` (a long-lived object) serves unchanged to many requests
+STATIC_BODY = "compression.static_body"
+
+
+class _ZlibStream:
+    def __init__(self, wbits, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+    def feed(self, chunk):
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def feed(self, chunk):
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZstdStream:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def feed(self, chunk):
+        return (self._compressor.compress(chunk)
+                + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK))
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+def _zlib_once(data, wbits, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _codecs(level):
+    """Map each available encoding to (one-shot compress, stream factory)."""
+    codecs = {
+        # wbits 31 writes a gzip container, 15 the zlib format HTTP calls deflate
+        "gzip": (lambda data: _zlib_once(data, 31, level), lambda: _ZlibStream(31, level)),
+        "deflate": (lambda data: _zlib_once(data, 15, level), lambda: _ZlibStream(15, level)),
+    }
+    if brotli is not None:
+        # Brotli's 0-11 scale is far slower than zlib's at the top end
+        br_level = min(level, 5)
+        codecs["br"] = (lambda data: brotli.compress(data, quality=br_level),
+                        lambda: _BrotliStream(br_level))
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=level)
+        codecs["zstd"] = (compressor.compress, lambda: _ZstdStream(level))
+    return codecs
+
+
+def parse_accept_encoding(header, available):
+    """Pick the best encoding from an Accept-Encoding header, or None."""
+    weights = {}
+    wildcard = None
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name == "*":
+            wildcard = q
+        elif name:
+            weights[name] = q
+    best, best_q = None, 0.0
+    for name in PREFERENCE:
+        if name not in available:
+            continue
+        q = weights.get(name, wildcard if wildcard is not None else 0.0)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressionMiddleware:
+    """Compress eligible responses of the wrapped WSGI app."""
+
+    def __init__(self, app, min_size=512, level=6, cache_entries=256,
+                 max_cached_body=256 * 1024, max_buffered=4 * 1024 * 1024):
+        self.app = app
+        self.min_size = min_size
+        self.max_cached_body = max_cached_body
+        self.max_buffered = max_buffered
+        self.cache_entries = cache_entries
+        self._codecs = _codecs(level)
+        self._negotiated = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _choose(self, header):
+        encoding = self._negotiated.get(header, False)
+        if encoding is False:
+            encoding = parse_accept_encoding(header, self._codecs)
+            # Clients send a handful of distinct headers; keep the table small
+            if len(self._negotiated) < 1024:
+                self._negotiated[header] = encoding
+        return encoding
+
+    def _compress(self, encoding, body, static):
+        if static is None or len(body) > self.max_cached_body or static[1] != body:
+            return self._codecs[encoding][0](body)
+        source, static_body = static
+        # One entry per source: a source that re-renders (PerSecondJSON)
+        # replaces its entry instead of filling the cache with old bodies
+        key = (encoding, source)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] is static_body:
+                self._cache.move_to_end(key)
+                return entry[1]
+        compressed = self._codecs[encoding][0](body)
+        with self._lock:
+            self._cache[key] = (static_body, compressed)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return compressed
+
+    def __call__(self, environ, start_response):
+        accept = environ.get("HTTP_ACCEPT_ENCODING")
+        encoding = self._choose(accept) if accept and environ["REQUEST_METHOD"] != "HEAD" else None
+        if encoding is None:
+            return self.app(environ, start_response)
+
+        state = {}
+
+        def capture(status, headers, exc_info=None):
+            mode = self._plan(status, headers)
+            state["mode"] = mode
+            if mode == "pass":
+                return start_response(status, headers, exc_info)
+            if mode == "stream":
+                return start_response(status, self._rewrite(headers, encoding, None), exc_info)
+            state["status"], state["headers"], state["exc_info"] = status, headers, exc_info
+            return state.setdefault("pending", []).append
+
+        # Flask (like most frameworks) calls start_response before returning
+        result = self.app(environ, capture)
+        mode = state.get("mode", "pass")
+        if mode == "pass":
+            return result
+        if mode == "stream":
+            return self._stream(result, encoding)
+
+        try:
+            body = b"".join(state.get("pending", [])) + b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        headers = state["headers"]
+        if len(body) < self.min_size:
+            headers = [(k, v) for k, v in headers if k.lower() != "content-length"]
+            headers.append(("Content-Length", str(len(body))))
+            start_response(state["status"], headers, state["exc_info"])
+            return [body]
+        compressed = self._compress(encoding, body, environ.get(STATIC_BODY))
+        start_response(state["status"], self._rewrite(headers, encoding, len(compressed)),
+                       state["exc_info"])
+        return [compressed]
+
+    def _plan(self, status, headers):
+        """Decide between pass-through, buffered and streamed compression."""
+        code = status[:3]
+        if not code.startswith("2") or code in ("204", "206"):
+            return "pass"
+        length = None
+        content_type = ""
+        for name, value in headers:
+            lowered = name.lower()
+            if lowered == "content-encoding":
+                return "pass"
+            if lowered == "cache-control" and "no-transform" in value:
+                return "pass"
+            if lowered == "content-type":
+                content_type = value.lower()
+            elif lowered == "content-length":
+                length = int(value)
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return "pass"
+        if length is None:
+            return "stream"
+        if length < self.min_size:
+            return "pass"
+        return "buffer" if length <= self.max_buffered else "stream"
+
+    @staticmethod
+    def _rewrite(headers, encoding, length):
+        rewritten = []
+        vary = None
+        for name, value in headers:
+            lowered = name.lower()
+            if lowered == "content-length":
+                continue
+            if lowered == "vary":
+                vary = value
+                continue
+            if lowered == "etag" and not value.startswith("W/"):
+                # The compressed bytes differ from the identity representation
+                value = "W/" + value
+            rewritten.append((name, value))
+        rewritten.append(("Content-Encoding", encoding))
+        rewritten.append(("Vary", f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"))
+        if length is not None:
+            rewritten.append(("Content-Length", str(length)))
+        return rewritten
+
+    def _stream(self, result, encoding):
+        stream = self._codecs[encoding][1]()
+        try:
+            for chunk in result:
+                if chunk:
+                    compressed = stream.feed(chunk)
+                    if compressed:
+                        yield compressed
+            tail = stream.finish()
+            if tail:
+                yield tail
+        finally:
+            if hasattr(result, "close"):
+                result.close()
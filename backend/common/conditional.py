@@ -0,0 +1,81 @@
+"""
+Conditional GET
+ETag / Last-Modified validators computed once per payload version, and a
+route decorator that answers ``If-None-Match`` / ``If-Modified-Since`` with
+304 Not Modified before the view runs or anything is serialized.
+"""
+
+import hashlib
+import json
+import threading
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, make_response, request
+from werkzeug.http import http_date, quote_etag
+
+
+class VersionedPayload:
+    """Holds a payload together with validators for its current version."""
+
+    def __init__(self, data):
+        self._lock = threading.Lock()
+        self.version = 0
+        self.update(data)
+
+    def update(self, data):
+        """Replace the payload; the ETag and Last-Modified move with it."""
+        canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+        digest = hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            self.data = data
+            self.version += 1
+            self.tag = f"{self.version}-{digest}"
+            # Weak: responses embed a per-request timestamp around the payload
+            self.etag = quote_etag(self.tag, weak=True)
+            # HTTP dates have one-second resolution
+            self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+            self.last_modified_header = http_date(self.last_modified)
+
+    def apply(self, response):
+        """Set this version's validators on ``response``."""
+        headers = response.headers
+        headers["ETag"] = self.etag
+        headers["Last-Modified"] = self.last_modified_header
+        return response
+
+    def is_not_modified(self):
+        """True when the current request already holds this version."""
+        environ = request.environ
+        # Most requests carry no validators; skip header parsing for them
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+        if if_none_match is not None:
+            # If-None-Match takes precedence over If-Modified-Since (RFC 9110);
+            # polling clients echo the ETag verbatim, so try that first
+            if if_none_match == self.etag:
+                return True
+            return request.if_none_match.contains_weak(self.tag)
+        if "HTTP_IF_MODIFIED_SINCE" in environ:
+            since = request.if_modified_since
+            return since is not None and self.last_modified <= since
+        return False
+
+
+def conditional(payload):
+    """Short-circuit GET/HEAD with 304 when the client's copy is current."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+            if payload.is_not_modified():
+                return payload.apply(Response(status=304))
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                payload.apply(response)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,550 @@
+"""
+Service-to-Service HTTP Client
+Pooled keep-alive HTTP/1.1 connections per upstream, with per-upstream
+timeouts and optional request hedging, on top of ``http.client``.
+
+- An upstream may run as several instances; ``common.balancer`` picks one
+  per request by load and keeps unhealthy ones out (see there)
+- Each instance has a LIFO pool of open connections, so the most recently
+  used (warmest) one is reused and surplus ones age out; a TCP connect
+  (plus slow start) only happens when every pooled connection is busy
+- A connection the server has closed while idle is detected on reuse; for
+  idempotent methods the idle pool is dropped and the request retried once
+  on a fresh connection
+- ``connect_timeout`` bounds the TCP connect, ``timeout`` each read
+- Hedging: when an idempotent request has not answered after the
+  upstream's recent p95 latency, a duplicate is sent on another connection
+  (usually to another instance) and whichever answers first wins; the
+  loser's connection is shut down. The first attempt runs on the caller's
+  thread and only hedges use the client's thread pool, so a busy pool
+  delays hedges rather than every request. Hedges are limited to
+  ``hedge_budget`` (5%) of an upstream's requests, so hedging cannot double
+  the load on an upstream that is already slow
+"""
+
+import heapq
+import http.client
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from common.balancer import Balancer, Instance
+
+IDEMPOTENT = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+# Failures that mean a reused keep-alive connection was already dead
+STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                http.client.CannotSendRequest)
+# Unused hedge budget an upstream can save up, in hedges
+HEDGE_BURST = 10
+
+
+class UpstreamError(Exception):
+    """An upstream could not be reached or did not answer in time."""
+
+    def __init__(self, upstream, message):
+        super().__init__(f"{upstream}: {message}")
+        self.upstream = upstream
+
+
+class UpstreamTimeout(UpstreamError):
+    pass
+
+
+class _Lost(UpstreamError):
+    """This copy of a hedged request was cut short: the other one answered."""
+
+
+class UpstreamResponse:
+    __slots__ = ("status", "headers", "body", "elapsed", "hedged")
+
+    def __init__(self, status, headers, body, elapsed, hedged=False):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.elapsed = elapsed
+        self.hedged = hedged
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class LatencyTracker:
+    """Recent latencies of one upstream; the p95 is recomputed every ``every`` samples."""
+
+    def __init__(self, window=512, every=32, min_samples=20):
+        self._samples = deque(maxlen=window)
+        self.every = every
+        self.min_samples = min_samples
+        self._since = 0
+        self._p95 = None
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+        self._since += 1
+        if self._since >= self.every:
+            self._since = 0
+            self._p95 = None
+
+    def p95(self):
+        """None until there are enough samples to trust."""
+        if self._p95 is None and len(self._samples) >= self.min_samples:
+            ordered = sorted(self._samples)
+            self._p95 = ordered[int(len(ordered) * 0.95)]
+        return self._p95
+
+
+class ConnectionPool:
+    """Keep-alive connections to one host; at most ``max_idle`` are kept open."""
+
+    def __init__(self, host, port, max_idle=16, connect_timeout=0.5, timeout=2.0,
+                 https=False):
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.https = https
+        self._idle = []
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def acquire(self, timeout=None):
+        """(connection, reused); ``timeout`` caps the connect timeout."""
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop(), True
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        connect_timeout = self.connect_timeout if timeout is None else min(timeout, self.connect_timeout)
+        connection = cls(self.host, self.port, timeout=connect_timeout)
+        connection.connect()
+        with self._lock:
+            self.opened += 1
+        # Small requests and responses must not wait for Nagle's algorithm
+        connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection.sock.settimeout(self.timeout)
+        return connection, False
+
+    def release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+
+class Upstream:
+    """One named upstream service: its instances, timeouts, hedging and stats.
+
+    ``base_url`` is one URL or a list of instance URLs; the remaining
+    ``Balancer`` options apply when there are several.
+    """
+
+    def __init__(self, name, base_url, max_idle=16, connect_timeout=0.5, timeout=2.0,
+                 hedge=False, min_hedge_delay=0.002, hedge_budget=0.05, policy="p2c",
+                 eject_after=3, eject_time=5.0, slow_start=10.0):
+        self.name = name
+        self.max_idle = max_idle
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        urls = [base_url] if isinstance(base_url, str) else list(base_url)
+        self.balancer = Balancer([Instance(url, self._pool(url)) for url in urls], policy,
+                                 eject_after, eject_time, slow_start)
+        self.registry_version = None
+        self.hedge = hedge
+        self.min_hedge_delay = min_hedge_delay
+        # Every hedgeable request earns this fraction of a hedge
+        self.hedge_budget = hedge_budget
+        self.hedge_tokens = HEDGE_BURST
+        self.latency = LatencyTracker()
+        self.requests = 0
+        self.errors = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedges_over_budget = 0
+
+    def _pool(self, url):
+        parts = urlsplit(url)
+        https = parts.scheme == "https"
+        return ConnectionPool(parts.hostname, parts.port or (443 if https else 80),
+                              self.max_idle, self.connect_timeout, self.timeout, https)
+
+    def set_instances(self, urls):
+        self.balancer.set_instances(urls, self._pool)
+
+    def close(self):
+        for instance in self.balancer.instances:
+            instance.pool.close()
+
+    def stats(self):
+        p95 = self.latency.p95()
+        instances = self.balancer.instances
+        stats = {
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections_opened": sum(instance.pool.opened for instance in instances),
+            "connections_reused": sum(instance.pool.reused for instance in instances),
+            "idle": sum(instance.pool.idle for instance in instances),
+            "stale_retries": self.retried,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedges_over_budget": self.hedges_over_budget,
+            "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+        }
+        if len(instances) > 1:
+            stats["policy"] = self.balancer.policy
+            stats["instances"] = self.balancer.stats()
+        return stats
+
+
+class _Race:
+    """The two copies of a hedged request; the first answer wins.
+
+    Each copy registers the connection it is waiting on. The winner shuts
+    the other one down, so the thread blocked reading it gives up at once.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.response = None
+        self.failed = False
+        self.hedge = None
+        self._connections = set()
+
+    def enter(self, connection):
+        with self.lock:
+            if self.response is not None:
+                return False
+            self._connections.add(connection)
+            return True
+
+    def leave(self, connection):
+        with self.lock:
+            self._connections.discard(connection)
+
+    def win(self, response):
+        with self.lock:
+            if self.response is not None:
+                return False
+            self.response = response
+            losers, self._connections = self._connections, set()
+        for connection in losers:
+            try:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except (OSError, AttributeError):
+                pass
+        return True
+
+
+class _Timers:
+    """One thread that runs callbacks after a delay (hedge launches)."""
+
+    def __init__(self):
+        self._heap = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def call_later(self, delay, callback):
+        """Run ``callback`` in ``delay`` seconds; returns a handle for ``cancel``."""
+        entry = [time.monotonic() + delay, next(self._order), callback]
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="hedge-timer", daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._cond.notify()
+        return entry
+
+    @staticmethod
+    def cancel(entry):
+        # Left in the heap and skipped when due
+        entry[2] = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                while not self._heap or self._heap[0][0] > now:
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                    now = time.monotonic()
+                callback = heapq.heappop(self._heap)[2]
+            if callback is not None:
+                callback()
+
+
+class ServiceClient:
+    """Calls named upstreams over pooled keep-alive connections.
+
+    ``upstreams`` maps names to base URLs, lists of instance URLs or dicts
+    of ``Upstream`` keyword arguments (``{"url": ..., "timeout": 0.5}``).
+    With a ``registry`` (``common.balancer.ServiceRegistry``), names it
+    knows are resolved there and their instances follow its changes.
+    """
+
+    def __init__(self, upstreams=None, hedge_workers=16, registry=None, **defaults):
+        self.defaults = defaults
+        self.registry = registry
+        self.upstreams = {}
+        self._executor = None
+        self._timers = None
+        self._executor_lock = threading.Lock()
+        self._fork_hooks = False
+        self.hedge_workers = hedge_workers
+        for name, config in (upstreams or {}).items():
+            self.add(name, config)
+
+    @classmethod
+    def from_env(cls, variable="UPSTREAMS", **defaults):
+        """Build from ``users=http://127.0.0.1:5001,orders=http://...`` in ``variable``.
+
+        A name given more than once gets one instance per URL.
+        """
+        upstreams = {}
+        spec = os.environ.get(variable, "")
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            name, _, url = item.partition("=")
+            upstreams.setdefault(name.strip(), []).append(url.strip())
+        return cls(upstreams, **defaults)
+
+    def add(self, name, config):
+        if not isinstance(config, dict):
+            config = {"url": config}
+        options = dict(self.defaults, **config)
+        self.upstreams[name] = Upstream(name, options.pop("url"), **options)
+        return self.upstreams[name]
+
+    def names(self):
+        """Every upstream name, configured or known to the registry."""
+        names = set(self.upstreams)
+        if self.registry is not None:
+            self.registry.current()
+            names.update(self.registry.names())
+        return sorted(names)
+
+    def close(self):
+        for upstream in self.upstreams.values():
+            upstream.close()
+
+    def stats(self):
+        return {name: upstream.stats() for name, upstream in self.upstreams.items()}
+
+    # Requests ----------------------------------------------------------------
+
+    def get(self, name, path, **kwargs):
+        return self.request(name, "GET", path, **kwargs)
+
+    def post(self, name, path, json_body=None, **kwargs):
+        return self.request(name, "POST", path, json_body=json_body, **kwargs)
+
+    def request(self, name, method, path, body=None, json_body=None, headers=None,
+                hedge=None, timeout=None):
+        """Send one request to upstream ``name``; raises UpstreamError on failure.
+
+        ``hedge`` overrides the upstream's setting for this call. Only
+        idempotent methods are ever hedged. ``timeout`` lowers the
+        upstream's connect and read timeouts for this call.
+        """
+        upstream = self.upstreams.get(name)
+        if self.registry is not None:
+            upstream = self._discover(name, upstream)
+        if upstream is None:
+            raise UpstreamError(name, "unknown upstream")
+        headers = dict(headers or {})
+        if json_body is not None:
+            body = json.dumps(json_body, separators=(",", ":")).encode()
+            headers["Content-Type"] = "application/json"
+        upstream.requests += 1
+
+        delay = None
+        if (upstream.hedge if hedge is None else hedge) and method in IDEMPOTENT:
+            upstream.hedge_tokens = min(upstream.hedge_tokens + upstream.hedge_budget, HEDGE_BURST)
+            p95 = upstream.latency.p95()
+            if p95 is not None:
+                delay = max(p95, upstream.min_hedge_delay)
+        try:
+            if delay is None:
+                response = self._send(upstream, method, path, body, headers, timeout=timeout)
+            else:
+                response = self._hedged(upstream, delay, method, path, body, headers, timeout)
+        except UpstreamError:
+            upstream.errors += 1
+            raise
+        upstream.latency.add(response.elapsed)
+        return response
+
+    def _discover(self, name, upstream):
+        """``upstream`` with its instances brought in line with the registry."""
+        version = self.registry.current()
+        if upstream is not None and upstream.registry_version == version:
+            return upstream
+        urls = self.registry.lookup(name)
+        if not urls:
+            return upstream
+        if upstream is None:
+            upstream = self.add(name, urls)
+        else:
+            upstream.set_instances(urls)
+        upstream.registry_version = version
+        return upstream
+
+    def _send(self, upstream, method, path, body, headers, race=None, timeout=None):
+        balancer = upstream.balancer
+        instance = balancer.pick()
+        ok = False
+        try:
+            response = self._send_to(upstream, instance, method, path, body, headers, race,
+                                     timeout)
+            ok = response.status < 500
+            return response
+        except _Lost:
+            # Cut short by the other copy's answer, not by the instance
+            ok = True
+            raise
+        finally:
+            balancer.release(instance, ok)
+
+    def _send_to(self, upstream, instance, method, path, body, headers, race=None, timeout=None):
+        pool = instance.pool
+        target = instance.base_path + path
+        if "Host" not in headers:
+            headers = dict(headers, Host=instance.host_header)
+        if timeout is not None and timeout >= pool.timeout:
+            timeout = None
+        start = time.perf_counter()
+        for attempt in (1, 2):
+            try:
+                connection, reused = pool.acquire(timeout)
+            except socket.timeout:
+                raise UpstreamTimeout(upstream.name, "connect timed out") from None
+            except OSError as exc:
+                raise UpstreamError(upstream.name, f"connect failed: {exc}") from None
+            if race is not None and not race.enter(connection):
+                pool.release(connection)
+                raise _Lost(upstream.name, "answered by the other copy")
+            try:
+                if timeout is not None:
+                    connection.sock.settimeout(timeout)
+                connection.request(method, target, body=body, headers=headers)
+                raw = connection.getresponse()
+                payload = raw.read()
+            except (OSError, http.client.HTTPException) as exc:
+                if race is None or race.response is None:
+                    self._failed(upstream, pool, connection, reused, attempt, method, exc,
+                                 timeout or pool.timeout)
+                    continue
+                connection.close()
+                raise _Lost(upstream.name, "answered by the other copy") from None
+            finally:
+                if race is not None:
+                    race.leave(connection)
+            if raw.will_close:
+                connection.close()
+            else:
+                if timeout is not None:
+                    connection.sock.settimeout(pool.timeout)
+                pool.release(connection)
+            return UpstreamResponse(raw.status, raw.getheaders(), payload,
+                                    time.perf_counter() - start)
+
+    @staticmethod
+    def _failed(upstream, pool, connection, reused, attempt, method, exc, timeout):
+        """Raise the UpstreamError for ``exc``, or return to retry once."""
+        connection.close()
+        if isinstance(exc, socket.timeout):
+            raise UpstreamTimeout(upstream.name, f"no response within {timeout:.3g}s") from None
+        if isinstance(exc, STALE_ERRORS):
+            # The server closed a pooled connection while it sat idle.
+            # Its idle siblings most likely went the same way (server
+            # restart or keep-alive timeout), so they are dropped too
+            if reused and attempt == 1 and method in IDEMPOTENT:
+                upstream.retried += 1
+                pool.close()
+                return
+            raise UpstreamError(upstream.name, f"connection lost: {exc!r}") from None
+        raise UpstreamError(upstream.name, f"request failed: {exc!r}") from None
+
+    def _pool_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._timers = _Timers()
+                    self._executor = ThreadPoolExecutor(self.hedge_workers,
+                                                        thread_name_prefix="hedge")
+                    if not self._fork_hooks:
+                        self._fork_hooks = True
+                        os.register_at_fork(after_in_child=self._after_fork_in_child)
+        return self._executor
+
+    def _after_fork_in_child(self):
+        # The pool's and the timer's threads stayed in the parent
+        self._executor = self._timers = None
+        self._executor_lock = threading.Lock()
+
+    def _hedged(self, upstream, delay, method, path, body, headers, timeout=None):
+        executor = self._pool_executor()
+        start = time.perf_counter()
+        race = _Race()
+
+        def launch():
+            with race.lock:
+                if race.response is not None or race.failed:
+                    return
+                if upstream.hedge_tokens < 1:
+                    upstream.hedges_over_budget += 1
+                    return
+                upstream.hedge_tokens -= 1
+                upstream.hedged += 1
+                race.hedge = executor.submit(hedge)
+
+        def hedge():
+            response = self._send(upstream, method, path, body, headers, race, timeout)
+            race.win(response)
+            return response
+
+        timer = self._timers.call_later(delay, launch)
+        try:
+            response = self._send(upstream, method, path, body, headers, race, timeout)
+        except _Lost:
+            response = None
+        except UpstreamError as error:
+            self._timers.cancel(timer)
+            with race.lock:
+                race.failed = True
+                pending = race.hedge
+            if pending is None:
+                raise
+            # The hedge may still succeed
+            try:
+                pending.result()
+            except UpstreamError:
+                raise error from None
+        else:
+            self._timers.cancel(timer)
+            if race.win(response):
+                return response
+        # The hedge answered first
+        upstream.hedge_wins += 1
+        response = race.response
+        response.elapsed = time.perf_counter() - start
+        response.hedged = True
+        return response
@@ -0,0 +1,250 @@
+"""
+Streaming Ingest
+Bulk uploads to ``POST /api/data`` parsed incrementally from
+``request.stream`` instead of buffering the whole body with ``get_json()``.
+
+Accepted bodies:
+
+- ``application/x-ndjson``: one JSON record per line
+- ``application/json`` with ``?stream=true``: a top-level JSON array
+- ``text/csv``: a header row, then one record per row (values stay strings)
+
+Records are handed to a handler in fixed-size batches, so memory use depends
+on the batch size and the largest record, never on the size of the upload.
+Limits come from the Flask config: ``INGEST_MAX_BYTES``,
+``INGEST_MAX_RECORD_BYTES`` and ``INGEST_BATCH_SIZE``.
+"""
+
+import codecs
+import csv
+import json
+import time
+
+from flask import current_app, request
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+CSV_TYPES = ("text/csv", "application/csv")
+READ_SIZE = 64 * 1024
+NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_MAX_RECORD_BYTES = 1024 * 1024
+DEFAULT_BATCH_SIZE = 1000
+
+
+def wants_streaming_ingest():
+    """True when the current POST should go through the streaming parser."""
+    if request.mimetype in NDJSON_TYPES or request.mimetype in CSV_TYPES:
+        return True
+    return request.mimetype == "application/json" and \
+        request.args.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def read_chunks(stream, max_bytes, size=READ_SIZE):
+    """Yield raw chunks from ``stream``, failing with 413 past ``max_bytes``."""
+    total = 0
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return
+        total += len(chunk)
+        if total > max_bytes:
+            raise RequestEntityTooLarge(f"Upload exceeds {max_bytes} bytes")
+        yield chunk
+
+
+def iter_ndjson(chunks, loads, max_record_bytes):
+    """Parse newline-delimited JSON records from an iterable of byte chunks."""
+    pending = b""
+    line_number = 0
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        if len(pending) > max_record_bytes:
+            raise RequestEntityTooLarge(f"Record on line {line_number + len(lines) + 1} "
+                                        f"exceeds {max_record_bytes} bytes")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield _parse(loads, line, line_number)
+    if pending.strip():
+        yield _parse(loads, pending, line_number + 1)
+
+
+def _parse(loads, line, line_number):
+    try:
+        return loads(line)
+    except ValueError as exc:
+        raise BadRequest(f"Invalid JSON on line {line_number}: {exc}")
+
+
+def iter_json_array(chunks, max_record_bytes):
+    """Parse the elements of a top-level JSON array from byte chunks."""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    started = finished = False
+    expect_value = True
+    chunks = iter(chunks)
+    eof = False
+    index = 0
+
+    while True:
+        # Skip whitespace and structural characters we can decide on
+        while position < len(buffer):
+            char = buffer[position]
+            if char in " \t\r\n":
+                position += 1
+            elif not started:
+                if char != "[":
+                    raise BadRequest("Streaming JSON body must be an array")
+                started = True
+                position += 1
+            elif finished:
+                raise BadRequest("Unexpected data after the JSON array")
+            elif char == "]" and (expect_value is False or index == 0):
+                finished = True
+                position += 1
+            elif char == "," and not expect_value:
+                expect_value = True
+                position += 1
+            elif expect_value:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    if eof:
+                        raise BadRequest(f"Invalid JSON in array element {index}")
+                    break
+                if not eof and (end == len(buffer) or (
+                        isinstance(value, (int, float)) and buffer[end] in NUMBER_CHARS)):
+                    # A number cut by a chunk boundary ("3." of "3.25") parses
+                    # as a shorter one; wait until a delimiter follows it
+                    break
+                yield value
+                index += 1
+                position = end
+                expect_value = False
+            else:
+                raise BadRequest(f"Expected ',' or ']' after array element {index - 1}")
+
+        if eof:
+            break
+        # Drop consumed text so the buffer only ever holds one partial record
+        buffer = buffer[position:]
+        position = 0
+        if len(buffer) > max_record_bytes:
+            raise RequestEntityTooLarge(f"Array element {index} exceeds {max_record_bytes} bytes")
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buffer += text_decoder.decode(b"", final=True)
+        else:
+            buffer += text_decoder.decode(chunk)
+
+    if not started or not finished:
+        raise BadRequest("Truncated JSON array")
+
+
+def iter_text_lines(chunks, max_record_bytes):
+    """Decode UTF-8 byte chunks into lines, each keeping its newline."""
+    # utf-8-sig drops the byte order mark spreadsheet exports like to add
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        if len(pending) > max_record_bytes:
+            raise RequestEntityTooLarge(f"Line exceeds {max_record_bytes} bytes")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_csv(chunks, max_record_bytes):
+    """Parse CSV rows into dicts keyed by the header row."""
+    reader = csv.reader(iter_text_lines(chunks, max_record_bytes))
+    try:
+        header = next(reader, None)
+        if not header:
+            raise BadRequest("CSV upload needs a header row")
+        width = len(header)
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != width:
+                raise BadRequest(f"CSV line {reader.line_num}: expected {width} fields, "
+                                 f"got {len(row)}")
+            yield dict(zip(header, row))
+    except csv.Error as exc:
+        raise BadRequest(f"Invalid CSV on line {reader.line_num}: {exc}")
+
+
+def iter_batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_request(handler=None, batch_size=None, max_bytes=None):
+    """Stream the current request body through ``handler`` batch by batch.
+
+    ``handler(batch)`` receives a list of at most ``batch_size`` records;
+    the default only counts them. Returns a summary of the upload.
+    """
+    config = current_app.config
+    max_bytes = max_bytes or config.get("INGEST_MAX_BYTES", DEFAULT_MAX_BYTES)
+    batch_size = batch_size or config.get("INGEST_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    max_record_bytes = config.get("INGEST_MAX_RECORD_BYTES", DEFAULT_MAX_RECORD_BYTES)
+
+    if request.content_length is not None and request.content_length > max_bytes:
+        raise RequestEntityTooLarge(f"Upload exceeds {max_bytes} bytes")
+
+    received = 0
+
+    def counted(chunks):
+        nonlocal received
+        for chunk in chunks:
+            received += len(chunk)
+            yield chunk
+
+    chunks = counted(read_chunks(request.stream, max_bytes))
+    if request.mimetype in NDJSON_TYPES:
+        records = iter_ndjson(chunks, current_app.json.loads, max_record_bytes)
+        body_format = "ndjson"
+    elif request.mimetype in CSV_TYPES:
+        records = iter_csv(chunks, max_record_bytes)
+        body_format = "csv"
+    else:
+        records = iter_json_array(chunks, max_record_bytes)
+        body_format = "json-array"
+
+    started = time.perf_counter()
+    count = batches = 0
+    for batch in iter_batches(records, batch_size):
+        if handler is not None:
+            handler(batch)
+        count += len(batch)
+        batches += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        "message": "Data ingested successfully",
+        "format": body_format,
+        "records": count,
+        "batches": batches,
+        "batch_size": batch_size,
+        "bytes": received,
+        "seconds": round(elapsed, 3),
+        "records_per_second": round(count / elapsed) if elapsed > 0 else count,
+    }
@@ -0,0 +1,67 @@
+"""
+Fast JSON Provider
+A Flask JSON provider that serializes with orjson when it is installed and
+falls back to the stdlib ``json`` module otherwise, so ``jsonify`` and
+``request.get_json`` get faster without any change to the views.
+"""
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """orjson-backed provider with the same output rules as Flask's default."""
+
+    def _orjson_options(self, indent=False):
+        # Keep Flask's sorted keys, and route datetimes through ``default`` so
+        # they are rendered as HTTP dates exactly like the stdlib provider
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj, indent=False):
+        """Serialize straight to UTF-8 bytes, skipping the str round trip."""
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=self.default,
+                                    option=self._orjson_options(indent))
+            except TypeError:
+                # orjson refuses e.g. integers wider than 64 bits
+                pass
+        if indent:
+            return self.dumps(obj, indent=2).encode("utf-8")
+        return self.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.dumps(obj, default=self.default,
+                                    option=self._orjson_options()).decode("utf-8")
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(
+            self.dumps_bytes(obj, indent=indent) + b"\n", mimetype=self.mimetype
+        )
+
+
+def install_json_provider(app):
+    """Switch ``app`` to FastJSONProvider and return the provider."""
+    app.json = FastJSONProvider(app)
+    return app.json
@@ -0,0 +1,54 @@
+"""
+App Loader
+Imports any ``backend/<topic>/app.py`` by path so benchmarks and launchers
+can work with every topic server without it being a package.
+"""
+
+import importlib.util
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def topic_dirs():
+    """All topic directories that contain an app.py, in topic order."""
+    return sorted(
+        os.path.join(BACKEND_DIR, name)
+        for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, "app.py"))
+    )
+
+
+def resolve_app_path(target):
+    """Accept a topic name ("09"), a topic directory or a path to app.py."""
+    if os.path.isfile(target):
+        return os.path.abspath(target)
+    if os.path.isdir(target):
+        return os.path.join(os.path.abspath(target), "app.py")
+    for directory in topic_dirs():
+        if os.path.basename(directory).startswith(target):
+            return os.path.join(directory, "app.py")
+    raise FileNotFoundError(f"No backend app matches {target!r}")
+
+
+def load_module(target):
+    """Import a topic app.py as a uniquely named module and return it."""
+    path = resolve_app_path(target)
+    directory = os.path.dirname(path)
+    name = f"topic_{os.path.basename(directory)}"
+    if name in sys.modules:
+        return sys.modules[name]
+    # Topic apps import their sibling modules (cache.py, ...) by plain name
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_app(target):
+    """Return the Flask ``app`` object defined by a topic app.py."""
+    return load_module(target).app
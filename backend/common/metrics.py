@@ -0,0 +1,223 @@
+"""
+Request Metrics
+WSGI middleware that records request latency per route, method and status
+into fixed-bucket, HDR-style histograms and renders them in the Prometheus
+text format.
+
+Buckets are log-linear: 8 sub-buckets per power of two of microseconds, so
+every recorded value is within 12.5% of its bucket's bounds, from 1 us to
+days, in under 300 counters per series.
+
+Each thread records into its own shard without taking a lock; shards are
+merged when metrics are read. Shards of threads that have exited are folded
+into a retired total whenever a new thread registers its shard, so
+thread-per-request servers keep at most one shard per live thread.
+"""
+
+import threading
+import time
+
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# 2**40 us is about 12 days; anything slower lands in the last bucket
+BUCKET_COUNT = ((40 - SUB_BUCKET_BITS) << SUB_BUCKET_BITS) + 2 * SUB_BUCKETS
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+UNMATCHED = "<unmatched>"
+
+
+def bucket_index(micros):
+    """Histogram bucket of a latency in whole microseconds."""
+    shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+    if shift <= 0:
+        return micros
+    index = (shift << SUB_BUCKET_BITS) + (micros >> shift)
+    return index if index < BUCKET_COUNT else BUCKET_COUNT - 1
+
+
+def bucket_upper(index):
+    """Exclusive upper bound of a bucket, in microseconds."""
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    if shift <= 0:
+        return index + 1
+    return ((index - (shift << SUB_BUCKET_BITS)) + 1) << shift
+
+
+def flask_route(environ):
+    """The matched Flask URL rule ("/api/items/<int:item_id>"), not the raw path.
+
+    Only valid while the request context is active, i.e. when the Flask app
+    calls start_response; hence the middleware has to wrap Flask directly.
+    """
+    request = environ.get("werkzeug.request")
+    rule = request.url_rule if request is not None else None
+    return rule.rule if rule is not None else UNMATCHED
+
+
+class _Series:
+    __slots__ = ("buckets", "count", "total", "request_bytes")
+
+    def __init__(self):
+        self.buckets = [0] * BUCKET_COUNT
+        self.count = 0
+        # Whole microseconds, matching what goes into the buckets
+        self.total = 0
+        self.request_bytes = 0
+
+    def merge(self, other):
+        buckets = self.buckets
+        for index, value in enumerate(other.buckets):
+            if value:
+                buckets[index] += value
+        self.count += other.count
+        self.total += other.total
+        self.request_bytes += other.request_bytes
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, value in enumerate(self.buckets):
+            seen += value
+            if seen >= rank and value:
+                return bucket_upper(index) / 1e6
+        return bucket_upper(BUCKET_COUNT - 1) / 1e6
+
+
+class _Shard:
+    __slots__ = ("series", "started", "finished")
+
+    def __init__(self):
+        self.series = {}
+        self.started = 0
+        self.finished = 0
+
+
+class MetricsMiddleware:
+    """Time every request of the wrapped WSGI app.
+
+    Latency runs from the call until the app has returned its body iterable,
+    which for ordinary (non-streamed) Flask responses is the full handler
+    time. ``route`` maps an environ to the label to group by.
+    """
+
+    def __init__(self, app, route=flask_route, clock=time.perf_counter):
+        self.app = app
+        self.route = route
+        self.clock = clock
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._retired_counts = [0, 0]
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = _Shard()
+        self._local.shard = shard
+        with self._lock:
+            # New threads are where shards come from, so retiring the dead
+            # ones here bounds them by the threads alive, scraped or not
+            self._sweep()
+            self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def __call__(self, environ, start_response):
+        clock = self.clock
+        start = clock()
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        shard.started += 1
+        route = self.route
+        seen = []
+
+        def capture(status, headers, exc_info=None):
+            seen.append((route(environ), environ["REQUEST_METHOD"], status[:3]))
+            return start_response(status, headers, exc_info)
+
+        try:
+            return self.app(environ, capture)
+        finally:
+            micros = int((clock() - start) * 1e6)
+            shard.finished += 1
+            # No response started means the app raised: count it as a 500
+            key = seen[0] if seen else (UNMATCHED, environ["REQUEST_METHOD"], "500")
+            series = shard.series.get(key)
+            if series is None:
+                series = shard.series[key] = _Series()
+            # bucket_index(), inlined on the hot path
+            shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+            index = micros if shift <= 0 else (shift << SUB_BUCKET_BITS) + (micros >> shift)
+            series.buckets[index if index < BUCKET_COUNT else BUCKET_COUNT - 1] += 1
+            series.count += 1
+            series.total += micros
+            length = environ.get("CONTENT_LENGTH")
+            # A malformed header counts as no body; raising here would
+            # replace a response that was already produced
+            if length and length.isdigit():
+                series.request_bytes += int(length)
+
+    # Reading -----------------------------------------------------------------
+
+    def snapshot(self):
+        """Merge every shard; returns ({key: _Series}, in_flight)."""
+        merged = {}
+        with self._lock:
+            self._sweep()
+            for key, series in self._retired.items():
+                merged.setdefault(key, _Series()).merge(series)
+            started, finished = self._retired_counts
+            for _, shard in self._shards:
+                for key, series in list(shard.series.items()):
+                    merged.setdefault(key, _Series()).merge(series)
+                started += shard.started
+                finished += shard.finished
+        return merged, started - finished
+
+    def _sweep(self):
+        """Fold the shards of exited threads into the retired totals (lock held)."""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                # A finished thread never writes again, so fold it in for good
+                self._retire(shard)
+        self._shards = live
+
+    def _retire(self, shard):
+        for key, series in shard.series.items():
+            self._retired.setdefault(key, _Series()).merge(series)
+        self._retired_counts[0] += shard.started
+        self._retired_counts[1] += shard.finished
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        merged, in_flight = self.snapshot()
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route, method and status.",
+            "# TYPE http_request_duration_seconds summary",
+        ]
+        sizes = []
+        for (route, method, status), series in sorted(merged.items()):
+            labels = f'route="{_escape(route)}",method="{method}",status="{status}"'
+            for q in QUANTILES:
+                lines.append(f'http_request_duration_seconds{{{labels},quantile="{q}"}} '
+                             f"{series.quantile(q):.6f}")
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {series.total / 1e6:.6f}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {series.count}")
+            sizes.append(f"http_request_size_bytes_total{{{labels}}} {series.request_bytes}")
+        lines += [
+            "# HELP http_request_size_bytes_total Request body bytes received.",
+            "# TYPE http_request_size_bytes_total counter",
+            *sizes,
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {in_flight}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
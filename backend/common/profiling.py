@@ -0,0 +1,286 @@
+"""
+Request Profiling
+Opt-in WSGI middleware that profiles a sample of requests and aggregates the
+results per route, so a live server can show where request time goes.
+
+A request is profiled when it carries the secret ``X-Profile-Token`` header
+or wins a ``sample_rate`` draw. Two profilers are available:
+
+- ``"cprofile"``: deterministic cProfile of the handler; aggregated into
+  ``pstats`` data per route (downloadable as a ``.pstats`` file or text)
+- ``"sample"``: a background thread snapshots the stacks of the threads
+  running profiled requests every ``interval`` seconds and counts them as
+  collapsed stacks, the input format of flamegraph.pl and speedscope. It
+  costs far less than cProfile, at the price of statistical results
+
+Only one cProfile-profiled request runs at a time (newer Pythons allow a
+single active profiler per process); other draws are skipped. Requests that
+are not profiled pay for one random draw and a header lookup.
+"""
+
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from common.metrics import UNMATCHED, flask_route
+
+PROFILE_HEADER = "HTTP_X_PROFILE_TOKEN"
+MODES = ("cprofile", "sample")
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _depth(frame):
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+class _Sampled:
+    """A request being stack-sampled: its stacks and the frames to skip."""
+
+    __slots__ = ("stacks", "skip")
+
+    def __init__(self, skip):
+        self.stacks = Counter()
+        self.skip = skip
+
+
+class ProfilingMiddleware:
+    """Profile a fraction of the wrapped app's requests, grouped by route.
+
+    ``sample_rate`` is the fraction of requests profiled at random (0 turns
+    random sampling off) and ``secret``, when set, profiles any request
+    whose ``X-Profile-Token`` header matches it. Both can be changed on a
+    running server with ``configure()``. Paths starting with an ``exempt``
+    prefix are never profiled.
+    """
+
+    def __init__(self, app, sample_rate=0.0, secret=None, mode="cprofile",
+                 interval=0.005, route=flask_route, exempt=()):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+        self.app = app
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self.mode = mode
+        self.interval = interval
+        self.route = route
+        self.exempt = tuple(exempt)
+        self.profiled = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._cprofile_busy = threading.Lock()
+        self._pstats = {}
+        self._collapsed = {}
+        self._requests = Counter()
+        self._active = {}
+        self._sampler = None
+
+    def configure(self, sample_rate=None, mode=None):
+        """Change the sampling rate or profiler without restarting."""
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+            self.mode = mode
+        if sample_rate is not None:
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError("sample_rate must be between 0 and 1")
+            self.sample_rate = sample_rate
+
+    def authorized(self, environ):
+        """Whether the request carries the profiling secret."""
+        token = environ.get(PROFILE_HEADER)
+        return bool(self.secret and token
+                    and hmac.compare_digest(token.encode(), self.secret.encode()))
+
+    def __call__(self, environ, start_response):
+        rate = self.sample_rate
+        if not (rate and random.random() < rate) and not (
+                PROFILE_HEADER in environ and self.authorized(environ)):
+            return self.app(environ, start_response)
+        if self.exempt and environ.get("PATH_INFO", "").startswith(self.exempt):
+            return self.app(environ, start_response)
+        if self.mode == "sample":
+            return self._sample(environ, start_response)
+        return self._cprofile(environ, start_response)
+
+    def _routed(self, environ, start_response, found):
+        """start_response that records the matched route into ``found``."""
+        route = self.route
+
+        def capture(status, headers, exc_info=None):
+            found[0] = route(environ)
+            return start_response(status, headers, exc_info)
+
+        return capture
+
+    # cProfile ----------------------------------------------------------------
+
+    def _cprofile(self, environ, start_response):
+        if not self._cprofile_busy.acquire(blocking=False):
+            self.skipped += 1
+            return self.app(environ, start_response)
+        found = [UNMATCHED]
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                return self.app(environ, self._routed(environ, start_response, found))
+            finally:
+                profile.disable()
+        finally:
+            self._cprofile_busy.release()
+            self._add_profile(found[0], profile)
+
+    def _add_profile(self, route, profile):
+        with self._lock:
+            self.profiled += 1
+            self._requests[route] += 1
+            stats = self._pstats.get(route)
+            if stats is None:
+                self._pstats[route] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+
+    # Stack sampling ----------------------------------------------------------
+
+    def _sample(self, environ, start_response):
+        found = [UNMATCHED]
+        # Frames from the thread's root down to this call are the server's,
+        # not the request's; samples leave them out
+        sampled = _Sampled(_depth(sys._getframe()))
+        ident = threading.get_ident()
+        with self._lock:
+            self._active[ident] = sampled
+            self._ensure_sampler()
+        try:
+            return self.app(environ, self._routed(environ, start_response, found))
+        finally:
+            with self._lock:
+                del self._active[ident]
+                self.profiled += 1
+                self._requests[found[0]] += 1
+                stacks = self._collapsed.setdefault(found[0], Counter())
+                stacks.update(sampled.stacks)
+
+    def _ensure_sampler(self):
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._run_sampler,
+                                             name="request-sampler", daemon=True)
+            self._sampler.start()
+
+    def _run_sampler(self):
+        # Exits once nothing has been sampled for a second, so an idle
+        # server keeps no thread around
+        idle_since = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    # Decided under the lock, so a request starting now
+                    # sees no sampler and starts a new one
+                    if time.monotonic() - idle_since >= 1.0:
+                        self._sampler = None
+                        return
+                    continue
+                idle_since = time.monotonic()
+                frames = sys._current_frames()
+                for ident, sampled in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame.f_code)
+                        frame = frame.f_back
+                    # Innermost first; drop the server frames at the root.
+                    # Code objects are kept as they are and only turned into
+                    # text when the aggregate is downloaded
+                    del stack[len(stack) - sampled.skip:]
+                    if stack:
+                        sampled.stacks[tuple(reversed(stack))] += 1
+
+    # Reading -----------------------------------------------------------------
+
+    def routes(self):
+        """Profiled request count per route, and what was collected for it."""
+        with self._lock:
+            return {
+                route: {
+                    "requests": count,
+                    "pstats": route in self._pstats,
+                    "samples": sum(self._collapsed.get(route, {}).values()),
+                }
+                for route, count in self._requests.items()
+            }
+
+    def _merged_stats(self, route):
+        with self._lock:
+            chosen = [stats for name, stats in self._pstats.items()
+                      if route is None or name == route]
+            if not chosen:
+                return None
+            # A fresh Stats, so reading never mutates the per-route ones
+            merged = pstats.Stats()
+            merged.add(*chosen)
+            return merged
+
+    def pstats_bytes(self, route=None):
+        """Aggregate as a .pstats file (``pstats.Stats(path)`` / snakeviz)."""
+        stats = self._merged_stats(route)
+        # Stats.dump_stats() writes exactly this, but only to a path
+        return marshal.dumps(stats.stats) if stats is not None else None
+
+    def pstats_text(self, route=None, sort="cumulative", limit=50):
+        """Aggregate as the familiar pstats report, top ``limit`` functions."""
+        stats = self._merged_stats(route)
+        if stats is None:
+            return None
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def collapsed(self, route=None):
+        """Sampled stacks as collapsed-stack text, one "a;b;c count" per line."""
+        with self._lock:
+            total = Counter()
+            for name, stacks in self._collapsed.items():
+                if route is None or name == route:
+                    total.update(stacks)
+        if not total:
+            return None
+        lines = Counter()
+        for stack, count in total.items():
+            lines[";".join(map(_frame_label, stack))] += count
+        return "".join(f"{stack} {count}\n" for stack, count in lines.most_common())
+
+    def reset(self):
+        with self._lock:
+            self._pstats.clear()
+            self._collapsed.clear()
+            self._requests.clear()
+            self.profiled = self.skipped = 0
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "sample_rate": self.sample_rate,
+            "header_enabled": bool(self.secret),
+            "profiled": self.profiled,
+            "skipped": self.skipped,
+            "routes": self.routes(),
+        }
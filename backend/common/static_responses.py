@@ -0,0 +1,72 @@
+"""
+Static Responses
+Bodies for endpoints whose output never changes are serialized once and
+served as raw bytes. Timestamps are cached at one-second resolution, so
+bodies that only embed "now" are rebuilt at most once per second. Both mark
+their bodies as static for ``CompressionMiddleware``, which then compresses
+each one once instead of on every request.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from flask import has_request_context, request
+
+from common.compression import STATIC_BODY
+
+_clock = (None, None)
+
+
+def now_iso():
+    """Current local time as ISO 8601, formatted at most once per second."""
+    global _clock
+    second = int(time.time())
+    cached = _clock
+    if cached[0] != second:
+        cached = _clock = (second, datetime.fromtimestamp(second).isoformat())
+    return cached[1]
+
+
+def _serialize(app, obj):
+    provider = app.json
+    if hasattr(provider, "dumps_bytes"):
+        return provider.dumps_bytes(obj) + b"\n"
+    return provider.response(obj).get_data()
+
+
+def _respond(source, body):
+    if has_request_context():
+        request.environ[STATIC_BODY] = (source, body)
+    return source.app.response_class(body, mimetype=source.app.json.mimetype)
+
+
+class StaticJSON:
+    """A JSON body serialized once; calling it builds a fresh Response."""
+
+    def __init__(self, app, obj):
+        self.app = app
+        self.body = _serialize(app, obj)
+
+    def __call__(self):
+        return _respond(self, self.body)
+
+
+class PerSecondJSON:
+    """A JSON body rendered by ``render()`` and reused within the same second."""
+
+    def __init__(self, app, render):
+        self.app = app
+        self.render = render
+        self._cached = (None, None)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        second = int(time.time())
+        cached = self._cached
+        if cached[0] != second:
+            with self._lock:
+                cached = self._cached
+                if cached[0] != second:
+                    cached = self._cached = (second, _serialize(self.app, self.render()))
+        return _respond(self, cached[1])